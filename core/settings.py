@@ -103,6 +103,15 @@ DATABASES = {
     }
 }
 
+# Separate connection that lets import_voters --fast-load use LOAD DATA
+# LOCAL INFILE. Only the import uses it; other connections keep it off.
+if config('DB_LOCAL_INFILE', default=False, cast=bool):
+    DATABASES['voter_import'] = {
+        **DATABASES['default'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS'], 'local_infile': True},
+        'TEST': {'MIRROR': 'default'},
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -225,6 +234,8 @@ EDUMARC_SENDER_ID = 'EDUMRC'
 # Voter Management Custom Settings
 VOTER_EXCEL_UPLOAD_PATH = os.path.join(MEDIA_ROOT, 'excel_uploads')
 VOTER_EXPORT_PATH = os.path.join(MEDIA_ROOT, 'exports')
+# Columnar voter snapshot memory-mapped by the analytics API
+VOTER_ANALYTICS_PATH = os.path.join(MEDIA_ROOT, 'analytics')
 os.makedirs(VOTER_EXCEL_UPLOAD_PATH, exist_ok=True)
 os.makedirs(VOTER_EXPORT_PATH, exist_ok=True)
 
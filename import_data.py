@@ -1,6 +1,7 @@
 import pandas as pd
 from django.db import transaction
-from voters.models import Voter, VoterField
+from voters.models import VoterField
+from voters.importers import normalize_frame, insert_rows
 
 
 def detect_field_type(series):
@@ -47,25 +48,16 @@ def import_excel_data(file_path):
             ignore_conflicts=True
         )
 
-        # Prepare voter data
-        voters_data = []
-        for _, row in df.iterrows():
-            voter_data = row.to_dict()
-            # Handle non-serializable values
-            for key, value in voter_data.items():
-                if pd.isna(value):
-                    voter_data[key] = None
-                elif isinstance(value, pd.Timestamp):
-                    voter_data[key] = value.isoformat()
-                else:
-                    voter_data[key] = str(value)
-
-            voters_data.append(Voter(data=voter_data))
-
-        # Bulk create voters
-        Voter.objects.bulk_create(voters_data)
+        # Prepare voter data, converting whole columns at once
+        columns, rows = normalize_frame(
+            df,
+            missing=None,
+            timestamp_sep='T',
+            strip=False
+        )
 
-        return len(voters_data)
+        # Bulk create voters, keeping the summary tables up to date
+        return insert_rows(columns, rows)
 
     except Exception as e:
         raise Exception(f"Error importing data: {str(e)}")
\ No newline at end of file
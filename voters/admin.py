@@ -2,13 +2,14 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import path
 from django.http import JsonResponse
+from django.template.response import TemplateResponse
 from django.views.decorators.csrf import csrf_protect
 from django.utils.decorators import method_decorator
-from .models import VoterField, Voter
+from .models import VoterField, Voter, VoterJob
 import json
 from django.db import transaction
 from django.utils import timezone
-from notifications.models import NotificationType, NotificationTemplate, NotificationLog
+from notifications.models import NotificationType, NotificationTemplate
 from django.conf import settings
 import re
 import logging
@@ -20,9 +21,17 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from .models import Voter, VoterField
-from .utils import format_phone_number
+from .utils import format_phone_number, filter_by_hierarchy
 from .forms import VoterForm
-from notifications.utils import NotificationSender
+from .constants import EXCEL_FIELDS, ENCODED_FIELDS, REQUIRED_FIELDS, FIELD_TYPES, AREA_FILTERS
+from .validation import compile_validator
+from .importers import EXCEL_EXTENSIONS, build_voters
+from .jobs import save_upload, start_delete_job, start_import_job, start_notify_job, job_progress
+from .deletes import delete_voters_in_batches
+from .selections import get_selection, requested_selection, selection_queryset, selection_voters
+from .updates import BULK_UPDATE_FIELDS, EXCEL_NAMES, bulk_update_attributes, patch_voter
+from .areas import area_choices, area_children
+from .notify import BACKGROUND_SEND_THRESHOLD, send_to_voters
 
 
 # Configure logger
@@ -36,52 +45,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Define Excel fields
-EXCEL_FIELDS = [
-    'MLC CONSTITUNCY', 'ASSEMBLY', 'MANDAL', 'TOWN', 'VILLAGE', 'PSNO',
-    'LOCATION', 'PS ADDRESS', 'STREET', 'HNO', 'SNO', 'CARD NO',
-    'VOTER NAME', 'MOBILE NO', 'AGE', 'GENDER', 'REL NAME', 'RELATION',
-    'VOTER STATUS', 'PARTY', 'CASTE', 'CATEGORY', 'VERIFY STATUS'
-]
-
-# Define Excel fields with their corresponding model field names
-EXCEL_FIELD_MAPPING = {
-    'MLC CONSTITUNCY': 'mlc_constituency',
-    'ASSEMBLY': 'assembly',
-    'MANDAL': 'mandal',
-    'TOWN': 'town',
-    'VILLAGE': 'village',
-    'PSNO': 'psno',
-    'LOCATION': 'location',
-    'PS ADDRESS': 'ps_address',
-    'STREET': 'street',
-    'HNO': 'hno',
-    'SNO': 'sno',
-    'CARD NO': 'card_no',
-    'VOTER NAME': 'voter_name',
-    'MOBILE NO': 'mobile_no',
-    'AGE': 'age',
-    'GENDER': 'gender',
-    'REL NAME': 'rel_name',
-    'RELATION': 'relation',
-    'VOTER STATUS': 'voter_status',
-    'PARTY': 'party',
-    'CASTE': 'caste',
-    'CATEGORY': 'category',
-    'VERIFY STATUS': 'verify_status'
-}
-
-# Define which fields should be required by default
-REQUIRED_FIELDS = ['MLC CONSTITUNCY', 'ASSEMBLY', 'MANDAL', 'SNO', 'MOBILE NO']
-
-# Define field types mapping
-FIELD_TYPES = {
-    'AGE': 'number',
-    'MOBILE NO': 'phone',
-    'SNO': 'number',
-    'CARD NO': 'number',
-    'GENDER': 'select',
-}
+# Selections larger than this are deleted by a background job
+BACKGROUND_DELETE_THRESHOLD = 20000
 
 
 @admin.register(VoterField)
@@ -208,29 +173,19 @@ class VoterAdmin(admin.ModelAdmin):
     change_list_template = 'admin/voters/voter/change_list.html'
     list_per_page = 50
 
+    list_select_related = ('polling_station', *ENCODED_FIELDS)
+
     def get_list_display(self, request):
-        return list(EXCEL_FIELD_MAPPING.keys())
+        return list(EXCEL_FIELDS)
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
 
-        # Get filter values from request
-        mlc_filter = request.GET.get('mlc_constituncy')
-        assembly_filter = request.GET.get('assembly')
-        mandal_filter = request.GET.get('mandal')
-        location_filter = request.GET.get('location')
-
-        # Apply filters using the data field
-        if mlc_filter:
-            queryset = queryset.filter(data__contains={'MLC CONSTITUNCY': mlc_filter})
-        if assembly_filter:
-            queryset = queryset.filter(data__contains={'ASSEMBLY': assembly_filter})
-        if mandal_filter:
-            queryset = queryset.filter(data__contains={'MANDAL': mandal_filter})
-        if location_filter:
-            queryset = queryset.filter(data__contains={'LOCATION': location_filter})
+        # Apply filters on the indexed hierarchy columns
+        return filter_by_hierarchy(queryset, request.GET)
 
-        return queryset
+    def delete_queryset(self, request, queryset):
+        delete_voters_in_batches(queryset)
 
     def get_urls(self):
         urls = super().get_urls()
@@ -238,23 +193,23 @@ class VoterAdmin(admin.ModelAdmin):
             path('api/add-voter/', self.add_voter, name='add-voter'),
             path('api/voter/<int:pk>/delete/', self.delete_voter, name='voter-delete'),
             path('api/bulk-delete-voters/', self.bulk_delete_voters, name='bulk-delete-voters'),
+            path('api/bulk-update-voters/', self.bulk_update_voters, name='bulk-update-voters'),
             path('api/voter/<int:pk>/edit/', self.edit_voter, name='voter-edit'),
             path('send-notification/', self.send_notification, name='send-notification'),
+            path('api/import/', self.import_voters, name='voter-import'),
+            path('api/jobs/<int:pk>/', self.job_status, name='voter-job-status'),
+            path('dashboard/', self.dashboard, name='voter-dashboard'),
         ]
         return custom_urls + urls
 
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
 
-        # Get filtered queryset
-        queryset = self.get_queryset(request)
-
-        def get_unique_values(excel_field):
-            return sorted(set(
-                voter.data.get(excel_field, '')
-                for voter in queryset
-                if voter.data.get(excel_field)
-            ))
+        # Filter dropdown areas with voter counts, each narrowed by the areas selected above it
+        try:
+            choices = area_choices(request.GET)
+        except ValueError:
+            choices = area_choices()
 
         # Get notification types and templates
         try:
@@ -273,26 +228,21 @@ class VoterAdmin(admin.ModelAdmin):
             notification_templates = []
             templates_by_type = {}
 
-        # Get unique values for filters
-        unique_mlc = get_unique_values('MLC CONSTITUNCY')
-        unique_assembly = get_unique_values('ASSEMBLY')
-        unique_mandal = get_unique_values('MANDAL')
-        unique_location = get_unique_values('LOCATION')
+        # Areas for the filter selects as dicts of id, name and voter_count
+        unique_mlc = choices['mlc_constituency']
+        unique_assembly = choices['assembly']
+        unique_mandal = choices['mandal']
+        unique_location = choices['location']
 
         # Current filter values
-        current_filters = {
-            'mlc_constituncy': request.GET.get('mlc_constituncy', ''),
-            'assembly': request.GET.get('assembly', ''),
-            'mandal': request.GET.get('mandal', ''),
-            'location': request.GET.get('location', ''),
-        }
+        current_filters = {param: request.GET.get(param, '') for param, _ in AREA_FILTERS}
 
         current_datetime = timezone.now().strftime('%Y-%m-%d %H:%M:%S')
 
         extra_context.update({
             'current_datetime': current_datetime,
             'current_user': request.user.username,
-            'excel_fields': list(EXCEL_FIELD_MAPPING.keys()),
+            'excel_fields': EXCEL_FIELDS,
             'unique_mlc': unique_mlc,
             'unique_assembly': unique_assembly,
             'unique_mandal': unique_mandal,
@@ -301,6 +251,7 @@ class VoterAdmin(admin.ModelAdmin):
             'notification_types': notification_types,
             'notification_templates': notification_templates,
             'templates_by_type': templates_by_type,
+            'bulk_update_fields': [(field, EXCEL_NAMES[field]) for field in BULK_UPDATE_FIELDS],
             'notification_channels': [
                 {'id': 'SMS', 'name': 'SMS'},
                 {'id': 'WA', 'name': 'WhatsApp'},
@@ -320,15 +271,27 @@ class VoterAdmin(admin.ModelAdmin):
                 template_id = data.get('template_id')
                 channel = data.get('channel')
                 voter_ids = data.get('voter_ids', [])
+                selection_token = data.get('selection')
 
-                if not all([type_id, template_id, channel, voter_ids]):
+                if not all([type_id, template_id, channel]) or not (voter_ids or selection_token):
                     return JsonResponse({
                         'success': False,
                         'error': 'Missing required parameters'
                     }, status=400)
 
-                # Get voters and template
-                voters = Voter.objects.filter(id__in=voter_ids)
+                # Get voters and template; a selection is read in chunks
+                selection = None
+                if selection_token:
+                    try:
+                        selection = get_selection(selection_token, request.user)
+                    except LookupError as e:
+                        return JsonResponse({
+                            'success': False,
+                            'error': str(e)
+                        }, status=404)
+                    voters = selection_voters(selection, fields=['id', 'mobile_no'])
+                else:
+                    voters = Voter.objects.filter(id__in=voter_ids).only('id', 'mobile_no')
                 try:
                     template = NotificationTemplate.objects.get(id=template_id)
                     if not template.template_id:
@@ -342,58 +305,23 @@ class VoterAdmin(admin.ModelAdmin):
                         'error': 'Template not found'
                     }, status=404)
 
-                # Initialize notification sender
-                sender = NotificationSender()
-
-                results = {
-                    'success_count': 0,
-                    'failure_count': 0,
-                    'errors': []
-                }
-
-                for voter in voters:
-                    try:
-                        # Validate mobile number
-                        if not voter.mobile_no:
-                            raise ValueError(f"Voter {voter.id} has no mobile number")
-
-                        # Create notification log
-                        notification_log = NotificationLog.objects.create(
-                            recipient=voter.mobile_no,
-                            template=template,
-                            channel=channel,
-                            status=NotificationLog.Status.PENDING
-                        )
-
-                        # Send notification
-                        success, error = sender.send_notification(notification_log)
-
-                        if success:
-                            results['success_count'] += 1
-                        else:
-                            results['failure_count'] += 1
-                            results['errors'].append({
-                                'voter_id': voter.id,
-                                'mobile': voter.mobile_no,
-                                'error': error
-                            })
-                    except Exception as e:
-                        logger.error(f"Error processing voter {voter.id}: {str(e)}")
-                        results['failure_count'] += 1
-                        results['errors'].append({
-                            'voter_id': voter.id,
-                            'mobile': getattr(voter, 'mobile_no', 'N/A'),
-                            'error': str(e)
-                        })
+                # A large selection is notified by a background job
+                if selection and selection.voter_count > BACKGROUND_SEND_THRESHOLD:
+                    job = start_notify_job(
+                        {'selection': selection.token, 'template_id': template.id, 'channel': channel},
+                        user=request.user
+                    )
+                    logger.info(f"User {request.user.username} started notify job {job.id} for {selection.voter_count} voters")
+                    return JsonResponse({
+                        'success': True,
+                        'job_id': job.id,
+                        'count': selection.voter_count,
+                        'progress_url': reverse('admin:voter-job-status', args=[job.id])
+                    })
 
-                # Return results
                 return JsonResponse({
                     'success': True,
-                    'data': {
-                        'total_sent': results['success_count'],
-                        'total_failed': results['failure_count'],
-                        'errors': results['errors'] if results['errors'] else None
-                    }
+                    'data': send_to_voters(voters, template, channel)
                 })
 
             except Exception as e:
@@ -423,15 +351,19 @@ class VoterAdmin(admin.ModelAdmin):
                         'message': f'Required fields missing: {", ".join(missing_fields)}'
                     }, status=400)
 
-                # Create voter instance
-                voter = Voter.objects.create(
-                    mlc_constituency=data.get('MLC CONSTITUNCY', ''),
-                    assembly=data.get('ASSEMBLY', ''),
-                    mandal=data.get('MANDAL', ''),
-                    sno=data.get('SNO', ''),
-                    mobile_no=data.get('MOBILE NO', ''),
-                    data=data
-                )
+                # Validate values against the voter field types
+                errors = compile_validator().validate_records([data]).get(0)
+                if errors:
+                    return JsonResponse({
+                        'status': 'error',
+                        'message': '; '.join(errors.values()),
+                        'errors': errors
+                    }, status=400)
+
+                # Build the voter like an imported row, so its polling
+                # station gets the station fields
+                voter = build_voters(list(data), [tuple(data.values())])[0]
+                voter.save()
 
                 return JsonResponse({
                     'status': 'success',
@@ -458,6 +390,71 @@ class VoterAdmin(admin.ModelAdmin):
             'message': 'Invalid method'
         }, status=405)
 
+    @method_decorator(csrf_protect)
+    @method_decorator(staff_member_required)
+    def import_voters(self, request):
+        if request.method == 'POST':
+            try:
+                uploaded_file = request.FILES.get('excel_file')
+                if not uploaded_file:
+                    return JsonResponse({
+                        'success': False,
+                        'error': 'No file uploaded'
+                    }, status=400)
+
+                if not uploaded_file.name.lower().endswith(EXCEL_EXTENSIONS):
+                    return JsonResponse({
+                        'success': False,
+                        'error': f'Only {", ".join(EXCEL_EXTENSIONS)} files can be imported'
+                    }, status=400)
+
+                # The import runs in its own process, the request only saves the file
+                file_path = save_upload(uploaded_file)
+                options = {
+                    'upsert': request.POST.get('upsert') == 'true',
+                    'skip_invalid': request.POST.get('skip_invalid') == 'true',
+                    # The voters of a job become searchable when it finishes
+                    'defer_index': True,
+                }
+                job = start_import_job(file_path, options, user=request.user)
+
+                logger.info(f"User {request.user.username} started import job {job.id} for {uploaded_file.name}")
+                return JsonResponse({
+                    'success': True,
+                    'job_id': job.id,
+                    'progress_url': reverse('admin:voter-job-status', args=[job.id])
+                })
+            except Exception as e:
+                logger.error(f"Error starting import: {str(e)}")
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e)
+                }, status=500)
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid method'
+        }, status=405)
+
+    @method_decorator(staff_member_required)
+    def dashboard(self, request):
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Voter Demographics',
+            'opts': self.model._meta,
+            'assemblies': area_children('assembly'),
+        }
+        return TemplateResponse(request, 'admin/voters/voter/dashboard.html', context)
+
+    @method_decorator(staff_member_required)
+    def job_status(self, request, pk):
+        progress = job_progress(pk)
+        if progress is None:
+            return JsonResponse({
+                'success': False,
+                'error': 'Job not found'
+            }, status=404)
+        return JsonResponse({'success': True, 'job': progress})
+
     @method_decorator(csrf_protect)
     @method_decorator(staff_member_required)
     def delete_voter(self, request, pk):
@@ -484,19 +481,108 @@ class VoterAdmin(admin.ModelAdmin):
     @method_decorator(csrf_protect)
     @method_decorator(staff_member_required)
     def bulk_delete_voters(self, request):
+        if not request.user.has_perm('voters.delete_voter'):
+            return JsonResponse({
+                'success': False,
+                'error': 'You do not have permission to delete voters'
+            }, status=403)
         if request.method == 'POST':
             try:
                 data = json.loads(request.body)
                 voter_ids = data.get('voter_ids', [])
+                selection_token = data.get('selection')
+                assembly_id = data.get('assembly_id')
 
-                if not voter_ids:
+                if not (voter_ids or selection_token or assembly_id):
                     return JsonResponse({
                         'success': False,
                         'error': 'No voters selected'
                     }, status=400)
 
-                Voter.objects.filter(id__in=voter_ids).delete()
-                return JsonResponse({'success': True})
+                # A whole assembly or a large selection is deleted by a
+                # background job, batch by batch
+                if assembly_id:
+                    try:
+                        assembly_id = int(assembly_id)
+                    except (TypeError, ValueError):
+                        return JsonResponse({
+                            'success': False,
+                            'error': 'Invalid assembly_id'
+                        }, status=400)
+                    count = Voter.objects.filter(assembly_area_id=assembly_id).count()
+                    if not count:
+                        return JsonResponse({
+                            'success': True,
+                            'deleted': 0,
+                            'message': 'No voters found in this assembly'
+                        })
+                    job = start_delete_job({'assembly_id': assembly_id}, user=request.user)
+                    return self.delete_job_response(request, job, count)
+
+                if selection_token:
+                    try:
+                        selection = get_selection(selection_token, request.user)
+                    except LookupError as e:
+                        return JsonResponse({
+                            'success': False,
+                            'error': str(e)
+                        }, status=404)
+                    if selection.voter_count > BACKGROUND_DELETE_THRESHOLD:
+                        job = start_delete_job({'selection': selection.token}, user=request.user)
+                        return self.delete_job_response(request, job, selection.voter_count)
+                    voters = selection_queryset(selection)
+                else:
+                    voters = Voter.objects.filter(id__in=voter_ids)
+
+                deleted = delete_voters_in_batches(voters)
+                return JsonResponse({'success': True, 'deleted': deleted})
+            except Exception as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e)
+                }, status=500)
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid method'
+        }, status=405)
+
+    def delete_job_response(self, request, job, count):
+        logger.info(f"User {request.user.username} started delete job {job.id} for {count} voters")
+        return JsonResponse({
+            'success': True,
+            'job_id': job.id,
+            'count': count,
+            'progress_url': reverse('admin:voter-job-status', args=[job.id])
+        })
+
+    @method_decorator(csrf_protect)
+    @method_decorator(staff_member_required)
+    def bulk_update_voters(self, request):
+        """
+        Set attributes of BULK_UPDATE_FIELDS, given as ``changes``, on a
+        ``selection`` token, ``filters`` or ``voter_ids``.
+        """
+        if not request.user.has_perm('voters.change_voter'):
+            return JsonResponse({
+                'success': False,
+                'error': 'You do not have permission to change voters'
+            }, status=403)
+        if request.method == 'POST':
+            try:
+                data = json.loads(request.body)
+                selection = requested_selection(data, request.user)
+                updated = bulk_update_attributes(selection, data.get('changes'))
+                return JsonResponse({'success': True, 'updated': updated})
+            except LookupError as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e)
+                }, status=404)
+            except ValueError as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e)
+                }, status=400)
             except Exception as e:
                 return JsonResponse({
                     'success': False,
@@ -515,14 +601,19 @@ class VoterAdmin(admin.ModelAdmin):
                 voter = Voter.objects.get(pk=pk)
                 data = json.loads(request.body)
 
-                # Update voter fields
-                for excel_name, model_field in EXCEL_FIELD_MAPPING.items():
-                    if excel_name in data:
-                        setattr(voter, model_field, data[excel_name])
-                        voter.data[excel_name] = data[excel_name]
+                # Write only the submitted fields that changed
+                data = {name: value for name, value in data.items() if name in EXCEL_FIELDS}
+                try:
+                    patch_voter(voter, data)
+                except ValidationError as e:
+                    errors = {field: '; '.join(messages) for field, messages in e.message_dict.items()}
+                    return JsonResponse({
+                        'success': False,
+                        'error': '; '.join(errors.values()),
+                        'errors': errors
+                    }, status=400)
 
-                voter.save()
-                return JsonResponse({'success': True})
+                return JsonResponse({'success': True, 'updated_at': voter.updated_at})
             except Voter.DoesNotExist:
                 return JsonResponse({
                     'success': False,
@@ -536,4 +627,15 @@ class VoterAdmin(admin.ModelAdmin):
         return JsonResponse({
             'success': False,
             'error': 'Invalid method'
-        }, status=405)
\ No newline at end of file
+        }, status=405)
+
+
+@admin.register(VoterJob)
+class VoterJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'file_path', 'parsed', 'inserted', 'updated', 'invalid', 'failed', 'deleted', 'sent', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = [field.name for field in VoterJob._meta.fields]
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
\ No newline at end of file
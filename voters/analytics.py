@@ -0,0 +1,279 @@
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.http import QueryDict
+from django.utils import timezone
+
+from .constants import AGE_BANDS, AREA_FILTERS, ENCODED_FIELDS, STATION_FILTER
+from .models import AREA_MODELS, AttributeValue, PollingStation, Voter, VoterFacet
+from .utils import area_filters
+
+logger = logging.getLogger(__name__)
+
+# Snapshot columns and their NumPy types. Areas, booths and attributes are
+# already dictionary-encoded by their tables, so the snapshot stores their
+# ids; 0 stands for NULL and -1 for an unknown age.
+SNAPSHOT_COLUMNS = {
+    **{column: np.int32 for _, column in AREA_FILTERS},
+    STATION_FILTER[1]: np.int32,
+    **{f'{attribute}_id': np.int16 for attribute in ENCODED_FIELDS},
+    'age': np.int16,
+}
+
+# Cross-tab dimensions and the snapshot column of each; age_band is
+# derived from the age column
+DIMENSIONS = {
+    **{level: column for level, (_, column) in zip(VoterFacet.PATH_FIELDS, AREA_FILTERS)},
+    'polling_station': STATION_FILTER[1],
+    **{attribute: f'{attribute}_id' for attribute in ENCODED_FIELDS},
+    'age_band': 'age',
+}
+
+# Snapshot column of each area/booth filter parameter
+FILTER_COLUMNS = dict([*AREA_FILTERS, STATION_FILTER])
+
+# Upper ages of every age band but the last, for np.searchsorted
+AGE_BAND_LIMITS = np.array([highest for _, _, highest in AGE_BANDS[:-1]], dtype=np.int16)
+
+# Rows fetched per query while building a snapshot
+SNAPSHOT_BATCH_SIZE = 50000
+
+META_FILE = 'meta.json'
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def snapshot_path():
+    return settings.VOTER_ANALYTICS_PATH
+
+
+def build_snapshot(path=None, batch_size=SNAPSHOT_BATCH_SIZE, progress=None):
+    """
+    Write the voter columns of SNAPSHOT_COLUMNS to one .npy file each under
+    ``path``, reading the table in primary key batches. The new snapshot is
+    written beside the current one and swapped in with renames, so readers
+    never see a half written snapshot.
+
+    ``progress`` is called with the number of voters read so far.
+    Returns the number of voters in the snapshot.
+    """
+    path = path or snapshot_path()
+    building = f'{path}.building'
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    fields = list(SNAPSHOT_COLUMNS)
+    chunks = {field: [] for field in fields}
+    rows, last_pk = 0, 0
+    while True:
+        batch = list(
+            Voter.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', *fields)[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        rows += len(batch)
+        for index, field in enumerate(fields, 1):
+            missing = -1 if field == 'age' else 0
+            chunks[field].append(np.fromiter(
+                (missing if row[index] is None else row[index] for row in batch),
+                dtype=SNAPSHOT_COLUMNS[field], count=len(batch)
+            ))
+        if progress:
+            progress(rows)
+
+    for field in fields:
+        column = np.concatenate(chunks[field]) if chunks[field] else np.empty(0, SNAPSHOT_COLUMNS[field])
+        np.save(os.path.join(building, f'{field}.npy'), column)
+
+    with open(os.path.join(building, META_FILE), 'w') as meta_file:
+        json.dump({
+            'rows': rows,
+            'built_at': timezone.now().isoformat(),
+            'columns': {field: np.dtype(dtype).name for field, dtype in SNAPSHOT_COLUMNS.items()},
+        }, meta_file)
+
+    # Workers that mapped the old files keep reading them until they reload
+    previous = f'{path}.previous'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.isdir(path):
+        os.rename(path, previous)
+    os.rename(building, path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+    logger.info(f'Built voter analytics snapshot of {rows} voters at {path}')
+    return rows
+
+
+class Snapshot:
+    """
+    Memory-mapped columns of a snapshot written by build_snapshot().
+    """
+
+    def __init__(self, path):
+        meta_path = os.path.join(path, META_FILE)
+        self.path = path
+        self.mtime = os.stat(meta_path).st_mtime
+        with open(meta_path) as meta_file:
+            self.meta = json.load(meta_file)
+        self.rows = self.meta['rows']
+        self.columns = {
+            field: np.load(os.path.join(path, f'{field}.npy'), mmap_mode='r')
+            for field in self.meta['columns']
+        }
+
+    def values(self, dimension, rows):
+        """
+        Values of ``dimension`` in ``rows``, a boolean mask or a slice.
+        """
+        column = self.columns[DIMENSIONS[dimension]][rows]
+        if dimension == 'age_band':
+            # Band 0 for an unknown age, as VoterRollup.age_band()
+            return np.where(column < 0, 0, np.searchsorted(AGE_BAND_LIMITS, column) + 1)
+        return column
+
+
+def get_snapshot(path=None):
+    """
+    The current snapshot, mapped once per process and mapped again when
+    build_snapshot() replaces it. Returns None if no snapshot was built.
+    """
+    global _snapshot
+    path = path or snapshot_path()
+    try:
+        mtime = os.stat(os.path.join(path, META_FILE)).st_mtime
+    except FileNotFoundError:
+        return None
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.path != path or _snapshot.mtime != mtime:
+            _snapshot = Snapshot(path)
+        return _snapshot
+
+
+def _int_list(params, name):
+    try:
+        return [int(value) for value in params.getlist(name)]
+    except ValueError:
+        raise ValueError(f'Invalid {name}')
+
+
+def snapshot_mask(snapshot, params):
+    """
+    Boolean mask of the snapshot rows matching ``params``: the area and
+    booth ids of AREA_FILTERS/STATION_FILTER, attribute codes as
+    <attribute>=<id> (repeatable), and age_min/age_max.
+    Raises ValueError for malformed parameters.
+    """
+    mask = np.ones(snapshot.rows, dtype=bool)
+    for param, area_id in area_filters(params).items():
+        mask &= snapshot.columns[FILTER_COLUMNS[param]] == area_id
+
+    for attribute in ENCODED_FIELDS:
+        codes = _int_list(params, attribute)
+        if codes:
+            mask &= np.isin(snapshot.columns[f'{attribute}_id'], codes)
+
+    ages = snapshot.columns['age']
+    for name, compare in (('age_min', np.greater_equal), ('age_max', np.less_equal)):
+        limit = _int_list(params, name)
+        if limit:
+            mask &= (ages >= 0) & compare(ages, limit[-1])
+    return mask
+
+
+def _labels(dimension, values):
+    values = [int(value) for value in values]
+    if dimension == 'age_band':
+        names = {index: label for index, (label, _, _) in enumerate(AGE_BANDS, 1)}
+    elif dimension == 'polling_station':
+        names = {
+            station['id']: f"{station['psno']} {station['location']}".strip()
+            for station in PollingStation.objects.filter(pk__in=values).values('id', 'psno', 'location')
+        }
+    elif dimension in ENCODED_FIELDS:
+        names = dict(AttributeValue.objects.filter(pk__in=values).values_list('id', 'value'))
+    else:
+        model = AREA_MODELS[[column for _, column in AREA_FILTERS].index(DIMENSIONS[dimension])]
+        names = dict(model.objects.filter(pk__in=values).values_list('id', 'name'))
+    return {value: names.get(value, 'Unknown') for value in values}
+
+
+def crosstab(dimensions, params=None, limit=None, snapshot=None):
+    """
+    Count the snapshot voters matching ``params`` (see snapshot_mask) per
+    combination of ``dimensions``, with NumPy over the mapped columns.
+
+    Returns a dict with the matched total and the non-empty cells as dicts
+    of dimension labels and voter_count, largest first, cut to ``limit``.
+    Raises ValueError for unknown dimensions or malformed parameters and
+    LookupError if no snapshot was built.
+    """
+    snapshot = snapshot or get_snapshot()
+    if snapshot is None:
+        raise LookupError('No analytics snapshot; run build_voter_snapshot')
+    if not dimensions:
+        raise ValueError('At least one dimension is required')
+    unknown = [dimension for dimension in dimensions if dimension not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f'Unknown dimension: {", ".join(unknown)}')
+
+    mask = snapshot_mask(snapshot, QueryDict() if params is None else params)
+    total = int(np.count_nonzero(mask))
+
+    # Every row matches without filters; skip copying the columns through the mask
+    rows = mask if total < snapshot.rows else slice(None)
+
+    cells = []
+    if total:
+        # Offset every dimension to 0..max-min; ids and codes are dense
+        # enough that the combinations index one array without sorting
+        lows, shape, flat, combinations = [], [], np.zeros(total, dtype=np.int64), 1
+        for dimension in dimensions:
+            values = snapshot.values(dimension, rows)
+            low, high = int(values.min()), int(values.max())
+            size = high - low + 1
+            if combinations * size > 2 ** 62:
+                raise ValueError('Too many combinations; narrow the filters or use fewer dimensions')
+            lows.append(low)
+            shape.append(size)
+            flat *= size
+            flat += values - low
+            combinations *= size
+
+        if combinations <= 4 * total:
+            counts = np.bincount(flat, minlength=combinations)
+            cell_ids = np.flatnonzero(counts)
+            counts = counts[cell_ids]
+        else:
+            # Sparse cross-tab: count only the combinations that occur
+            cell_ids, counts = np.unique(flat, return_counts=True)
+        order = np.argsort(-counts, kind='stable')[:limit]
+
+        # Split the combination index back into the value of each dimension
+        columns = [
+            low + offsets
+            for low, offsets in zip(lows, np.unravel_index(cell_ids[order], shape))
+        ]
+        labels = [_labels(dimension, np.unique(column)) for dimension, column in zip(dimensions, columns)]
+        for position, count in enumerate(counts[order]):
+            cell = {}
+            for dimension, column, names in zip(dimensions, columns, labels):
+                value = int(column[position])
+                cell[dimension] = {'value': value, 'label': names[value]}
+            cell['voter_count'] = int(count)
+            cells.append(cell)
+
+    return {
+        'total': total,
+        'dimensions': list(dimensions),
+        'built_at': snapshot.meta['built_at'],
+        'data': cells,
+    }
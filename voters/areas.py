@@ -0,0 +1,125 @@
+import logging
+import time
+from collections import Counter
+
+from django.db.models import Q
+
+from .constants import AREA_FILTERS
+from .facets import count_paths, get_facets
+from .models import AREA_MODELS, Voter, VoterFacet, fold_name, resolve_areas
+from .utils import area_filters
+
+logger = logging.getLogger(__name__)
+
+# Hierarchy levels of the area tables, top down
+AREA_LEVELS = VoterFacet.PATH_FIELDS
+
+
+def _ancestor_paths(depth):
+    """
+    ORM lookups from an area at ``depth`` to each of its ancestors, from the
+    top level down, e.g. ['assembly__mlc_constituency', 'assembly'] for a
+    mandal.
+    """
+    paths, prefix = [], ''
+    for model in reversed(AREA_MODELS[1:depth + 1]):
+        prefix = f'{prefix}__{model.PARENT_FIELD}' if prefix else model.PARENT_FIELD
+        paths.insert(0, prefix)
+    return paths
+
+
+def _path_counts():
+    """
+    Voter counts of every hierarchy path prefix, from the facet summary.
+    """
+    counts = Counter()
+    for facet in get_facets():
+        names = tuple(fold_name(name) for name in facet[:-1])
+        for depth in range(1, len(names) + 1):
+            if names[depth - 1]:
+                counts[names[:depth]] += facet[-1]
+    return counts
+
+
+def area_children(level, params=None, counts=None):
+    """
+    Areas of ``level`` that have voters, narrowed by the area ids of higher
+    levels in ``params`` (the AREA_FILTERS parameters). Asking for the level
+    below a node with that node's id gives the node's children.
+
+    Returns a list of dicts with id, name and voter_count, sorted by name.
+    Raises ValueError for an unknown level or a malformed id.
+    """
+    if level not in AREA_LEVELS:
+        raise ValueError(f'Unknown area level: {level}')
+
+    depth = AREA_LEVELS.index(level)
+    ancestors = _ancestor_paths(depth)
+    ids = area_filters(params or {})
+    filters = {
+        path: ids[param]
+        for (param, _), path in zip(AREA_FILTERS, ancestors)
+        if param in ids
+    }
+
+    counts = _path_counts() if counts is None else counts
+    rows = AREA_MODELS[depth].objects.filter(**filters).values(
+        'id', 'name', *(f'{path}__name' for path in ancestors)
+    )
+
+    areas = []
+    for row in rows:
+        names = [row[f'{path}__name'] for path in ancestors] + [row['name']]
+        voter_count = counts.get(tuple(fold_name(name) for name in names), 0)
+        if voter_count:
+            areas.append({'id': row['id'], 'name': row['name'], 'voter_count': voter_count})
+    return areas
+
+
+def area_choices(params=None):
+    """
+    Options of every filter select, each level narrowed by the areas
+    selected above it. Returns a dict of level -> area_children() list.
+    """
+    counts = _path_counts()
+    return {level: area_children(level, params, counts) for level in AREA_LEVELS}
+
+
+def path_filter(path):
+    """
+    Match the voters of a VoterFacet.key_for() path, where an empty name
+    stands for NULL or ''.
+    """
+    condition = Q()
+    for field, value in zip(VoterFacet.PATH_FIELDS, path):
+        if value:
+            condition &= Q(**{field: value})
+        else:
+            condition &= Q(**{f'{field}__isnull': True}) | Q(**{field: ''})
+    return condition
+
+
+def backfill_areas(sleep=0, progress=None):
+    """
+    Point every voter at the areas of its hierarchy columns, creating the
+    areas first. Runs one UPDATE per hierarchy path, found through
+    voter_hierarchy_idx, and writes only voters whose keys differ.
+
+    ``progress`` is called with (paths done, total paths, voters updated).
+    Returns the number of voters updated.
+    """
+    paths = count_paths(Voter.objects.all())
+    ids = resolve_areas(paths)
+    columns = [f'{field}_id' for field in Voter.AREA_FIELDS]
+
+    updated = 0
+    for done, path in enumerate(sorted(paths), 1):
+        keys = dict(zip(columns, ids[path]))
+        updated += Voter.objects.filter(path_filter(path)).exclude(**keys).update(**keys)
+        if progress:
+            progress(done, len(paths), updated)
+        if sleep:
+            time.sleep(sleep)
+
+    logger.info(f'Backfilled areas of {updated} voters over {len(paths)} paths')
+    return updated
@@ -0,0 +1,103 @@
+# Define Excel fields
+EXCEL_FIELDS = [
+    'MLC CONSTITUNCY', 'ASSEMBLY', 'MANDAL', 'TOWN', 'VILLAGE', 'PSNO',
+    'LOCATION', 'PS ADDRESS', 'STREET', 'HNO', 'SNO', 'CARD NO',
+    'VOTER NAME', 'MOBILE NO', 'AGE', 'GENDER', 'REL NAME', 'RELATION',
+    'VOTER STATUS', 'PARTY', 'CASTE', 'CATEGORY', 'VERIFY STATUS'
+]
+
+# Define Excel fields with their corresponding model field names. The
+# polling station's fields are in STATION_FIELD_MAPPING.
+EXCEL_FIELD_MAPPING = {
+    'MLC CONSTITUNCY': 'mlc_constituency',
+    'ASSEMBLY': 'assembly',
+    'MANDAL': 'mandal',
+    'TOWN': 'town',
+    'VILLAGE': 'village',
+    'PSNO': 'psno',
+    'LOCATION': 'location',
+    'STREET': 'street',
+    'HNO': 'hno',
+    'SNO': 'sno',
+    'CARD NO': 'card_no',
+    'VOTER NAME': 'voter_name',
+    'MOBILE NO': 'mobile_no',
+    'AGE': 'age',
+    'GENDER': 'gender',
+    'REL NAME': 'rel_name',
+    'RELATION': 'relation',
+    'VOTER STATUS': 'voter_status',
+    'PARTY': 'party',
+    'CASTE': 'caste',
+    'CATEGORY': 'category',
+    'VERIFY STATUS': 'verify_status'
+}
+
+# Excel fields stored once on the voter's PollingStation, not on the voter
+# or in its ``data``
+STATION_FIELD_MAPPING = {
+    'PS ADDRESS': 'ps_address',
+}
+STATION_FIELDS = list(STATION_FIELD_MAPPING.values())
+
+# Low-cardinality fields stored as AttributeValue codes, with the longest
+# value kept for each
+ENCODED_FIELDS = {
+    'gender': 1,
+    'relation': 255,
+    'voter_status': 50,
+    'party': 100,
+    'caste': 100,
+    'category': 100,
+    'verify_status': 20,
+}
+
+# Excel names of the ENCODED_FIELDS, whose text is kept in ``data`` only
+# while no code holds it
+ENCODED_FIELD_MAPPING = {name: field for name, field in EXCEL_FIELD_MAPPING.items() if field in ENCODED_FIELDS}
+
+# Age bands of the demographic rollups as (label, lowest age, highest age)
+AGE_BANDS = [
+    ('Up to 25', None, 25),
+    ('26-35', 26, 35),
+    ('36-45', 36, 45),
+    ('46-60', 46, 60),
+    ('Above 60', 61, None),
+]
+
+# Sheet columns that describe the polling station rather than the voter
+STATION_EXCEL_FIELDS = ['PSNO', 'LOCATION', 'PS ADDRESS']
+
+# Define which fields should be required by default
+REQUIRED_FIELDS = ['MLC CONSTITUNCY', 'ASSEMBLY', 'MANDAL', 'SNO', 'MOBILE NO']
+
+# Define field types mapping
+FIELD_TYPES = {
+    'AGE': 'number',
+    'MOBILE NO': 'phone',
+    'SNO': 'number',
+    'CARD NO': 'text',
+    'GENDER': 'select',
+}
+
+# Filter parameters in hierarchy order and the Voter columns they match.
+# 'mlc_constituncy' is the spelling the filter API has always used.
+HIERARCHY_FILTERS = [
+    ('mlc_constituncy', 'mlc_constituency'),
+    ('assembly', 'assembly'),
+    ('mandal', 'mandal'),
+    ('location', 'location'),
+    ('psno', 'psno'),
+]
+
+# Area id parameters of the cascading filter in hierarchy order, and the
+# Voter foreign keys they match
+AREA_FILTERS = [
+    ('mlc_constituency_id', 'mlc_area_id'),
+    ('assembly_id', 'assembly_area_id'),
+    ('mandal_id', 'mandal_area_id'),
+    ('location_id', 'location_area_id'),
+]
+
+# Polling station id parameter of the booth-level filter and the Voter key it matches
+STATION_FILTER = ('polling_station_id', 'polling_station_id')
@@ -0,0 +1,52 @@
+import logging
+import time
+from collections import Counter
+
+from django.db import transaction
+
+from .facets import facet_deltas
+from .models import Voter, VoterFacet, VoterGram, VoterRollup
+from .rollups import rollup_deltas
+
+logger = logging.getLogger(__name__)
+
+# Voters deleted per transaction by delete_voters_in_batches()
+DELETE_BATCH_SIZE = 1000
+
+
+def delete_voters_in_batches(queryset, batch_size=DELETE_BATCH_SIZE, sleep=0, progress=None):
+    """
+    Delete the voters of ``queryset`` in primary key batches, each in its
+    own short transaction, so row locks are held for one batch at a time
+    and other writers get through in between. ``sleep`` seconds between
+    batches throttle the deletion further.
+
+    Each batch is locked and read once for its summary keys, then its
+    grams and voters are deleted by primary key and the facet and rollup
+    counts adjusted. ``progress`` is called with the number deleted so far.
+    Returns the number of voters deleted.
+    """
+    deleted, last_pk = 0, 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                queryset.select_for_update().filter(pk__gt=last_pk).order_by('pk')
+                .values('pk', *VoterFacet.PATH_FIELDS, *VoterRollup.SOURCE_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            ids = [row['pk'] for row in rows]
+            last_pk = ids[-1]
+            VoterGram.objects.filter(voter_id__in=ids).delete()
+            _, counts = Voter.objects.filter(pk__in=ids).delete()
+            VoterFacet.adjust(Counter({key: -count for key, count in facet_deltas(rows).items()}))
+            VoterRollup.adjust(Counter({key: -count for key, count in rollup_deltas(rows).items()}))
+        deleted += counts.get(Voter._meta.label, 0)
+
+        if progress:
+            progress(deleted)
+        if sleep:
+            time.sleep(sleep)
+
+    logger.info(f'Deleted {deleted} voters in batches of {batch_size}')
+    return deleted
@@ -0,0 +1,55 @@
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Voter, VoterFacet
+
+logger = logging.getLogger(__name__)
+
+
+def get_facets():
+    """
+    Return every facet path with its voter count as a list of
+    (mlc_constituency, assembly, mandal, location, voter_count) tuples.
+
+    Read from the table on every call: it holds one row per path, and the
+    imports and deletes that change it run in other processes, which a
+    per-process cache would not see.
+    """
+    return list(VoterFacet.objects.values_list(*VoterFacet.PATH_FIELDS, 'voter_count'))
+
+
+def count_paths(queryset):
+    """
+    Count the voters of ``queryset`` per facet path with one GROUP BY.
+    """
+    counts = Counter()
+    rows = queryset.order_by().values(*VoterFacet.PATH_FIELDS).annotate(voter_count=Count('id'))
+    for row in rows:
+        counts[VoterFacet.key_for(row)] += row['voter_count']
+    return counts
+
+
+def facet_deltas(voters):
+    """
+    Facet count changes for adding ``voters`` (instances or values() dicts).
+    """
+    return Counter(VoterFacet.key_for(voter) for voter in voters)
+
+
+def rebuild_facets():
+    """
+    Recompute the whole summary from the voters table. The GROUP BY reads
+    only voter_hierarchy_idx. Returns the number of facet paths.
+    """
+    counts = count_paths(Voter.objects.all())
+    with transaction.atomic():
+        VoterFacet.objects.all().delete()
+        VoterFacet.objects.bulk_create([
+            VoterFacet(voter_count=count, **dict(zip(VoterFacet.PATH_FIELDS, key)))
+            for key, count in counts.items()
+        ], batch_size=1000)
+    logger.info(f'Rebuilt {len(counts)} voter facets')
+    return len(counts)
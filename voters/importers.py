@@ -0,0 +1,1152 @@
+import datetime
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from pandas._libs.parsers import STR_NA_VALUES
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+from .constants import EXCEL_FIELD_MAPPING, ENCODED_FIELDS, STATION_FIELD_MAPPING, STATION_FIELDS
+from .facets import facet_deltas, rebuild_facets
+from .models import PollingStation, Voter, VoterFacet, VoterGram, VoterRollup
+from .rollups import rebuild_rollups, rollup_deltas
+from .search import INDEX_BATCH_SIZE, index_created, index_voters, index_voters_after
+from .utils import normalize_card_no, normalize_mobile_numbers, phonetic_key
+
+logger = logging.getLogger(__name__)
+
+# Number of spreadsheet rows held in memory at any one time
+DEFAULT_CHUNK_SIZE = 5000
+
+# Format used for date cells when they are stored as text
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Workbook formats openpyxl can stream
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Text cells read as missing, the same default markers as pandas.read_excel
+NA_VALUES = frozenset(STR_NA_VALUES)
+
+# Connection with LOAD DATA LOCAL INFILE enabled, configured in settings
+# only when DB_LOCAL_INFILE is set
+IMPORT_DB_ALIAS = 'voter_import'
+
+# Bump when the layout of the columnar cache files changes
+CACHE_VERSION = 2
+
+# Sheet columns read into model fields, the voter's and its station's
+IMPORT_FIELD_MAPPING = {**EXCEL_FIELD_MAPPING, **STATION_FIELD_MAPPING}
+
+# Columns rewritten when a re-imported row has changed
+UPSERT_FIELDS = list(EXCEL_FIELD_MAPPING.values()) + [
+    *Voter.AREA_FIELDS, 'polling_station', 'card_key', 'name_key', 'data', 'row_hash', 'missing_since', 'updated_at'
+]
+
+# Area ids, polling stations and attribute codes this process has
+# resolved. All are protected while voters reference them, so the ids
+# stay valid.
+_known_areas = {}
+_known_stations = {}
+_known_codes = {}
+
+
+def resolve_import_paths(target):
+    """
+    Expand a file, directory or glob pattern into the Excel files it names.
+    """
+    if os.path.isdir(target):
+        paths = [
+            os.path.join(target, name)
+            for name in os.listdir(target)
+            if name.lower().endswith(EXCEL_EXTENSIONS)
+        ]
+    elif any(char in target for char in '*?['):
+        paths = [path for path in glob.glob(target) if os.path.isfile(path)]
+    else:
+        paths = [target]
+    return sorted(paths)
+
+
+def cache_dir():
+    return os.path.join(settings.VOTER_EXCEL_UPLOAD_PATH, 'cache')
+
+
+def file_digest(file_path):
+    """
+    SHA-256 of a file's content, read in 1 MB blocks.
+    """
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def list_sheets(file_path, digest=None):
+    """
+    Return the sheet names of a workbook without loading its rows.
+
+    When the file's ``digest`` is given the names are cached next to the
+    columnar sheet caches, so a cached workbook is never opened again.
+    """
+    manifest = os.path.join(cache_dir(), f'{digest}.sheets.json') if digest else None
+    if manifest and os.path.exists(manifest):
+        with open(manifest) as f:
+            return json.load(f)
+
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        sheet_names = workbook.sheetnames
+    finally:
+        workbook.close()
+
+    if manifest:
+        os.makedirs(cache_dir(), exist_ok=True)
+        with open(manifest, 'w') as f:
+            json.dump(sheet_names, f)
+    return sheet_names
+
+
+def _cell_value(value):
+    """
+    Convert a cell the way pandas.read_excel does: missing value markers
+    become None and whole floats become integers.
+    """
+    if isinstance(value, str):
+        return None if value in NA_VALUES else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _cell_kind(value):
+    """
+    Classify a cell the way pandas infers column types: 'boolean',
+    'integer', 'floating' (numbers or numeric text), 'datetime' or 'object'.
+    """
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'integer'
+    if isinstance(value, float):
+        return 'floating'
+    if isinstance(value, datetime.datetime):
+        return 'datetime'
+    if isinstance(value, str) and '_' not in value:
+        try:
+            int(value)
+            return 'integer'
+        except ValueError:
+            pass
+        try:
+            float(value)
+            return 'floating'
+        except ValueError:
+            pass
+    return 'object'
+
+
+def _data_rows(worksheet, width):
+    """
+    Yield the rows below the header, padded or cut to ``width`` cells.
+    """
+    for row in worksheet.iter_rows(min_row=2, values_only=True):
+        # Read-only sheets often report trailing rows that hold no values
+        row = tuple(_cell_value(value) for value in row[:width]) + (None,) * (width - len(row))
+        if all(value is None for value in row):
+            continue
+        yield row
+
+
+def sheet_column_types(worksheet, width):
+    """
+    Return the dtype pandas.read_excel would give each column of a whole
+    sheet, by column position.
+
+    A column whose cells are all numbers or numeric text is read as int64,
+    or as float64 once any cell of it is missing or fractional. Booleans
+    count as numbers, except in a column holding only booleans and no
+    missing cells, which is bool. A column of dates is datetime64. Other
+    columns are left out and keep their cell values.
+    """
+    kinds = [set() for _ in range(width)]
+    for row in _data_rows(worksheet, width):
+        for position, value in enumerate(row):
+            seen = kinds[position]
+            if value is None:
+                seen.add('missing')
+            elif 'object' not in seen:
+                seen.add(_cell_kind(value))
+
+    types = {}
+    for position, seen in enumerate(kinds):
+        values = seen - {'missing'}
+        if not values or 'object' in values:
+            continue
+        if values == {'datetime'}:
+            types[position] = 'datetime64[us]'
+        elif 'datetime' in values:
+            continue
+        elif seen == {'boolean'}:
+            types[position] = 'bool'
+        else:
+            types[position] = 'int64' if seen <= {'boolean', 'integer'} else 'float64'
+    return types
+
+
+def iter_excel_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, sheet_name=None):
+    """
+    Read an Excel sheet in fixed-size chunks of rows.
+
+    The workbook is opened in openpyxl read-only mode, so only the rows of the
+    current chunk are ever held in memory. Each chunk is yielded as a DataFrame
+    using the header row as column names.
+
+    Cells are typed as pandas.read_excel types the whole sheet: missing value
+    markers are missing and numeric, boolean and date columns get the dtype
+    of the full column. Those dtypes are found by a first pass over the sheet, so a
+    chunk converts exactly like the sheet read in one piece.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+
+        header = next(worksheet.iter_rows(max_row=1, values_only=True), None)
+        if header is None:
+            return
+
+        # Same naming as pandas for headers left blank in the sheet
+        columns = [
+            f'Unnamed: {index}' if value is None else value
+            for index, value in enumerate(header)
+        ]
+        width = len(columns)
+        column_types = sheet_column_types(worksheet, width)
+
+        def frame(batch):
+            df = pd.DataFrame(batch, columns=columns, dtype=object)
+            for position, dtype in column_types.items():
+                series = df.iloc[:, position]
+                if dtype.startswith('datetime'):
+                    series = pd.to_datetime(series)
+                elif dtype != 'bool':
+                    series = pd.to_numeric(series)
+                df.isetitem(position, series.astype(dtype))
+            return df
+
+        batch = []
+        for row in _data_rows(worksheet, width):
+            batch.append(row)
+
+            if len(batch) >= chunk_size:
+                yield frame(batch)
+                batch = []
+
+        if batch:
+            yield frame(batch)
+    finally:
+        workbook.close()
+
+
+def _column_strings(series, integer_numbers, timestamp_format, timestamp_sep=None):
+    """
+    Convert a column without missing values to strings in one operation.
+
+    Object columns are split by value type and each part is converted on its
+    own, the way each value converts by itself: numbers and booleans as
+    numbers, dates other than Timestamps with str().
+    """
+    dtype = series.dtype
+    options = (integer_numbers, timestamp_format, timestamp_sep)
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        if timestamp_sep is not None:
+            texts = [value.isoformat(sep=timestamp_sep) for value in series]
+            return pd.Series(texts, index=series.index, dtype=object)
+        return series.dt.strftime(timestamp_format)
+
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+        if integer_numbers:
+            series = series.astype('int64')
+        return series.astype(str)
+
+    if pd.api.types.infer_dtype(series, skipna=False) == 'string':
+        return series.astype(str)
+
+    parts = []
+    for value_type, part in series.groupby(series.map(type), sort=False):
+        if issubclass(value_type, pd.Timestamp):
+            part = _column_strings(pd.to_datetime(part), *options)
+        elif issubclass(value_type, (bool, int, float, np.bool_, np.number)):
+            part = _column_strings(part.astype(value_type), *options)
+        else:
+            part = part.astype(str)
+        parts.append(part)
+    if not parts:
+        return series.astype(str)
+    return pd.concat(parts).reindex(series.index)
+
+
+def normalize_frame(df, upper_headers=False, missing='', integer_numbers=False,
+                    timestamp_format=TIMESTAMP_FORMAT, timestamp_sep=None, strip=True):
+    """
+    Convert every cell of a DataFrame to text using whole-column operations.
+
+    Missing cells become ``missing``, dates are formatted with
+    ``timestamp_format`` (or written as ISO 8601 text joined by
+    ``timestamp_sep`` when it is given) and numbers are written as text,
+    truncated to integers when ``integer_numbers`` is set. Returns the column
+    names and a list of plain row tuples ready to be turned into ``data``
+    dicts.
+    """
+    columns = df.columns.astype(str)
+    if upper_headers:
+        columns = columns.str.upper()
+
+    values = []
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        missing_mask = series.isna()
+
+        strings = _column_strings(series[~missing_mask], integer_numbers, timestamp_format, timestamp_sep)
+        if strip:
+            strings = strings.str.strip()
+
+        column = pd.Series([missing] * len(series), index=series.index, dtype=object)
+        column[~missing_mask] = strings.to_numpy(dtype=object)
+        values.append(column.tolist())
+
+    return list(columns), list(zip(*values))
+
+
+def rows_to_records(columns, rows):
+    """
+    Build the ``data`` dict of every row returned by ``normalize_frame``.
+    """
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _cache_path(digest, sheet_name, normalize_options):
+    key = json.dumps([CACHE_VERSION, digest, sheet_name, normalize_options], sort_keys=True)
+    return os.path.join(cache_dir(), hashlib.sha256(key.encode('utf-8')).hexdigest() + '.arrow')
+
+
+def read_cached_chunks(path):
+    """
+    Yield the (columns, rows) chunks stored in a columnar cache file.
+
+    The file is memory-mapped, so only the batch being converted is copied
+    into Python objects.
+    """
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            batch = reader.get_batch(index)
+            rows = list(zip(*(column.to_pylist() for column in batch.columns)))
+            yield batch.schema.names, rows
+
+
+def iter_normalized_chunks(file_path, sheet_name=None, chunk_size=DEFAULT_CHUNK_SIZE, digest=None,
+                           use_cache=True, normalize_options=None):
+    """
+    Yield normalized (columns, rows) chunks of one sheet.
+
+    With ``use_cache`` the normalized sheet is kept as an Arrow IPC (Feather)
+    file under ``VOTER_EXCEL_UPLOAD_PATH``, keyed by the file's content hash,
+    the sheet and the normalize options. The first run parses the workbook
+    and writes the cache one chunk at a time; later runs only read the cache.
+    Caching is skipped when pyarrow is not installed.
+    """
+    normalize_options = normalize_options or {}
+
+    if not use_cache or pa is None:
+        for chunk in iter_excel_chunks(file_path, chunk_size=chunk_size, sheet_name=sheet_name):
+            yield normalize_frame(chunk, **normalize_options)
+        return
+
+    path = _cache_path(digest or file_digest(file_path), sheet_name, normalize_options)
+    if os.path.exists(path):
+        yield from read_cached_chunks(path)
+        return
+
+    os.makedirs(cache_dir(), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    sink = writer = None
+    caching = True
+    try:
+        for chunk in iter_excel_chunks(file_path, chunk_size=chunk_size, sheet_name=sheet_name):
+            columns, rows = normalize_frame(chunk, **normalize_options)
+
+            if caching:
+                try:
+                    if writer is None:
+                        schema = pa.schema([(column, pa.string()) for column in columns])
+                        sink = pa.OSFile(temp_path, 'wb')
+                        writer = pa.ipc.new_file(sink, schema)
+                    writer.write_batch(pa.record_batch(
+                        [pa.array(cells, type=pa.string()) for cells in zip(*rows)], schema=schema
+                    ))
+                except Exception as e:
+                    # A failing cache must never stop the import itself
+                    logger.warning(f'Could not cache {file_path}: {str(e)}')
+                    caching = False
+
+            yield columns, rows
+
+        if caching and writer:
+            writer.close()
+            sink.close()
+            writer = sink = None
+            os.replace(temp_path, path)
+    finally:
+        if writer:
+            writer.close()
+        if sink:
+            sink.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def typed_values(columns, rows):
+    """
+    Map a normalized chunk onto the typed Voter columns.
+
+    Columns are matched to model fields through ``IMPORT_FIELD_MAPPING``.
+    Text is cut to the field length, ``AGE`` is coerced to an integer and
+    ``MOBILE NO`` is normalized for the whole chunk at once. Returns one dict
+    of field values per row, including the ``STATION_FIELDS`` that belong to
+    the voter's PollingStation. ``ENCODED_FIELDS`` are returned as text.
+    """
+    fields = {}
+    for position, column in enumerate(columns):
+        field_name = IMPORT_FIELD_MAPPING.get(str(column).strip().upper())
+        if field_name:
+            fields[field_name] = position
+
+    if not rows:
+        return []
+
+    cells = list(zip(*rows))
+    values = {}
+    for field_name, position in fields.items():
+        model = PollingStation if field_name in STATION_FIELDS else Voter
+        field = model._meta.get_field(field_name)
+        series = pd.Series(cells[position], dtype=object).fillna('').astype(str).str.strip()
+
+        if field_name == 'age':
+            ages = pd.to_numeric(series, errors='coerce')
+            ages = ages.where(ages.between(0, 150)).round()
+            series = ages.astype('Int64').astype(object).where(ages.notna(), None)
+        elif field_name == 'mobile_no':
+            series, invalid = normalize_mobile_numbers(series)
+            if invalid.any():
+                logger.warning(f'Skipped {int(invalid.sum())} invalid mobile numbers')
+        else:
+            if field.max_length:
+                series = series.str.slice(0, field.max_length)
+            if field.null or field_name in STATION_FIELDS:
+                series = series.astype(object).where(series != '', None)
+
+        values[field_name] = series.tolist()
+
+    if not values:
+        return [{} for _ in rows]
+
+    names = list(values)
+    return [dict(zip(names, row)) for row in zip(*values.values())]
+
+
+def typed_values_from_data(records):
+    """
+    Map existing ``data`` dicts onto the typed Voter columns.
+
+    Keys are matched case-insensitively, like sheet headers on import.
+    """
+    columns = list(IMPORT_FIELD_MAPPING)
+    rows = []
+    for data in records:
+        cells = {str(key).strip().upper(): value for key, value in (data or {}).items()}
+        rows.append(tuple('' if cells.get(column) is None else str(cells[column]) for column in columns))
+    return typed_values(columns, rows)
+
+
+def row_hash(data):
+    """
+    Content hash of an imported row, used to skip unchanged rows on re-import.
+    """
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def build_voters(columns, rows):
+    """
+    Build unsaved Voter instances with the typed columns, their area and
+    polling station keys, attribute codes and ``data``.
+
+    The polling station columns go to the stations, which are created or
+    updated as needed, and are left out of ``data`` once the voter has a
+    station. ``row_hash`` still covers the whole sheet row.
+    """
+    records = rows_to_records(columns, rows)
+    voters, addresses, labels = [], [], []
+    for data, fields in zip(records, typed_values(columns, rows)):
+        addresses.append(fields.pop('ps_address', None))
+        labels.append({field: fields.pop(field) for field in ENCODED_FIELDS if field in fields})
+        voters.append(Voter(
+            data=data, row_hash=row_hash(data),
+            card_key=normalize_card_no(fields.get('card_no'))[:50],
+            name_key=phonetic_key(fields.get('voter_name'))[:255],
+            **fields
+        ))
+    Voter.encode_attributes(voters, labels, known=_known_codes)
+    Voter.assign_areas(voters, known=_known_areas)
+    Voter.assign_polling_stations(voters, addresses, known=_known_stations)
+    for voter in voters:
+        voter.strip_data()
+    return voters
+
+
+def _last_voter_pk():
+    return Voter.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+
+
+def insert_rows(columns, rows, index=True):
+    """
+    Insert one normalized chunk of rows in a single transaction. With
+    ``index`` off the search grams are left to the caller.
+
+    Returns the number of voters created.
+    """
+    voters = build_voters(columns, rows)
+    with transaction.atomic():
+        last_pk = _last_voter_pk()
+        Voter.objects.bulk_create(voters, batch_size=1000)
+        VoterFacet.adjust(facet_deltas(voters))
+        VoterRollup.adjust(rollup_deltas(voters))
+        if index:
+            index_created(voters, last_pk)
+    return len(voters)
+
+
+def _upsert_key(assembly, card_no, psno, sno):
+    """
+    Identify an imported row by CARD NO, or by its booth serial number
+    (ASSEMBLY, PSNO, SNO) when the card number is missing.
+    """
+    if card_no:
+        return ('card', assembly, card_no)
+    if psno and sno:
+        return ('booth', assembly, psno, sno)
+    return None
+
+
+def _match_key(key, match_assembly):
+    # Card numbers are matched across assemblies unless asked otherwise
+    if key[0] == 'card' and not match_assembly:
+        return ('card', None, key[2])
+    return key
+
+
+def upsert_rows(columns, rows, match_assembly=False, seen=None, unindexed=None):
+    """
+    Insert, update or skip one normalized chunk, matching existing voters.
+
+    Voters are matched on CARD NO, only within the same assembly when
+    ``match_assembly`` is set. Rows without a card number are matched on
+    (ASSEMBLY, PSNO, SNO). When a key repeats, each existing voter is matched
+    by one row at most. Rows whose content hash is unchanged are not written
+    at all. The key of every row is added to ``seen`` for
+    ``flag_missing_voters``. With an ``unindexed`` set no search grams are
+    written: the primary keys of the updated voters are added to it, and
+    the caller indexes them and the new voters later.
+
+    Returns a dict with the number of rows inserted, updated and unchanged.
+    """
+    voters = build_voters(columns, rows)
+    keys = [_upsert_key(v.assembly, v.card_no, v.psno, v.sno) for v in voters]
+
+    card_numbers = {key[2] for key in keys if key and key[0] == 'card'}
+    booths = [key for key in keys if key and key[0] == 'booth']
+
+    lookups = []
+    if card_numbers:
+        lookup = Voter.objects.filter(card_no__in=card_numbers)
+        if match_assembly:
+            lookup = lookup.filter(assembly__in={key[1] for key in keys if key and key[0] == 'card'})
+        lookups.append(lookup)
+    if booths:
+        lookups.append(Voter.objects.filter(
+            Q(card_no__isnull=True) | Q(card_no=''),
+            assembly__in={key[1] for key in booths},
+            psno__in={key[2] for key in booths},
+            sno__in={key[3] for key in booths},
+        ))
+
+    # Keys can repeat, so keep every candidate voter in primary key order
+    existing = {}
+    for lookup in lookups:
+        for stored in lookup.order_by('pk').values(
+            'pk', 'card_no', 'psno', 'sno', 'row_hash', *VoterFacet.PATH_FIELDS, *VoterRollup.SOURCE_FIELDS
+        ):
+            key = _match_key(
+                _upsert_key(stored['assembly'], stored['card_no'], stored['psno'], stored['sno']),
+                match_assembly
+            )
+            existing.setdefault(key, []).append(
+                (stored['pk'], stored['row_hash'], VoterFacet.key_for(stored), VoterRollup.keys_for(stored))
+            )
+
+    now = timezone.now()
+    to_create, to_update, unchanged_ids = [], [], []
+    deltas, rollups = Counter(), Counter()
+    for voter, key in zip(voters, keys):
+        candidates = existing.get(_match_key(key, match_assembly), []) if key else []
+        if not candidates:
+            to_create.append(voter)
+            continue
+
+        # Each existing voter is matched at most once, preferring an identical row
+        same = [candidate for candidate in candidates if candidate[1] == voter.row_hash]
+        candidate = same[0] if same else candidates[0]
+        candidates.remove(candidate)
+        pk, stored_hash, facet_key, rollup_keys = candidate
+
+        if stored_hash == voter.row_hash:
+            unchanged_ids.append(pk)
+        else:
+            voter.pk = pk
+            voter.updated_at = now
+            to_update.append(voter)
+            deltas[facet_key] -= 1
+            rollups.subtract(rollup_keys)
+
+    with transaction.atomic():
+        if to_create:
+            last_pk = _last_voter_pk()
+            Voter.objects.bulk_create(to_create, batch_size=1000)
+            if unindexed is None:
+                index_created(to_create, last_pk)
+        if to_update:
+            Voter.objects.bulk_update(to_update, UPSERT_FIELDS, batch_size=1000)
+            if unindexed is None:
+                VoterGram.index(to_update)
+            else:
+                unindexed.update(voter.pk for voter in to_update)
+        deltas.update(facet_deltas(to_create + to_update))
+        VoterFacet.adjust(deltas)
+        rollups.update(rollup_deltas(to_create + to_update))
+        VoterRollup.adjust(rollups)
+        if unchanged_ids:
+            Voter.objects.filter(
+                pk__in=unchanged_ids, missing_since__isnull=False
+            ).update(missing_since=None)
+
+    if seen is not None:
+        seen.update([key for key in keys if key])
+
+    return {
+        'inserted': len(to_create),
+        'updated': len(to_update),
+        'unchanged': len(unchanged_ids),
+    }
+
+
+def partition_rows(columns, rows, parts, match_assembly=False):
+    """
+    Split a normalized chunk into ``parts`` lists of row positions, putting
+    every row with the same upsert key in the same part. Concurrent writers
+    each upserting their own part can then never both insert a voter that
+    none of them found. Rows without a key are spread round robin.
+    """
+    positions = [[] for _ in range(parts)]
+    for position, fields in enumerate(typed_values(columns, rows)):
+        key = _upsert_key(fields.get('assembly'), fields.get('card_no'), fields.get('psno'), fields.get('sno'))
+        if key:
+            # crc32 rather than hash(), which differs between processes
+            part = zlib.crc32(repr(_match_key(key, match_assembly)).encode('utf-8')) % parts
+        else:
+            part = position % parts
+        positions[part].append(position)
+    return positions
+
+
+def flag_missing_voters(seen, match_assembly=False, batch_size=5000):
+    """
+    Mark voters left out of a re-import by setting ``missing_since``.
+
+    Only voters of the assemblies present in ``seen`` are checked, in primary
+    key batches. Returns the number of voters flagged.
+    """
+    assemblies = {key[1] for key in seen}
+    seen_keys = {_match_key(key, match_assembly) for key in seen}
+
+    queryset = Voter.objects.filter(
+        assembly__in=assemblies, missing_since__isnull=True
+    ).order_by('pk')
+
+    now = timezone.now()
+    flagged, last_id = 0, 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_id)
+            .values_list('pk', 'assembly', 'card_no', 'psno', 'sno')[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        missing = []
+        for pk, assembly, card_no, psno, sno in batch:
+            key = _upsert_key(assembly, card_no, psno, sno)
+            if key and _match_key(key, match_assembly) not in seen_keys:
+                missing.append(pk)
+        if missing:
+            flagged += Voter.objects.filter(pk__in=missing).update(missing_since=now)
+
+    return flagged
+
+
+def stream_import(file_path, chunk_size=DEFAULT_CHUNK_SIZE, sheet_name=None, progress=None,
+                  use_cache=True, **normalize_options):
+    """
+    Import voters from an Excel file one chunk at a time.
+
+    Each chunk is converted by ``normalize_frame`` using ``normalize_options``
+    (or read from the columnar cache), inserted in its own transaction and
+    released before the next one is read, so peak memory does not depend on
+    the size of the file.
+    ``progress`` is called after each chunk with the running total and the
+    current rows/sec rate.
+
+    Returns the number of voters imported.
+    """
+    total = 0
+    started = time.monotonic()
+
+    chunks = iter_normalized_chunks(
+        file_path,
+        sheet_name=sheet_name,
+        chunk_size=chunk_size,
+        use_cache=use_cache,
+        normalize_options=normalize_options
+    )
+    for columns, rows in chunks:
+        total += insert_rows(columns, rows)
+        del rows
+
+        if progress:
+            elapsed = time.monotonic() - started
+            progress(total, total / elapsed if elapsed else 0.0)
+
+    logger.info(f'Imported {total} voters from {file_path}')
+    return total
+
+
+def _parse_sheet(file_path, sheet_name, chunk_size, queues, digest, use_cache, normalize_options,
+                 validator=None, match_assembly=False):
+    """
+    Parse one sheet in a worker process and hand its chunks to the writers,
+    along with the validation errors of each chunk when a validator is given.
+
+    With one queue per writer (upserts) each chunk is split by
+    ``partition_rows``, so a key is only ever written by one writer.
+
+    Returns the number of rows parsed.
+    """
+    parsed = 0
+    chunks = iter_normalized_chunks(
+        file_path,
+        sheet_name=sheet_name,
+        chunk_size=chunk_size,
+        digest=digest,
+        use_cache=use_cache,
+        normalize_options=normalize_options
+    )
+    for columns, rows in chunks:
+        errors = validator.validate_rows(columns, rows) if validator else {}
+        # Sheet row numbers, after the header row
+        row_numbers = range(parsed + 2, parsed + len(rows) + 2)
+        if len(queues) == 1:
+            queues[0].put((file_path, sheet_name, list(row_numbers), columns, rows, errors))
+        else:
+            for queue, positions in zip(queues, partition_rows(columns, rows, len(queues), match_assembly)):
+                if positions:
+                    part_errors = {
+                        index: errors[position] for index, position in enumerate(positions) if position in errors
+                    }
+                    queue.put((
+                        file_path, sheet_name, [row_numbers[position] for position in positions], columns,
+                        [rows[position] for position in positions], part_errors
+                    ))
+        parsed += len(rows)
+    return parsed
+
+
+def _infile_fields():
+    return [field for field in Voter._meta.concrete_fields if not field.primary_key]
+
+
+def _infile_value(value):
+    # MySQL's default LOAD DATA escaping, with \N for NULL
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+        .replace('\0', '\\0')
+    )
+
+
+def stage_rows(staging_file, columns, rows):
+    """
+    Append one normalized chunk to a LOAD DATA staging file.
+
+    Values are prepared exactly as the ORM would save them. Returns the number
+    of rows written.
+    """
+    fields = _infile_fields()
+    voters = build_voters(columns, rows)
+    for voter in voters:
+        values = [field.get_db_prep_save(field.pre_save(voter, True), connection) for field in fields]
+        staging_file.write('\t'.join(_infile_value(value) for value in values) + '\n')
+    return len(voters)
+
+
+def load_staged_rows(path, columns=None, model=Voter):
+    """
+    Load a staging file into the table of ``model``, voters_voter by
+    default, with LOAD DATA LOCAL INFILE.
+
+    The load runs on the ``IMPORT_DB_ALIAS`` connection, the only one
+    allowed to read local files. The whole file is loaded in one
+    transaction. Voters are loaded with unique and foreign key checks
+    switched off for the session until the load ends; other tables keep
+    them, so rows already present are skipped.
+    """
+    import_connection = connections[IMPORT_DB_ALIAS]
+    quote_name = import_connection.ops.quote_name
+    columns = columns or [field.column for field in _infile_fields()]
+    sql = (
+        f'LOAD DATA LOCAL INFILE %s INTO TABLE {quote_name(model._meta.db_table)} '
+        f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+        f"LINES TERMINATED BY '\\n' ({', '.join(quote_name(column) for column in columns)})"
+    )
+    with transaction.atomic(using=IMPORT_DB_ALIAS), import_connection.cursor() as cursor:
+        if model is not Voter:
+            cursor.execute(sql, [path])
+            return
+        cursor.execute('SET SESSION unique_checks = 0, foreign_key_checks = 0')
+        try:
+            cursor.execute(sql, [path])
+        finally:
+            cursor.execute('SET SESSION unique_checks = 1, foreign_key_checks = 1')
+
+
+def load_voter_grams(last_pk, batch_size=INDEX_BATCH_SIZE):
+    """
+    Index the voters with a primary key above ``last_pk`` like
+    index_voters_after(), but stage their grams to a file and load it with
+    load_staged_rows().
+
+    Returns the number of voters indexed.
+    """
+    indexed = 0
+    with tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', suffix='.tsv', dir=settings.TEMP_DIR, delete=False
+    ) as staging_file:
+        while True:
+            batch = list(
+                Voter.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values('pk', *VoterGram.SOURCE_FIELDS)[:batch_size]
+            )
+            if not batch:
+                break
+            for voter in batch:
+                for row in VoterGram.rows_for(voter):
+                    staging_file.write('\t'.join(_infile_value(value) for value in row) + '\n')
+            last_pk = batch[-1]['pk']
+            indexed += len(batch)
+    try:
+        if indexed:
+            load_staged_rows(staging_file.name, columns=VoterGram.ROW_COLUMNS, model=VoterGram)
+    finally:
+        os.remove(staging_file.name)
+    return indexed
+
+
+def local_infile_available():
+    """
+    Check that both the server and the import connection allow LOAD DATA
+    LOCAL INFILE by loading an empty file.
+    """
+    if IMPORT_DB_ALIAS not in settings.DATABASES:
+        logger.warning('LOAD DATA LOCAL INFILE is not available: DB_LOCAL_INFILE is not set')
+        return False
+    if connections[IMPORT_DB_ALIAS].vendor != 'mysql':
+        return False
+
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', dir=settings.TEMP_DIR, delete=False) as f:
+        path = f.name
+    try:
+        load_staged_rows(path, columns=['card_no'])
+        return True
+    except DatabaseError as e:
+        logger.warning(f'LOAD DATA LOCAL INFILE is not available: {str(e)}')
+        return False
+    finally:
+        os.remove(path)
+
+
+def _report_progress(context, count):
+    with context['lock']:
+        context['processed'] += count
+        if context['progress']:
+            elapsed = time.monotonic() - context['started']
+            total = context['processed']
+            context['progress'](total, total / elapsed if elapsed else 0.0)
+
+
+def _load_staging_file(staging_file, staged, context):
+    """
+    Load a writer's staging file and record the outcome per source file.
+    """
+    summary, lock = context['summary'], context['lock']
+    staging_file.close()
+    last_pk = _last_voter_pk()
+    try:
+        if any(staged.values()):
+            load_staged_rows(staging_file.name)
+    except Exception as e:
+        logger.error(f'Error loading staged rows: {str(e)}', exc_info=True)
+        with lock:
+            for file_path, count in staged.items():
+                summary[file_path]['failed'] += count
+                summary[file_path]['errors'].append(str(e))
+    else:
+        with lock:
+            for file_path, count in staged.items():
+                summary[file_path]['inserted'] += count
+        # Staged rows bypass the ORM, so recount the summaries from the table
+        if any(staged.values()):
+            rebuild_facets()
+            rebuild_rollups()
+            if context['unindexed'] is None:
+                load_voter_grams(last_pk)
+    finally:
+        os.remove(staging_file.name)
+
+
+def _write_chunks(queue, context):
+    """
+    Write queued chunks until a ``None`` sentinel arrives.
+
+    Runs in a writer thread, which holds its own database connection. Chunks
+    are inserted, upserted, or with ``fast_load`` appended to a staging file
+    that is loaded once the sentinel arrives. Invalid rows are counted and
+    reported, and dropped with ``skip_invalid``; with ``dry_run`` nothing is
+    written.
+    """
+    summary, lock = context['summary'], context['lock']
+    staging_file, staged = None, {}
+    if context['fast_load']:
+        staging_file = tempfile.NamedTemporaryFile(
+            'w', encoding='utf-8', suffix='.tsv', dir=settings.TEMP_DIR, delete=False
+        )
+
+    try:
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+
+            file_path, sheet_name, row_numbers, columns, rows, errors = item
+            if errors:
+                with lock:
+                    summary[file_path]['invalid'] += len(errors)
+                if context['on_invalid']:
+                    for index in sorted(errors):
+                        context['on_invalid'](file_path, sheet_name, row_numbers[index], errors[index])
+                if context['skip_invalid']:
+                    rows = [row for index, row in enumerate(rows) if index not in errors]
+
+            try:
+                if context['dry_run']:
+                    counts = {}
+                elif staging_file:
+                    staged[file_path] = staged.get(file_path, 0) + stage_rows(staging_file, columns, rows)
+                    counts = {}
+                elif context['upsert']:
+                    counts = upsert_rows(
+                        columns, rows,
+                        match_assembly=context['match_assembly'],
+                        seen=context['seen'],
+                        unindexed=context['unindexed']
+                    )
+                else:
+                    counts = {'inserted': insert_rows(columns, rows, index=context['unindexed'] is None)}
+            except Exception as e:
+                logger.error(f'Error inserting rows from {file_path}: {str(e)}', exc_info=True)
+                with lock:
+                    summary[file_path]['failed'] += len(rows)
+                    summary[file_path]['errors'].append(str(e))
+                continue
+
+            with lock:
+                for key, count in counts.items():
+                    summary[file_path][key] += count
+            _report_progress(context, len(rows))
+
+        if staging_file:
+            _load_staging_file(staging_file, staged, context)
+    finally:
+        # The thread's default and import connections
+        connections.close_all()
+
+
+def parallel_import(paths, workers=None, writers=2, chunk_size=DEFAULT_CHUNK_SIZE, progress=None,
+                    upsert=False, match_assembly=False, seen=None, fast_load=False,
+                    use_cache=True, validator=None, on_invalid=None, skip_invalid=False,
+                    dry_run=False, summary=None, defer_index=False, **normalize_options):
+    """
+    Import every sheet of several workbooks using a pool of parser processes.
+
+    Sheets are parsed and normalized in up to ``workers`` processes. Their
+    chunks go through a bounded queue to ``writers`` threads, each with its own
+    database connection, so memory and connection use stay capped however many
+    files are loaded. With ``upsert`` the writers use ``upsert_rows`` and each
+    has its own queue, fed the rows of its share of the keys; with
+    ``fast_load`` each writer stages its rows to a file and loads it with
+    ``load_staged_rows`` at the end. Workbooks seen before are read from the
+    columnar cache unless ``use_cache`` is off.
+
+    With a ``validator`` (see ``voters.validation``) every chunk is validated
+    in the parser processes. ``on_invalid(path, sheet, row_number, errors)`` is
+    called for each invalid row, ``skip_invalid`` leaves them out, and
+    ``dry_run`` validates without writing anything.
+
+    The search grams make up most of the write time. With ``defer_index``
+    the writers skip them and the new and updated voters are indexed in one
+    pass once every sheet is written, so searches miss them until the
+    import ends.
+
+    Returns a summary dict keyed by file path with the number of sheets, rows
+    parsed, inserted, updated, unchanged, invalid and failed, and any error
+    messages. Pass a dict as ``summary`` to read the counts while the import
+    runs, e.g. from ``progress``.
+    """
+    summary = {} if summary is None else summary
+    for path in paths:
+        summary[path] = {
+            'sheets': 0, 'parsed': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0,
+            'invalid': 0, 'failed': 0, 'errors': [],
+        }
+    context = {
+        'summary': summary,
+        'lock': threading.Lock(),
+        'progress': progress,
+        'started': time.monotonic(),
+        'processed': 0,
+        'upsert': upsert,
+        'match_assembly': match_assembly,
+        'seen': seen,
+        'fast_load': fast_load and not dry_run,
+        'on_invalid': on_invalid,
+        'skip_invalid': skip_invalid,
+        'dry_run': dry_run,
+        'unindexed': set() if defer_index and not dry_run else None,
+    }
+    lock = context['lock']
+    last_pk = _last_voter_pk()
+
+    # The queue manager forks before any writer thread exists, and without
+    # the parent's open connections
+    connections.close_all()
+
+    with multiprocessing.Manager() as manager:
+        if upsert and not dry_run:
+            queues = [manager.Queue(maxsize=2) for _ in range(writers)]
+        else:
+            queues = [manager.Queue(maxsize=writers * 2)]
+
+        # Parsers are spawned rather than forked, so they never inherit the
+        # writer threads' MySQL sockets or a lock held by one of them
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+        )
+        writer_threads = [
+            threading.Thread(target=_write_chunks, args=(queues[index % len(queues)], context))
+            for index in range(writers)
+        ]
+        for thread in writer_threads:
+            thread.start()
+
+        try:
+            with pool:
+                futures = {}
+                for path in paths:
+                    try:
+                        digest = file_digest(path) if use_cache and pa is not None else None
+                        sheet_names = list_sheets(path, digest)
+                    except Exception as e:
+                        logger.error(f'Error opening {path}: {str(e)}')
+                        summary[path]['errors'].append(str(e))
+                        continue
+
+                    summary[path]['sheets'] = len(sheet_names)
+                    for sheet_name in sheet_names:
+                        future = pool.submit(
+                            _parse_sheet, path, sheet_name, chunk_size, queues, digest, use_cache,
+                            normalize_options, validator, match_assembly
+                        )
+                        futures[future] = (path, sheet_name)
+
+                for future in as_completed(futures):
+                    path, sheet_name = futures[future]
+                    try:
+                        parsed = future.result()
+                    except Exception as e:
+                        logger.error(f'Error parsing {path} [{sheet_name}]: {str(e)}')
+                        with lock:
+                            summary[path]['errors'].append(f'{sheet_name}: {str(e)}')
+                        continue
+                    with lock:
+                        summary[path]['parsed'] += parsed
+        finally:
+            for index in range(len(writer_threads)):
+                queues[index % len(queues)].put(None)
+            for thread in writer_threads:
+                thread.join()
+
+    if context['unindexed'] is not None:
+        if context['fast_load']:
+            load_voter_grams(last_pk)
+        else:
+            index_voters_after(last_pk)
+        index_voters(context['unindexed'])
+
+    return summary
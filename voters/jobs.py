@@ -0,0 +1,202 @@
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import VoterJob
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress writes from a running job
+PROGRESS_INTERVAL = 1.0
+
+# Statuses of a job whose process should still be alive
+ACTIVE_STATUSES = ('pending', 'running')
+
+# Popen handles of jobs started by this process, polled so that finished
+# jobs do not linger as zombie processes
+_processes = []
+
+
+def save_upload(uploaded_file, directory=None):
+    """
+    Write an uploaded file to ``directory`` (VOTER_EXCEL_UPLOAD_PATH by
+    default) chunk by chunk, under a timestamped name.
+
+    Returns the path of the saved file.
+    """
+    directory = directory or settings.VOTER_EXCEL_UPLOAD_PATH
+    os.makedirs(directory, exist_ok=True)
+    file_name = f"{timezone.now():%Y%m%d%H%M%S}_{get_valid_filename(os.path.basename(uploaded_file.name))}"
+    file_path = os.path.join(directory, file_name)
+
+    with open(file_path, 'wb') as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+
+    return file_path
+
+
+def job_log_path(job):
+    return os.path.join(settings.TEMP_DIR, f'voter_job_{job.pk}.log')
+
+
+def start_job(job, command, *args):
+    """
+    Run ``manage.py <command> <args> --job <id>`` in a detached process, so
+    the work happens outside the web worker that created the job.
+    """
+    _reap_processes()
+
+    arguments = [
+        sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), command,
+        *[str(arg) for arg in args], '--job', str(job.pk)
+    ]
+    with open(job_log_path(job), 'ab') as log_file:
+        process = subprocess.Popen(
+            arguments,
+            cwd=settings.BASE_DIR,
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+    _processes.append(process)
+
+    VoterJob.objects.filter(pk=job.pk).update(pid=process.pid, host=socket.gethostname())
+    logger.info(f'Started {command} job {job.pk} (pid {process.pid})')
+    return process
+
+
+def _reap_processes():
+    for process in list(_processes):
+        if process.poll() is not None:
+            _processes.remove(process)
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running under another user
+        return True
+    return True
+
+
+def start_import_job(file_path, options=None, user=None):
+    """
+    Create an import job for ``file_path`` and start ``import_voters`` on it.
+
+    ``options`` maps import_voters flags without their dashes to values,
+    e.g. ``{'upsert': True, 'chunk_size': 2000}``.
+    """
+    options = options or {}
+    job = VoterJob.objects.create(kind='import', file_path=file_path, options=options, created_by=user)
+    start_job(job, 'import_voters', file_path, *_flags(options))
+    return job
+
+
+def start_delete_job(options, user=None):
+    """
+    Create a delete job and start ``delete_voters`` with ``options``, its
+    flags without their dashes, e.g. ``{'assembly_id': 3}`` or
+    ``{'selection': token, 'sleep': 0.1}``.
+    """
+    job = VoterJob.objects.create(kind='delete', options=options, created_by=user)
+    start_job(job, 'delete_voters', *_flags(options))
+    return job
+
+
+def start_notify_job(options, user=None):
+    """
+    Create a notify job and start ``notify_voters`` with ``options``, its
+    flags without their dashes, e.g. ``{'selection': token,
+    'template_id': 2, 'channel': 'SMS'}``.
+    """
+    job = VoterJob.objects.create(kind='notify', options=options, created_by=user)
+    start_job(job, 'notify_voters', *_flags(options))
+    return job
+
+
+def _flags(options):
+    """
+    Command line flags of ``options``, as taken by the job commands.
+    """
+    args = []
+    for option, value in options.items():
+        flag = '--' + option.replace('_', '-')
+        if value is True:
+            args.append(flag)
+        elif value not in (None, False, ''):
+            args.extend([flag, value])
+    return args
+
+
+class JobReporter:
+    """
+    Updates a VoterJob from inside the command that runs it. Progress writes
+    are throttled to one every PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.last_update = 0.0
+
+    def start(self):
+        VoterJob.objects.filter(pk=self.job_id).update(
+            status='running', started_at=timezone.now(), pid=os.getpid(), host=socket.gethostname()
+        )
+
+    def progress(self, force=False, **counts):
+        now = time.monotonic()
+        if not force and now - self.last_update < PROGRESS_INTERVAL:
+            return
+        self.last_update = now
+        VoterJob.objects.filter(pk=self.job_id).update(**counts)
+
+    def finish(self, errors=None, **counts):
+        VoterJob.objects.filter(pk=self.job_id).update(
+            status='failed' if errors else 'completed',
+            errors=errors or [],
+            finished_at=timezone.now(),
+            **counts
+        )
+
+
+def job_progress(job_id):
+    """
+    Return the status and row counts of a job as a dict, or None if there is
+    no such job. Reads a single row and no related objects.
+
+    A pending or running job whose process on this host has exited without
+    reporting a result, e.g. killed or out of memory, is marked failed.
+    """
+    fields = (
+        'id', 'kind', 'status', 'file_path', 'parsed', 'inserted', 'updated', 'invalid',
+        'failed', 'deleted', 'sent', 'errors', 'created_at', 'started_at', 'finished_at'
+    )
+    progress = VoterJob.objects.filter(pk=job_id).values(*fields, 'pid', 'host').first()
+    if progress is None:
+        return None
+    pid, host = progress.pop('pid'), progress.pop('host')
+    if progress['status'] not in ACTIVE_STATUSES or not pid or host != socket.gethostname():
+        return progress
+
+    _reap_processes()
+    if _process_exists(pid):
+        return progress
+    # Only if the process did not finish the job since its status was read
+    errors = [*progress['errors'], f'Job process {pid} exited without reporting a result']
+    if VoterJob.objects.filter(pk=job_id, status=progress['status'], pid=pid).update(
+        status='failed', errors=errors, finished_at=timezone.now()
+    ):
+        logger.warning(f'Voter job {job_id} failed: process {pid} is gone')
+    return VoterJob.objects.filter(pk=job_id).values(*fields).first()
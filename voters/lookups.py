@@ -0,0 +1,174 @@
+import logging
+import time
+
+from .constants import AREA_FILTERS, STATION_FILTER
+from .models import PollingStation, Voter
+from .utils import area_filters, normalize_card_no, normalize_mobile_number
+
+logger = logging.getLogger(__name__)
+
+# Identifier kinds accepted by lookup_voters()
+IDENTIFIER_KINDS = ('card_no', 'mobile_no', 'booth_serial')
+
+# Identifiers resolved per query, and per batch request at most
+LOOKUP_CHUNK_SIZE = 1000
+MAX_BATCH_IDENTIFIERS = 5000
+
+# Voter columns returned for each match
+LOOKUP_FIELDS = (
+    'voter_name', 'rel_name', 'age', 'card_no', 'mobile_no', 'hno',
+    'mlc_constituency', 'assembly', 'mandal', 'location', 'psno', 'sno',
+    'assembly_area_id', 'mandal_area_id', 'polling_station_id',
+)
+
+# Voters read per batch while backfilling
+BACKFILL_BATCH_SIZE = 5000
+
+
+def booth_serial(psno, sno):
+    """
+    Identifier of a voter by booth and serial number, as used in the
+    batch lookup results.
+    """
+    return f'{str(psno).strip()}/{str(sno).strip()}'
+
+
+def _normalize(kind, identifier):
+    """
+    Lookup key of ``identifier``, or None if it cannot match any voter.
+    """
+    if kind == 'card_no':
+        return normalize_card_no(identifier) or None
+    if kind == 'mobile_no':
+        try:
+            return normalize_mobile_number(identifier)
+        except ValueError:
+            return None
+    if isinstance(identifier, dict):
+        psno, sno = identifier.get('psno'), identifier.get('sno')
+    else:
+        psno, _, sno = str(identifier).partition('/')
+    if psno in (None, '') or sno in (None, ''):
+        return None
+    return booth_serial(psno, sno)
+
+
+def _scoped(params):
+    ids = area_filters(params)
+    return Voter.objects.filter(**{
+        column: ids[param] for param, column in [*AREA_FILTERS, STATION_FILTER] if param in ids
+    })
+
+
+def _matches(kind, keys, voters, assembly_id):
+    """
+    Voters of ``voters`` matching ``keys``, as (key, voter dict) pairs.
+    """
+    if kind == 'card_no':
+        rows = voters.filter(card_key__in=keys)
+        return ((row['card_key'], row) for row in rows.values('id', 'card_key', *LOOKUP_FIELDS))
+    if kind == 'mobile_no':
+        rows = voters.filter(mobile_no__in=keys)
+        return ((row['mobile_no'], row) for row in rows.values('id', *LOOKUP_FIELDS))
+
+    # Booth serials go through the assembly's polling stations, then
+    # voter_station_serial_idx
+    serials = [key.split('/', 1) for key in keys]
+    stations = dict(
+        PollingStation.objects.filter(assembly_id=assembly_id, psno__in={psno for psno, _ in serials})
+        .values_list('id', 'psno')
+    )
+    rows = voters.filter(polling_station_id__in=list(stations), sno__in={sno for _, sno in serials})
+    return (
+        (booth_serial(stations[row['polling_station_id']], row['sno']), row)
+        for row in rows.values('id', *LOOKUP_FIELDS)
+    )
+
+
+def lookup_voters(kind, identifiers, params=None):
+    """
+    Resolve ``identifiers`` of ``kind`` (one of IDENTIFIER_KINDS) to voters
+    through the indexed identifier columns, narrowed by the area ids of
+    ``params``. Booth serials are "psno/sno" strings or dicts with psno and
+    sno and need the assembly_id of ``params``.
+
+    Returns a dict with ``data``, mapping each normalized identifier to its
+    list of voter dicts, ``not_found`` and ``invalid`` identifiers.
+    Raises ValueError for an unknown kind, a missing assembly_id or too
+    many identifiers.
+    """
+    if kind not in IDENTIFIER_KINDS:
+        raise ValueError(f'Unknown identifier type: {kind}')
+    if len(identifiers) > MAX_BATCH_IDENTIFIERS:
+        raise ValueError(f'At most {MAX_BATCH_IDENTIFIERS} identifiers can be looked up at once')
+
+    params = params or {}
+    voters = _scoped(params)
+    assembly_id = area_filters(params).get('assembly_id')
+    if kind == 'booth_serial' and assembly_id is None:
+        raise ValueError('assembly_id is required to look up booth serial numbers')
+
+    keys, invalid = [], []
+    for identifier in identifiers:
+        key = _normalize(kind, identifier)
+        if key is None:
+            invalid.append(identifier)
+        elif key not in keys:
+            keys.append(key)
+
+    data = {key: [] for key in keys}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        for key, voter in _matches(kind, keys[start:start + LOOKUP_CHUNK_SIZE], voters, assembly_id):
+            if key in data:
+                voter.pop('card_key', None)
+                data[key].append(voter)
+
+    return {
+        'data': {key: matches for key, matches in data.items() if matches},
+        'not_found': [key for key, matches in data.items() if not matches],
+        'invalid': invalid,
+    }
+
+
+def backfill_identifiers(batch_size=BACKFILL_BATCH_SIZE, sleep=0, progress=None):
+    """
+    Fill card_key and normalize mobile_no for voters saved before they were
+    normalized on write, in primary key batches. Mobile numbers that cannot
+    be normalized are left as stored. Only voters that change are written.
+
+    ``progress`` is called with (last primary key, voters updated).
+    Returns the number of voters updated.
+    """
+    last_pk, updated = 0, 0
+    while True:
+        batch = list(
+            Voter.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'card_no', 'card_key', 'mobile_no')[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        changed = []
+        for voter in batch:
+            card_key = normalize_card_no(voter.card_no)[:50]
+            mobile_no = voter.mobile_no
+            if mobile_no:
+                try:
+                    mobile_no = normalize_mobile_number(mobile_no)
+                except ValueError:
+                    pass
+            if (card_key, mobile_no) != (voter.card_key, voter.mobile_no):
+                voter.card_key, voter.mobile_no = card_key, mobile_no
+                changed.append(voter)
+        if changed:
+            Voter.objects.bulk_update(changed, ['card_key', 'mobile_no'], batch_size=1000)
+            updated += len(changed)
+
+        if progress:
+            progress(last_pk, updated)
+        if sleep:
+            time.sleep(sleep)
+
+    logger.info(f'Backfilled the identifiers of {updated} voters')
+    return updated
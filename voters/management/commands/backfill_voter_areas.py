@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from voters.areas import backfill_areas
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Create the geography areas and point every voter at them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to wait between hierarchy paths to limit load on the database'
+        )
+
+    def handle(self, *args, **options):
+        def progress(done, total, updated):
+            if done % 100 == 0 or done == total:
+                self.stdout.write(f'Processed {done}/{total} paths, {updated} voters updated')
+
+        try:
+            updated = backfill_areas(sleep=options['sleep'], progress=progress)
+            self.stdout.write(self.style.SUCCESS(f'Backfill complete: {updated} voters updated'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error backfilling voter areas: {str(e)}'))
+            logger.error(f'Error backfilling voter areas: {str(e)}', exc_info=True)
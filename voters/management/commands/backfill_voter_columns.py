@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from voters.constants import EXCEL_FIELD_MAPPING, ENCODED_FIELDS
+from voters.importers import typed_values_from_data
+from voters.models import Voter, VoterFacet, VoterGram, VoterRollup
+from voters.utils import normalize_card_no, phonetic_key
+
+logger = logging.getLogger(__name__)
+
+TYPED_FIELDS = list(EXCEL_FIELD_MAPPING.values())
+
+# Columns that decide the voter's area and polling station keys
+KEY_FIELDS = {*VoterFacet.PATH_FIELDS, 'psno'}
+
+
+class Command(BaseCommand):
+    help = 'Copy values from Voter.data into the typed voter columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of primary keys covered by each UPDATE'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.1,
+            help='Seconds to wait between batches to limit load on the database'
+        )
+        parser.add_argument(
+            '--checkpoint-file', type=str,
+            default=os.path.join(settings.MEDIA_ROOT, 'backfill_voter_columns.json'),
+            help='File recording the last primary key processed'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore the checkpoint and start from the first voter'
+        )
+
+    def read_checkpoint(self, path):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def write_checkpoint(self, path, last_id, updated):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'last_id': last_id,
+                'updated': updated,
+                'saved_at': timezone.now().isoformat(),
+            }, f)
+        os.replace(temp_path, path)
+
+    def backfill_batch(self, start_id, end_id):
+        """
+        Fill the empty typed columns of voters with start_id < id <= end_id.
+
+        Only columns that are still empty are written, so values edited since
+        the import are never overwritten. The facet and rollup counts and the
+        search grams of the updated voters are adjusted in the same
+        transaction. Returns the number of rows updated.
+        """
+        with transaction.atomic():
+            voters = list(
+                Voter.objects.select_for_update().filter(pk__gt=start_id, pk__lte=end_id)
+                .only('id', 'data', 'polling_station', *Voter.AREA_FIELDS, *TYPED_FIELDS)
+                .order_by('pk')
+            )
+            if not voters:
+                return 0
+            return self.backfill_voters(voters)
+
+    def backfill_voters(self, voters):
+        """
+        Fill and save the empty typed columns of locked ``voters``, loaded
+        with their stored summary keys.
+        """
+        changed_voters, addresses, labels = [], [], []
+        changed_fields = set()
+        for voter, values in zip(voters, typed_values_from_data(v.data for v in voters)):
+            changed = False
+            label = {}
+            for field_name, value in values.items():
+                if field_name not in TYPED_FIELDS or value in (None, ''):
+                    continue
+                if field_name in ENCODED_FIELDS:
+                    # Compare the code, without loading the AttributeValue
+                    if getattr(voter, f'{field_name}_id') is not None:
+                        continue
+                    label[field_name] = value
+                elif getattr(voter, field_name) not in (None, ''):
+                    continue
+                else:
+                    setattr(voter, field_name, value)
+                changed_fields.add(field_name)
+                changed = True
+            if changed:
+                changed_voters.append(voter)
+                addresses.append(values.get('ps_address'))
+                labels.append(label)
+
+        if changed_fields & set(ENCODED_FIELDS):
+            Voter.encode_attributes(changed_voters, labels)
+
+        if 'voter_name' in changed_fields:
+            for voter in changed_voters:
+                voter.name_key = phonetic_key(voter.voter_name)[:255]
+            changed_fields.add('name_key')
+
+        if 'card_no' in changed_fields:
+            for voter in changed_voters:
+                voter.card_key = normalize_card_no(voter.card_no)[:50]
+            changed_fields.add('card_key')
+
+        if changed_fields & KEY_FIELDS:
+            Voter.assign_areas(changed_voters)
+            Voter.assign_polling_stations(changed_voters, addresses)
+            changed_fields.update([*Voter.AREA_FIELDS, 'polling_station'])
+
+        if changed_voters:
+            # The station and attribute codes now hold values kept in data
+            # until now
+            for voter in changed_voters:
+                voter.strip_data()
+            changed_fields.add('data')
+
+            # One set-based UPDATE per batch instead of a save() per voter,
+            # moving the summaries of the voters from their stored keys
+            Voter.objects.bulk_update(changed_voters, sorted(changed_fields))
+            facets, rollups = Counter(), Counter()
+            for voter in changed_voters:
+                facets[voter._facet_key] -= 1
+                facets[VoterFacet.key_for(voter)] += 1
+                rollups.subtract(voter._rollup_keys)
+                rollups.update(VoterRollup.keys_for(voter))
+            VoterFacet.adjust(facets)
+            VoterRollup.adjust(rollups)
+            VoterGram.index(
+                voter for voter in changed_voters if VoterGram.search_values(voter) != voter._search_values
+            )
+        return len(changed_voters)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checkpoint_file = options['checkpoint_file']
+
+        bounds = Voter.objects.aggregate(min_id=Min('pk'), max_id=Max('pk'))
+        if bounds['max_id'] is None:
+            self.stdout.write('No voters to backfill')
+            return
+
+        first_id = bounds['min_id'] - 1
+        max_id = bounds['max_id']
+        last_id, updated = first_id, 0
+
+        checkpoint = None if options['restart'] else self.read_checkpoint(checkpoint_file)
+        if checkpoint:
+            last_id, updated = checkpoint['last_id'], checkpoint['updated']
+            self.stdout.write(f'Resuming after voter id {last_id}')
+
+        started = time.monotonic()
+        start_id = last_id
+
+        while last_id < max_id:
+            end_id = min(last_id + batch_size, max_id)
+            try:
+                updated += self.backfill_batch(last_id, end_id)
+            except Exception as e:
+                logger.error(f'Error backfilling voters {last_id}-{end_id}: {str(e)}', exc_info=True)
+                self.stdout.write(self.style.ERROR(
+                    f'Error backfilling voters after id {last_id}: {str(e)}. '
+                    f'Run the command again to resume.'
+                ))
+                return
+
+            last_id = end_id
+            self.write_checkpoint(checkpoint_file, last_id, updated)
+
+            # Progress is estimated from the primary key range, avoiding COUNT(*)
+            elapsed = time.monotonic() - started
+            done = (last_id - first_id) / (max_id - first_id)
+            rate = (last_id - start_id) / elapsed if elapsed else 0
+            remaining = (max_id - last_id) / rate if rate else 0
+            self.stdout.write(
+                f'Processed ids up to {last_id} ({done:.1%}), {updated} voters updated, '
+                f'about {remaining:.0f}s remaining'
+            )
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Backfill complete: {updated} voters updated'))
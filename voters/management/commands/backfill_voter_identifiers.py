@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from voters.lookups import BACKFILL_BATCH_SIZE, backfill_identifiers
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Fill the normalized card number key and normalize the mobile number of every voter'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+            help='Voters read per batch'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to wait between batches to limit load on the database'
+        )
+
+    def handle(self, *args, **options):
+        def progress(last_pk, updated):
+            self.stdout.write(f'Processed ids up to {last_pk}, {updated} voters updated')
+
+        try:
+            updated = backfill_identifiers(options['batch_size'], options['sleep'], progress)
+            self.stdout.write(self.style.SUCCESS(f'Backfill complete: {updated} voters updated'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error backfilling voter identifiers: {str(e)}'))
+            logger.error(f'Error backfilling voter identifiers: {str(e)}', exc_info=True)
@@ -0,0 +1,98 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+
+from voters.constants import ENCODED_FIELDS
+from voters.models import AttributeValue, Voter
+
+logger = logging.getLogger(__name__)
+
+# Bytes of a SMALLINT attribute code
+CODE_BYTES = 2
+
+
+class Command(BaseCommand):
+    help = 'Report the row size saved by the attribute codes and time GROUP BYs on codes against text'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Runs of each GROUP BY; the fastest is reported'
+        )
+        parser.add_argument(
+            '--attribute', action='append', choices=list(ENCODED_FIELDS),
+            help='Attribute to report on, may be repeated (default: all)'
+        )
+
+    def time_query(self, queryset, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.monotonic()
+            groups = len(list(queryset))
+            elapsed = time.monotonic() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, groups
+
+    def table_size(self):
+        if connection.vendor != 'mysql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT table_rows, avg_row_length, data_length, index_length '
+                'FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [Voter._meta.db_table]
+            )
+            return cursor.fetchone()
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+        attributes = options['attribute'] or list(ENCODED_FIELDS)
+
+        total = Voter.objects.count()
+        if not total:
+            self.stdout.write('No voters to benchmark')
+            return
+
+        size = self.table_size()
+        if size:
+            rows, avg_row, data, index = size
+            self.stdout.write(
+                f'{Voter._meta.db_table}: about {rows} rows, {avg_row} bytes per row, '
+                f'{data / 1024 ** 2:.1f} MiB data, {index / 1024 ** 2:.1f} MiB indexes'
+            )
+
+        saved_total = 0
+        for attribute in attributes:
+            coded = Voter.objects.filter(**{f'{attribute}__isnull': False})
+            stats = coded.aggregate(rows=Count('id'), text=Sum(Length(f'{attribute}__value')))
+            rows, text = stats['rows'], stats['text'] or 0
+
+            # NULLs take no row space either way; a VARCHAR stores its text
+            # plus a one byte length
+            text_bytes = text + rows
+            code_bytes = CODE_BYTES * rows
+            saved_total += text_bytes - code_bytes
+
+            code_time, groups = self.time_query(
+                Voter.objects.order_by().values(f'{attribute}_id').annotate(voter_count=Count('id')), repeat
+            )
+            # The text is only on the AttributeValue, so grouping on it joins
+            text_time, _ = self.time_query(
+                Voter.objects.order_by().values(f'{attribute}__value').annotate(voter_count=Count('id')), repeat
+            )
+
+            self.stdout.write(
+                f'{attribute}: {AttributeValue.objects.filter(attribute=attribute).count()} values, '
+                f'{text_bytes / total:.1f} bytes per row as text, {code_bytes / total:.1f} as codes; '
+                f'GROUP BY {groups} codes in {code_time * 1000:.0f}ms, '
+                f'on text in {text_time * 1000:.0f}ms ({text_time / code_time if code_time else 0:.1f}x)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Codes save about {saved_total / total:.1f} bytes per row, '
+            f'{saved_total / 1024 ** 2:.1f} MiB over {total} voters'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from voters.analytics import SNAPSHOT_BATCH_SIZE, build_snapshot, snapshot_path
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Snapshot the voter table into the columnar files memory-mapped by the analytics API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=None,
+            help='Snapshot directory (default: VOTER_ANALYTICS_PATH)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=SNAPSHOT_BATCH_SIZE,
+            help='Voters read per query'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or snapshot_path()
+
+        def progress(rows):
+            self.stdout.write(f'Read {rows} voters')
+
+        try:
+            rows = build_snapshot(path, options['batch_size'], progress)
+            self.stdout.write(self.style.SUCCESS(f'Snapshot of {rows} voters written to {path}'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error building voter snapshot: {str(e)}'))
+            logger.error(f'Error building voter snapshot: {str(e)}', exc_info=True)
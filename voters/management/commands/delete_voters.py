@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from voters.deletes import DELETE_BATCH_SIZE, delete_voters_in_batches
+from voters.jobs import JobReporter
+from voters.models import Voter
+from voters.selections import get_selection, selection_queryset
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Delete the voters of an assembly or a saved selection in small batches'
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument(
+            '--assembly-id', type=int,
+            help='Delete every voter of this assembly, e.g. before re-importing its roll'
+        )
+        target.add_argument(
+            '--selection', type=str,
+            help='Token of the voter selection to delete'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DELETE_BATCH_SIZE,
+            help='Voters deleted per transaction'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to wait between batches to limit load on the database'
+        )
+        parser.add_argument(
+            '--job', type=int, default=None,
+            help='Id of the VoterJob to report progress to (set when started from the admin)'
+        )
+
+    def handle(self, *args, **options):
+        job = JobReporter(options['job']) if options['job'] else None
+        if job:
+            job.start()
+
+        deleted, errors = 0, []
+
+        def progress(count):
+            nonlocal deleted
+            deleted = count
+            self.stdout.write(f'Deleted {count} voters')
+            if job:
+                job.progress(deleted=count)
+
+        try:
+            if options['selection']:
+                queryset = selection_queryset(get_selection(options['selection']))
+            else:
+                queryset = Voter.objects.filter(assembly_area_id=options['assembly_id'])
+            deleted = delete_voters_in_batches(queryset, options['batch_size'], options['sleep'], progress)
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} voters'))
+        except Exception as e:
+            errors.append(f'Error deleting voters: {str(e)}')
+            self.stdout.write(self.style.ERROR(errors[-1]))
+            logger.error(f'Error deleting voters: {str(e)}', exc_info=True)
+
+        if job:
+            job.finish(errors=errors, deleted=deleted)
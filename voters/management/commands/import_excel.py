@@ -1,7 +1,5 @@
 from django.core.management.base import BaseCommand
-import pandas as pd
-from voters.models import Voter
-from django.db import transaction
+from voters.importers import stream_import, DEFAULT_CHUNK_SIZE
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,45 +10,30 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('excel_file', type=str, help='Path to Excel file')
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Number of rows read and inserted at a time'
+        )
+        parser.add_argument(
+            '--no-cache', action='store_true',
+            help='Parse the workbook even if a columnar cache of it exists'
+        )
+
+    def report_progress(self, total, rate):
+        self.stdout.write(f'Imported {total} voters ({rate:.0f} rows/sec)')
 
     def handle(self, *args, **options):
         try:
-            file_path = options['excel_file']
-            self.stdout.write(f'Reading Excel file: {file_path}')
-
-            # Read Excel file
-            df = pd.read_excel(file_path)
-            self.stdout.write(f'Found {len(df)} records')
-
-            # Convert DataFrame to list of dictionaries
-            voters_data = []
-            for index, row in df.iterrows():
-                data = {}
-                for column in df.columns:
-                    value = row[column]
-                    # Handle different data types
-                    if pd.isna(value):
-                        data[str(column)] = ''
-                    elif isinstance(value, pd.Timestamp):
-                        data[str(column)] = value.strftime('%Y-%m-%d %H:%M:%S')
-                    else:
-                        data[str(column)] = str(value).strip()
-
-                voters_data.append(Voter(data=data))
-
-                if index > 0 and index % 1000 == 0:
-                    self.stdout.write(f'Processed {index} records')
-
-            # Clear existing data if needed
-            # Voter.objects.all().delete()
-
-            # Bulk create voters
-            self.stdout.write('Importing voters to database...')
-            with transaction.atomic():
-                Voter.objects.bulk_create(voters_data, batch_size=1000)
+            # Stream the workbook so memory stays flat for large files
+            total = stream_import(
+                options['excel_file'],
+                chunk_size=options['chunk_size'],
+                use_cache=not options['no_cache'],
+                progress=self.report_progress
+            )
 
             self.stdout.write(
-                self.style.SUCCESS(f'Successfully imported {len(voters_data)} voters')
+                self.style.SUCCESS(f'Successfully imported {total} voters')
             )
 
         except Exception as e:
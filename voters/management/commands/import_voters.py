@@ -1,48 +1,192 @@
 from django.core.management.base import BaseCommand
-import pandas as pd
-from voters.models import Voter
-from django.db import transaction
+from voters.importers import (
+    parallel_import, flag_missing_voters, local_infile_available, resolve_import_paths,
+    DEFAULT_CHUNK_SIZE
+)
+from voters.jobs import JobReporter
+from voters.validation import compile_validator
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = 'Import voters from Excel file'
+    help = 'Import voters from Excel files'
 
     def add_arguments(self, parser):
-        parser.add_argument('excel_file', type=str, help='Path to Excel file')
+        parser.add_argument(
+            'excel_file', type=str,
+            help='Path to an Excel file, a directory of Excel files or a glob pattern'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Number of rows read and inserted at a time'
+        )
+        parser.add_argument(
+            '--no-cache', action='store_true',
+            help='Parse the workbook even if a columnar cache of it exists'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of processes parsing sheets (defaults to the number of CPUs)'
+        )
+        parser.add_argument(
+            '--db-writers', type=int, default=2,
+            help='Number of database connections inserting rows'
+        )
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help='Match rows on CARD NO (or ASSEMBLY, PSNO, SNO): insert new, update changed, skip unchanged'
+        )
+        parser.add_argument(
+            '--match-assembly', action='store_true',
+            help='With --upsert, only match card numbers within the same assembly'
+        )
+        parser.add_argument(
+            '--flag-missing', action='store_true',
+            help='With --upsert, flag voters of the imported assemblies that are not in the files'
+        )
+        parser.add_argument(
+            '--fast-load', action='store_true',
+            help='Load rows with MySQL LOAD DATA LOCAL INFILE (needs DB_LOCAL_INFILE), falling back '
+                 'to normal inserts when it is not allowed'
+        )
+        parser.add_argument(
+            '--defer-index', action='store_true',
+            help='Build the search index of the imported voters once all rows are written, '
+                 'instead of with every chunk'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Validate the files against the voter fields and report bad rows without importing'
+        )
+        parser.add_argument(
+            '--skip-invalid', action='store_true',
+            help='Leave out rows that fail validation instead of importing them'
+        )
+        parser.add_argument(
+            '--job', type=int, default=None,
+            help='Id of the VoterJob to report progress to (set when started from the admin)'
+        )
+
+    def report_progress(self, total, rate):
+        self.stdout.write(f'Processed {total} records ({rate:.0f} rows/sec)')
+        if self.job:
+            self.job.progress(parsed=total, **self.job_counts())
+
+    def job_counts(self):
+        return {
+            key: sum(entry[key] for entry in self.summary.values())
+            for key in ('inserted', 'updated', 'invalid', 'failed')
+        }
+
+    def report_invalid(self, path, sheet_name, row_number, errors):
+        for field, message in errors.items():
+            self.stdout.write(self.style.WARNING(f'{path} [{sheet_name}] row {row_number}: {field}: {message}'))
+
+    def write_summary(self, summary):
+        self.stdout.write('Import summary:')
+        for path, entry in summary.items():
+            line = (
+                f"  {path}: {entry['sheets']} sheet(s), {entry['parsed']} parsed, "
+                f"{entry['inserted']} inserted, {entry['updated']} updated, "
+                f"{entry['unchanged']} unchanged, {entry['invalid']} invalid, {entry['failed']} failed"
+            )
+            self.stdout.write(self.style.ERROR(line) if entry['errors'] else line)
+            for error in entry['errors']:
+                self.stdout.write(self.style.ERROR(f'    {error}'))
 
     def handle(self, *args, **options):
+        self.job = JobReporter(options['job']) if options['job'] else None
+        self.summary = {}
+        self.errors = []
+        if self.job:
+            self.job.start()
+
+        self.run_import(options)
+
+        if self.job:
+            parsed = sum(entry['parsed'] for entry in self.summary.values())
+            self.job.finish(errors=self.errors, parsed=parsed, **self.job_counts())
+
+    def fail(self, message):
+        self.errors.append(message)
+        self.stdout.write(self.style.ERROR(message))
+
+    def run_import(self, options):
+        if options['flag_missing'] and not options['upsert']:
+            self.fail('--flag-missing requires --upsert')
+            return
+        if options['fast_load'] and options['upsert']:
+            self.fail('--fast-load cannot be combined with --upsert')
+            return
+
         try:
-            excel_file = options['excel_file']
-            df = pd.read_excel(excel_file)
-
-            # Convert all column names to uppercase
-            df.columns = [col.upper() for col in df.columns]
-
-            # Create voters in batch
-            voters_to_create = []
-            for _, row in df.iterrows():
-                # Convert row to dictionary and handle NaN values
-                voter_data = {}
-                for col in df.columns:
-                    value = row[col]
-                    if pd.isna(value):
-                        voter_data[col] = ''
-                    elif isinstance(value, (int, float)):
-                        voter_data[col] = str(int(value))
-                    else:
-                        voter_data[col] = str(value).strip()
-
-                voters_to_create.append(Voter(data=voter_data))
-
-            # Use bulk_create for better performance
-            with transaction.atomic():
-                Voter.objects.bulk_create(voters_to_create, batch_size=1000)
-
-            self.stdout.write(
-                self.style.SUCCESS(f'Successfully imported {len(voters_to_create)} voters')
+            file_paths = resolve_import_paths(options['excel_file'])
+            if not file_paths:
+                self.fail('No Excel files found')
+                return
+
+            self.stdout.write(f'Reading {len(file_paths)} Excel file(s)')
+
+            dry_run = options['dry_run']
+            fast_load = options['fast_load'] and not dry_run
+            if fast_load and not local_infile_available():
+                self.stdout.write(self.style.WARNING(
+                    'LOAD DATA LOCAL INFILE is not allowed, using normal inserts instead'
+                ))
+                fast_load = False
+
+            # Sheets are parsed in worker processes and inserted in chunks
+            seen = set() if options['flag_missing'] and not dry_run else None
+            summary = self.summary
+            parallel_import(
+                file_paths,
+                workers=options['workers'],
+                writers=options['db_writers'],
+                chunk_size=options['chunk_size'],
+                progress=self.report_progress,
+                upsert=options['upsert'],
+                match_assembly=options['match_assembly'],
+                seen=seen,
+                fast_load=fast_load,
+                use_cache=not options['no_cache'],
+                validator=compile_validator(),
+                on_invalid=self.report_invalid if dry_run or options['verbosity'] > 1 else None,
+                skip_invalid=options['skip_invalid'],
+                dry_run=dry_run,
+                summary=summary,
+                defer_index=options['defer_index'],
+                upper_headers=True,
+                integer_numbers=True,
+                timestamp_sep=' '
+            )
+            self.write_summary(summary)
+
+            if dry_run:
+                invalid = sum(entry['invalid'] for entry in summary.values())
+                parsed = sum(entry['parsed'] for entry in summary.values())
+                self.stdout.write(f'Dry run: {invalid} of {parsed} rows failed validation, nothing imported')
+                return
+
+            if seen:
+                flagged = flag_missing_voters(seen, match_assembly=options['match_assembly'])
+                self.stdout.write(f'Flagged {flagged} voters missing from the imported rolls')
+
+            total = sum(entry['inserted'] + entry['updated'] for entry in summary.values())
+            failed = [path for path, entry in summary.items() if entry['errors']]
+            self.errors.extend(
+                f'{path}: {error}' for path, entry in summary.items() for error in entry['errors']
             )
+            if failed:
+                self.stdout.write(
+                    self.style.WARNING(f'Imported {total} voters, {len(failed)} file(s) had errors')
+                )
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Successfully imported {total} voters')
+                )
 
         except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error importing voters: {str(e)}')
-            )
\ No newline at end of file
+            self.fail(f'Error importing voters: {str(e)}')
+            logger.error(f'Error importing voters: {str(e)}', exc_info=True)
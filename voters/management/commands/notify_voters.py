@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from notifications.models import NotificationTemplate
+from voters.jobs import JobReporter
+from voters.notify import send_to_voters
+from voters.selections import get_selection, selection_voters
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Send a notification template to the voters of a saved selection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--selection', type=str, required=True,
+            help='Token of the voter selection to notify'
+        )
+        parser.add_argument(
+            '--template-id', type=int, required=True,
+            help='Id of the NotificationTemplate to send'
+        )
+        parser.add_argument(
+            '--channel', type=str, required=True,
+            help='Channel to send on: SMS, WA or BOTH'
+        )
+        parser.add_argument(
+            '--job', type=int, default=None,
+            help='Id of the VoterJob to report progress to (set when started from the admin)'
+        )
+
+    def handle(self, *args, **options):
+        job = JobReporter(options['job']) if options['job'] else None
+        if job:
+            job.start()
+
+        sent, failed, errors = 0, 0, []
+
+        def progress(sent_count, failed_count):
+            nonlocal sent, failed
+            sent, failed = sent_count, failed_count
+            if job:
+                job.progress(parsed=sent + failed, sent=sent, failed=failed)
+
+        try:
+            template = NotificationTemplate.objects.get(pk=options['template_id'])
+            voters = selection_voters(get_selection(options['selection']), fields=['id', 'mobile_no'])
+            results = send_to_voters(voters, template, options['channel'], progress)
+            self.stdout.write(self.style.SUCCESS(
+                f"Sent {results['total_sent']} notifications, {results['total_failed']} failed"
+            ))
+            for error in results['errors'] or []:
+                self.stdout.write(self.style.WARNING(f"Voter {error['voter_id']}: {error['error']}"))
+        except Exception as e:
+            errors.append(f'Error sending notifications: {str(e)}')
+            self.stdout.write(self.style.ERROR(errors[-1]))
+            logger.error(f'Error sending notifications: {str(e)}', exc_info=True)
+
+        if job:
+            job.finish(errors=errors, parsed=sent + failed, sent=sent, failed=failed)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from voters.facets import rebuild_facets
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recount the voter facet summary used by the admin filter dropdowns'
+
+    def handle(self, *args, **options):
+        try:
+            paths = rebuild_facets()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {paths} voter facets'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error rebuilding voter facets: {str(e)}'))
+            logger.error(f'Error rebuilding voter facets: {str(e)}', exc_info=True)
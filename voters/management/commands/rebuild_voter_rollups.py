@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from voters.rollups import rebuild_rollups
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recount the demographic rollups of every assembly, mandal and polling station'
+
+    def handle(self, *args, **options):
+        try:
+            keys = rebuild_rollups()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {keys} voter rollups'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error rebuilding voter rollups: {str(e)}'))
+            logger.error(f'Error rebuilding voter rollups: {str(e)}', exc_info=True)
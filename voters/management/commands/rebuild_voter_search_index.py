@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from voters.search import INDEX_BATCH_SIZE, rebuild_search_index
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trigram search index of every voter'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=INDEX_BATCH_SIZE,
+            help='Voters indexed per batch'
+        )
+
+    def handle(self, *args, **options):
+        def progress(indexed):
+            self.stdout.write(f'Indexed {indexed} voters')
+
+        try:
+            indexed = rebuild_search_index(options['batch_size'], progress)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt the search index of {indexed} voters'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error rebuilding the voter search index: {str(e)}'))
+            logger.error(f'Error rebuilding the voter search index: {str(e)}', exc_info=True)
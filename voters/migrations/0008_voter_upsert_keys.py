@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0007_alter_voter_age_alter_voter_assembly_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='missing_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='row_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['card_no'], name='voter_card_no_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['assembly', 'card_no'], name='voter_assembly_card_no_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['assembly', 'psno', 'sno'], name='voter_booth_serial_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def card_no_as_text(apps, schema_editor):
+    # EPIC card numbers are alphanumeric, e.g. SDQ0217265
+    VoterField = apps.get_model('voters', 'VoterField')
+    VoterField.objects.filter(name='CARD NO', field_type='number').update(field_type='text')
+
+
+def card_no_as_number(apps, schema_editor):
+    VoterField = apps.get_model('voters', 'VoterField')
+    VoterField.objects.filter(name='CARD NO', field_type='text').update(field_type='number')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0008_voter_upsert_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(card_no_as_text, card_no_as_number),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:14
+
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+# New length of the hierarchy columns, short enough for the index key
+HIERARCHY_LENGTH = 100
+
+
+def check_hierarchy_lengths(apps, schema_editor):
+    # Shrinking the columns must not cut stored names
+    Voter = apps.get_model('voters', 'Voter')
+    too_long = {
+        field: Voter.objects.annotate(length=Length(field)).filter(length__gt=HIERARCHY_LENGTH).count()
+        for field in ('mlc_constituency', 'assembly', 'mandal')
+    }
+    too_long = {field: count for field, count in too_long.items() if count}
+    if too_long:
+        counts = ', '.join(f'{count} {field}' for field, count in too_long.items())
+        raise ValueError(
+            f'Cannot shorten voter hierarchy columns to {HIERARCHY_LENGTH} characters, '
+            f'values are longer in: {counts}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0010_voterjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_hierarchy_lengths, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='voter',
+            name='assembly',
+            field=models.CharField(max_length=HIERARCHY_LENGTH, verbose_name='ASSEMBLY'),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='mandal',
+            field=models.CharField(max_length=HIERARCHY_LENGTH, verbose_name='MANDAL'),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='mlc_constituency',
+            field=models.CharField(max_length=HIERARCHY_LENGTH, verbose_name='MLC CONSTITUENCY'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['mlc_constituency', 'assembly', 'mandal', 'location', 'psno'], name='voter_hierarchy_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:16
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+PATH_FIELDS = ('mlc_constituency', 'assembly', 'mandal', 'location')
+
+
+def populate_facets(apps, schema_editor):
+    Voter = apps.get_model('voters', 'Voter')
+    VoterFacet = apps.get_model('voters', 'VoterFacet')
+
+    counts = {}
+    for row in Voter.objects.order_by().values(*PATH_FIELDS).annotate(voter_count=Count('id')):
+        key = tuple(row[field] or '' for field in PATH_FIELDS)
+        counts[key] = counts.get(key, 0) + row['voter_count']
+
+    VoterFacet.objects.bulk_create([
+        VoterFacet(voter_count=count, **dict(zip(PATH_FIELDS, key)))
+        for key, count in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0011_voter_hierarchy_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoterFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mlc_constituency', models.CharField(max_length=100)),
+                ('assembly', models.CharField(max_length=100)),
+                ('mandal', models.CharField(max_length=100)),
+                ('location', models.CharField(blank=True, default='', max_length=255)),
+                ('voter_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Voter Facet',
+                'verbose_name_plural': 'Voter Facets',
+                'db_table': 'voters_voterfacet',
+                'ordering': ['mlc_constituency', 'assembly', 'mandal', 'location'],
+                'constraints': [models.UniqueConstraint(fields=('mlc_constituency', 'assembly', 'mandal', 'location'), name='voter_facet_path_unique')],
+            },
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0012_voterfacet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assembly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Assembly',
+                'verbose_name_plural': 'Assemblies',
+                'db_table': 'voters_assembly',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+            ],
+            options={
+                'verbose_name': 'Location',
+                'verbose_name_plural': 'Locations',
+                'db_table': 'voters_location',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MlcConstituency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name': 'MLC Constituency',
+                'verbose_name_plural': 'MLC Constituencies',
+                'db_table': 'voters_mlcconstituency',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='assembly_area',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='voters', to='voters.assembly'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='location_area',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='voters', to='voters.location'),
+        ),
+        migrations.CreateModel(
+            name='Mandal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('assembly', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='mandals', to='voters.assembly')),
+            ],
+            options={
+                'verbose_name': 'Mandal',
+                'verbose_name_plural': 'Mandals',
+                'db_table': 'voters_mandal',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='mandal',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='locations', to='voters.mandal'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='mandal_area',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='voters', to='voters.mandal'),
+        ),
+        migrations.AddField(
+            model_name='assembly',
+            name='mlc_constituency',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='assemblies', to='voters.mlcconstituency'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='mlc_area',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='voters', to='voters.mlcconstituency'),
+        ),
+        migrations.AddConstraint(
+            model_name='mandal',
+            constraint=models.UniqueConstraint(fields=('assembly', 'name'), name='mandal_name_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(fields=('mandal', 'name'), name='location_name_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='assembly',
+            constraint=models.UniqueConstraint(fields=('mlc_constituency', 'name'), name='assembly_name_unique'),
+        ),
+    ]
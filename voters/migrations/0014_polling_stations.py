@@ -0,0 +1,92 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def move_station_details(apps, schema_editor):
+    Voter = apps.get_model('voters', 'Voter')
+    MlcConstituency = apps.get_model('voters', 'MlcConstituency')
+    Assembly = apps.get_model('voters', 'Assembly')
+    PollingStation = apps.get_model('voters', 'PollingStation')
+
+    booths = (
+        Voter.objects.exclude(psno__isnull=True).exclude(psno='')
+        .exclude(mlc_constituency='').exclude(assembly='')
+        .order_by().values('mlc_constituency', 'assembly', 'psno')
+        .annotate(station_location=Max('location'), station_address=Max('ps_address'))
+    )
+
+    assemblies = {}
+    for booth in booths:
+        area_key = (booth['mlc_constituency'], booth['assembly'])
+        if area_key not in assemblies:
+            mlc, _ = MlcConstituency.objects.get_or_create(name=booth['mlc_constituency'])
+            assemblies[area_key], _ = Assembly.objects.get_or_create(mlc_constituency=mlc, name=booth['assembly'])
+
+        station, _ = PollingStation.objects.get_or_create(
+            assembly=assemblies[area_key],
+            psno=booth['psno'],
+            defaults={
+                'location': booth['station_location'] or '',
+                'ps_address': booth['station_address'] or '',
+            }
+        )
+        # One UPDATE per booth, through voter_booth_serial_idx, committed on
+        # its own; booths already moved by an interrupted run are skipped
+        Voter.objects.filter(
+            mlc_constituency=booth['mlc_constituency'], assembly=booth['assembly'], psno=booth['psno'],
+            polling_station__isnull=True
+        ).update(polling_station=station)
+
+
+def restore_station_details(apps, schema_editor):
+    Voter = apps.get_model('voters', 'Voter')
+    PollingStation = apps.get_model('voters', 'PollingStation')
+
+    for station in PollingStation.objects.exclude(ps_address='').iterator():
+        Voter.objects.filter(polling_station=station).update(ps_address=station.ps_address)
+
+
+class Migration(migrations.Migration):
+    # Not one transaction over the whole voters table: each booth's UPDATE
+    # commits by itself, so locks are held for one booth at a time
+    atomic = False
+
+    dependencies = [
+        ('voters', '0013_geography_areas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollingStation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('psno', models.CharField(max_length=50, verbose_name='PSNO')),
+                ('location', models.CharField(blank=True, default='', max_length=255, verbose_name='LOCATION')),
+                ('ps_address', models.TextField(blank=True, default='', verbose_name='PS ADDRESS')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assembly', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='polling_stations', to='voters.assembly')),
+            ],
+            options={
+                'verbose_name': 'Polling Station',
+                'verbose_name_plural': 'Polling Stations',
+                'db_table': 'voters_pollingstation',
+                'ordering': ['assembly', 'psno'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pollingstation',
+            constraint=models.UniqueConstraint(fields=('assembly', 'psno'), name='polling_station_psno_unique'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='polling_station',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='voters', to='voters.pollingstation'),
+        ),
+        migrations.RunPython(move_station_details, restore_station_details),
+        migrations.RemoveField(
+            model_name='voter',
+            name='ps_address',
+        ),
+    ]
@@ -0,0 +1,178 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+
+
+ENCODED_FIELDS = ('gender', 'relation', 'voter_status', 'party', 'caste', 'category', 'verify_status')
+
+# Voters updated per statement, each committed by itself (the migration is
+# not atomic) so locks and undo are held for one batch at a time
+BATCH_SIZE = 10000
+
+
+def _batches(Voter):
+    bounds = Voter.objects.aggregate(min_id=Min('pk'), max_id=Max('pk'))
+    if bounds['max_id'] is None:
+        return
+    for start in range(bounds['min_id'], bounds['max_id'] + 1, BATCH_SIZE):
+        yield Voter.objects.filter(pk__gte=start, pk__lt=start + BATCH_SIZE)
+
+
+def encode_attributes(apps, schema_editor):
+    Voter = apps.get_model('voters', 'Voter')
+    AttributeValue = apps.get_model('voters', 'AttributeValue')
+
+    for attribute in ENCODED_FIELDS:
+        values = Voter.objects.exclude(**{f'{attribute}__isnull': True}).exclude(**{attribute: ''})
+        AttributeValue.objects.bulk_create([
+            AttributeValue(attribute=attribute, value=value)
+            for value in values.order_by().values_list(attribute, flat=True).distinct()
+        ], ignore_conflicts=True)
+
+    codes = {
+        f'{attribute}_code': Subquery(
+            AttributeValue.objects.filter(attribute=attribute, value=OuterRef(attribute)).values('id')[:1]
+        )
+        for attribute in ENCODED_FIELDS
+    }
+    for batch in _batches(Voter):
+        batch.update(**codes)
+
+
+def decode_attributes(apps, schema_editor):
+    Voter = apps.get_model('voters', 'Voter')
+    AttributeValue = apps.get_model('voters', 'AttributeValue')
+
+    values = {
+        attribute: Subquery(
+            AttributeValue.objects.filter(pk=OuterRef(f'{attribute}_code')).values('value')[:1]
+        )
+        for attribute in ENCODED_FIELDS
+    }
+    for batch in _batches(Voter):
+        batch.update(**values)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('voters', '0014_polling_stations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributeValue',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('attribute', models.CharField(choices=[('gender', 'Gender'), ('relation', 'Relation'), ('voter_status', 'Voter Status'), ('party', 'Party'), ('caste', 'Caste'), ('category', 'Category'), ('verify_status', 'Verify Status')], max_length=20)),
+                ('value', models.CharField(max_length=255)),
+            ],
+            options={
+                'verbose_name': 'Attribute Value',
+                'verbose_name_plural': 'Attribute Values',
+                'db_table': 'voters_attributevalue',
+                'ordering': ['attribute', 'value'],
+                'constraints': [models.UniqueConstraint(fields=('attribute', 'value'), name='attribute_value_unique')],
+            },
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='gender_code',
+            field=models.ForeignKey(blank=True, limit_choices_to={'attribute': 'gender'}, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='voters.attributevalue', verbose_name='GENDER'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='relation_code',
+            field=models.ForeignKey(blank=True, limit_choices_to={'attribute': 'relation'}, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='voters.attributevalue', verbose_name='RELATION'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='voter_status_code',
+            field=models.ForeignKey(blank=True, limit_choices_to={'attribute': 'voter_status'}, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='voters.attributevalue', verbose_name='VOTER STATUS'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='party_code',
+            field=models.ForeignKey(blank=True, limit_choices_to={'attribute': 'party'}, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='voters.attributevalue', verbose_name='PARTY'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='caste_code',
+            field=models.ForeignKey(blank=True, limit_choices_to={'attribute': 'caste'}, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='voters.attributevalue', verbose_name='CASTE'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='category_code',
+            field=models.ForeignKey(blank=True, limit_choices_to={'attribute': 'category'}, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='voters.attributevalue', verbose_name='CATEGORY'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='verify_status_code',
+            field=models.ForeignKey(blank=True, limit_choices_to={'attribute': 'verify_status'}, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='voters.attributevalue', verbose_name='VERIFY STATUS'),
+        ),
+        migrations.RunPython(encode_attributes, decode_attributes),
+        migrations.RemoveField(
+            model_name='voter',
+            name='gender',
+        ),
+        migrations.RenameField(
+            model_name='voter',
+            old_name='gender_code',
+            new_name='gender',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='relation',
+        ),
+        migrations.RenameField(
+            model_name='voter',
+            old_name='relation_code',
+            new_name='relation',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='voter_status',
+        ),
+        migrations.RenameField(
+            model_name='voter',
+            old_name='voter_status_code',
+            new_name='voter_status',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='party',
+        ),
+        migrations.RenameField(
+            model_name='voter',
+            old_name='party_code',
+            new_name='party',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='caste',
+        ),
+        migrations.RenameField(
+            model_name='voter',
+            old_name='caste_code',
+            new_name='caste',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='category',
+        ),
+        migrations.RenameField(
+            model_name='voter',
+            old_name='category_code',
+            new_name='category',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='verify_status',
+        ),
+        migrations.RenameField(
+            model_name='voter',
+            old_name='verify_status_code',
+            new_name='verify_status',
+        ),
+    ]
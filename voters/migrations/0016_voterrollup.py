@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:54
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce
+
+
+LEVELS = (
+    ('assembly', 'assembly_area_id'),
+    ('mandal', 'mandal_area_id'),
+    ('polling_station', 'polling_station_id'),
+)
+DIMENSIONS = ('gender', 'party', 'caste', 'verify_status')
+# Upper ages of the age bands 1-4; older voters fall in band 5
+AGE_BAND_LIMITS = (25, 35, 45, 60)
+
+
+def populate_rollups(apps, schema_editor):
+    Voter = apps.get_model('voters', 'Voter')
+    VoterRollup = apps.get_model('voters', 'VoterRollup')
+
+    expressions = {
+        dimension: Coalesce(F(f'{dimension}_id'), Value(0), output_field=IntegerField())
+        for dimension in DIMENSIONS
+    }
+    expressions['age_band'] = Case(
+        When(age__isnull=True, then=Value(0)),
+        *(When(age__lte=limit, then=Value(index)) for index, limit in enumerate(AGE_BAND_LIMITS, 1)),
+        default=Value(len(AGE_BAND_LIMITS) + 1), output_field=IntegerField()
+    )
+
+    rollups = []
+    for level, node_field in LEVELS:
+        nodes = Voter.objects.order_by().filter(**{f'{node_field}__isnull': False})
+        for dimension, expression in expressions.items():
+            rows = nodes.values(node=F(node_field), band=expression).annotate(voter_count=Count('id'))
+            rollups.extend(
+                VoterRollup(level=level, node_id=row['node'], dimension=dimension,
+                            value=row['band'], voter_count=row['voter_count'])
+                for row in rows
+            )
+
+    VoterRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0015_attribute_values'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoterRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('voter_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('level', models.CharField(choices=[('assembly', 'Assembly'), ('mandal', 'Mandal'), ('polling_station', 'Polling Station')], max_length=20)),
+                ('node_id', models.BigIntegerField()),
+                ('dimension', models.CharField(choices=[('gender', 'Gender'), ('age_band', 'Age Band'), ('party', 'Party'), ('caste', 'Caste'), ('verify_status', 'Verify Status')], max_length=20)),
+                ('value', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Voter Rollup',
+                'verbose_name_plural': 'Voter Rollups',
+                'db_table': 'voters_voterrollup',
+                'ordering': ['level', 'node_id', 'dimension', 'value'],
+                'constraints': [models.UniqueConstraint(fields=('level', 'node_id', 'dimension', 'value'), name='voter_rollup_key_unique')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
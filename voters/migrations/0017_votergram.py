@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0016_voterrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoterGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assembly_area_id', models.BigIntegerField(null=True)),
+                ('field', models.PositiveSmallIntegerField(choices=[(1, 'voter_name'), (2, 'rel_name'), (3, 'card_no'), (4, 'hno')])),
+                ('gram', models.PositiveIntegerField()),
+                ('voter', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='voters.voter')),
+            ],
+            options={
+                'verbose_name': 'Voter Gram',
+                'verbose_name_plural': 'Voter Grams',
+                'db_table': 'voters_votergram',
+                'indexes': [models.Index(fields=['gram', 'assembly_area_id', 'voter'], name='voter_gram_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('voter', 'field', 'gram'), name='voter_gram_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0017_votergram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='name_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['name_key', 'assembly_area'], name='voter_name_key_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0018_voter_name_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='card_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['card_key'], name='voter_card_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['mobile_no'], name='voter_mobile_no_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['polling_station', 'sno'], name='voter_station_serial_idx'),
+        ),
+    ]
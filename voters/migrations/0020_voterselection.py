@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0019_voter_identifier_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoterSelection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(editable=False, max_length=22, unique=True)),
+                ('filters', models.JSONField(blank=True, null=True)),
+                ('include_ids', models.JSONField(blank=True, default=list)),
+                ('exclude_ids', models.JSONField(blank=True, default=list)),
+                ('voter_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='voter_selections', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Voter Selection',
+                'verbose_name_plural': 'Voter Selections',
+                'db_table': 'voters_voterselection',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
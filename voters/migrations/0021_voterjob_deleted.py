@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0020_voterselection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voterjob',
+            name='deleted',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='voterjob',
+            name='kind',
+            field=models.CharField(choices=[('import', 'Import'), ('delete', 'Delete')], default='import', max_length=20),
+        ),
+    ]
@@ -0,0 +1,95 @@
+from django.db import migrations, transaction
+
+# Voters read and rewritten per batch, each batch in its own transaction
+BATCH_SIZE = 2000
+
+# Excel names of the fields kept on the polling station, as of this migration
+STATION_FIELD_MAPPING = {'PS ADDRESS': 'ps_address'}
+
+
+def _station_key(key):
+    name = str(key).strip().upper()
+    return name if name in STATION_FIELD_MAPPING else None
+
+
+def strip_station_fields(apps, schema_editor):
+    """
+    Drop the station fields from the data of voters with a polling station,
+    first filling in the station's fields that are still empty.
+    """
+    Voter = apps.get_model('voters', 'Voter')
+    PollingStation = apps.get_model('voters', 'PollingStation')
+
+    last_pk = 0
+    while True:
+        voters = list(
+            Voter.objects.filter(pk__gt=last_pk, polling_station__isnull=False)
+            .order_by('pk').only('id', 'data', 'polling_station')[:BATCH_SIZE]
+        )
+        if not voters:
+            return
+        last_pk = voters[-1].pk
+
+        changed, details = [], {}
+        for voter in voters:
+            data = voter.data if isinstance(voter.data, dict) else {}
+            values = {_station_key(key): value for key, value in data.items() if _station_key(key)}
+            if not values:
+                continue
+            station = details.setdefault(voter.polling_station_id, {})
+            for name, value in values.items():
+                if value not in (None, ''):
+                    station.setdefault(STATION_FIELD_MAPPING[name], str(value).strip())
+            voter.data = {key: value for key, value in data.items() if not _station_key(key)}
+            changed.append(voter)
+
+        with transaction.atomic():
+            for station in PollingStation.objects.filter(pk__in=details):
+                fields = [
+                    field for field, value in details[station.pk].items()
+                    if not getattr(station, field) and value
+                ]
+                for field in fields:
+                    setattr(station, field, details[station.pk][field])
+                if fields:
+                    station.save(update_fields=fields)
+            Voter.objects.bulk_update(changed, ['data'])
+
+
+def restore_station_fields(apps, schema_editor):
+    Voter = apps.get_model('voters', 'Voter')
+    PollingStation = apps.get_model('voters', 'PollingStation')
+
+    stations = {
+        station['id']: station
+        for station in PollingStation.objects.values('id', *STATION_FIELD_MAPPING.values())
+    }
+    last_pk = 0
+    while True:
+        voters = list(
+            Voter.objects.filter(pk__gt=last_pk, polling_station__isnull=False)
+            .order_by('pk').only('id', 'data', 'polling_station')[:BATCH_SIZE]
+        )
+        if not voters:
+            return
+        last_pk = voters[-1].pk
+
+        for voter in voters:
+            data = voter.data if isinstance(voter.data, dict) else {}
+            station = stations[voter.polling_station_id]
+            voter.data = {**data, **{name: station[field] for name, field in STATION_FIELD_MAPPING.items()}}
+        Voter.objects.bulk_update(voters, ['data'])
+
+
+class Migration(migrations.Migration):
+    # Batches commit one by one; a rerun after a failure skips the voters
+    # whose data no longer holds the station fields
+    atomic = False
+
+    dependencies = [
+        ('voters', '0021_voterjob_deleted'),
+    ]
+
+    operations = [
+        migrations.RunPython(strip_station_fields, restore_station_fields),
+    ]
@@ -0,0 +1,81 @@
+from django.db import migrations
+
+# Voters read and rewritten per batch, each batch in its own transaction
+BATCH_SIZE = 2000
+
+# Excel names of the attributes stored as AttributeValue codes, as of this
+# migration
+ENCODED_FIELD_MAPPING = {
+    'GENDER': 'gender',
+    'RELATION': 'relation',
+    'VOTER STATUS': 'voter_status',
+    'PARTY': 'party',
+    'CASTE': 'caste',
+    'CATEGORY': 'category',
+    'VERIFY STATUS': 'verify_status',
+}
+
+
+def _batches(Voter):
+    last_pk = 0
+    while True:
+        voters = list(
+            Voter.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('id', 'data', *ENCODED_FIELD_MAPPING.values())[:BATCH_SIZE]
+        )
+        if not voters:
+            return
+        last_pk = voters[-1].pk
+        yield voters
+
+
+def strip_attribute_text(apps, schema_editor):
+    """
+    Drop the attribute text from the data of voters whose code holds it,
+    and blank attribute keys.
+    """
+    Voter = apps.get_model('voters', 'Voter')
+
+    for voters in _batches(Voter):
+        changed = []
+        for voter in voters:
+            data = voter.data if isinstance(voter.data, dict) else {}
+            kept = {}
+            for key, value in data.items():
+                field = ENCODED_FIELD_MAPPING.get(str(key).strip().upper())
+                if field and (getattr(voter, f'{field}_id') is not None or value in (None, '')):
+                    continue
+                kept[key] = value
+            if len(kept) != len(data):
+                voter.data = kept
+                changed.append(voter)
+        Voter.objects.bulk_update(changed, ['data'])
+
+
+def restore_attribute_text(apps, schema_editor):
+    Voter = apps.get_model('voters', 'Voter')
+    AttributeValue = apps.get_model('voters', 'AttributeValue')
+
+    labels = dict(AttributeValue.objects.values_list('id', 'value'))
+    for voters in _batches(Voter):
+        for voter in voters:
+            data = voter.data if isinstance(voter.data, dict) else {}
+            for name, field in ENCODED_FIELD_MAPPING.items():
+                code = getattr(voter, f'{field}_id')
+                data.setdefault(name, labels[code] if code is not None else '')
+            voter.data = data
+        Voter.objects.bulk_update(voters, ['data'])
+
+
+class Migration(migrations.Migration):
+    # Batches commit one by one; a rerun after a failure skips the voters
+    # whose data no longer holds the attribute text
+    atomic = False
+
+    dependencies = [
+        ('voters', '0022_voter_data_station_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(strip_attribute_text, restore_attribute_text),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0023_voter_data_attribute_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voterjob',
+            name='sent',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='voterjob',
+            name='kind',
+            field=models.CharField(choices=[('import', 'Import'), ('delete', 'Delete'), ('notify', 'Notify')], default='import', max_length=20),
+        ),
+    ]
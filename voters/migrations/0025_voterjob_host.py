@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0024_voterjob_sent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voterjob',
+            name='host',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
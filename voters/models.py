@@ -1,7 +1,13 @@
-from django.db import models
+import zlib
+from collections import Counter
+from django.conf import settings
+from django.db import connection, models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.constants import OnConflict
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-import re
+from .constants import AGE_BANDS, ENCODED_FIELDS, ENCODED_FIELD_MAPPING, STATION_FIELD_MAPPING, STATION_FIELDS
+from .utils import normalize_card_no, normalize_mobile_number, normalize_search_text, phonetic_key
 
 
 class VoterField(models.Model):
@@ -46,9 +52,10 @@ class Voter(models.Model):
     ]
 
     # Required fields
-    mlc_constituency = models.CharField('MLC CONSTITUENCY', max_length=255)
-    assembly = models.CharField('ASSEMBLY', max_length=255)
-    mandal = models.CharField('MANDAL', max_length=255)
+    # Kept at 100 characters so voter_hierarchy_idx fits InnoDB's key length limit
+    mlc_constituency = models.CharField('MLC CONSTITUENCY', max_length=100)
+    assembly = models.CharField('ASSEMBLY', max_length=100)
+    mandal = models.CharField('MANDAL', max_length=100)
     sno = models.CharField('SNO', max_length=50)
     mobile_no = models.CharField('MOBILE NO', max_length=15)
 
@@ -57,52 +64,925 @@ class Voter(models.Model):
     village = models.CharField('VILLAGE', max_length=255, null=True, blank=True)
     psno = models.CharField('PSNO', max_length=50, null=True, blank=True)
     location = models.CharField('LOCATION', max_length=255, null=True, blank=True)
-    ps_address = models.TextField('PS ADDRESS', null=True, blank=True)
     street = models.CharField('STREET', max_length=255, null=True, blank=True)
     hno = models.CharField('HNO', max_length=50, null=True, blank=True)
     card_no = models.CharField('CARD NO', max_length=50, null=True, blank=True)
     voter_name = models.CharField('VOTER NAME', max_length=255, null=True, blank=True)
     age = models.IntegerField('AGE', null=True, blank=True)
-    gender = models.CharField('GENDER', max_length=1, null=True, blank=True)
     rel_name = models.CharField('REL NAME', max_length=255, null=True, blank=True)
-    relation = models.CharField('RELATION', max_length=255, null=True, blank=True)
-    voter_status = models.CharField('VOTER STATUS', max_length=50, null=True, blank=True)
-    party = models.CharField('PARTY', max_length=100, null=True, blank=True)
-    caste = models.CharField('CASTE', max_length=100, null=True, blank=True)
-    category = models.CharField('CATEGORY', max_length=100, null=True, blank=True)
-    verify_status = models.CharField('VERIFY STATUS', max_length=20, null=True, blank=True)
+
+    # Low-cardinality attributes, stored as small integer codes of AttributeValue
+    gender = models.ForeignKey('AttributeValue', verbose_name='GENDER', on_delete=models.PROTECT, null=True, blank=True, related_name='+', limit_choices_to={'attribute': 'gender'})
+    relation = models.ForeignKey('AttributeValue', verbose_name='RELATION', on_delete=models.PROTECT, null=True, blank=True, related_name='+', limit_choices_to={'attribute': 'relation'})
+    voter_status = models.ForeignKey('AttributeValue', verbose_name='VOTER STATUS', on_delete=models.PROTECT, null=True, blank=True, related_name='+', limit_choices_to={'attribute': 'voter_status'})
+    party = models.ForeignKey('AttributeValue', verbose_name='PARTY', on_delete=models.PROTECT, null=True, blank=True, related_name='+', limit_choices_to={'attribute': 'party'})
+    caste = models.ForeignKey('AttributeValue', verbose_name='CASTE', on_delete=models.PROTECT, null=True, blank=True, related_name='+', limit_choices_to={'attribute': 'caste'})
+    category = models.ForeignKey('AttributeValue', verbose_name='CATEGORY', on_delete=models.PROTECT, null=True, blank=True, related_name='+', limit_choices_to={'attribute': 'category'})
+    verify_status = models.ForeignKey('AttributeValue', verbose_name='VERIFY STATUS', on_delete=models.PROTECT, null=True, blank=True, related_name='+', limit_choices_to={'attribute': 'verify_status'})
+
+    # Normalized geography of the hierarchy columns above, filled on write
+    mlc_area = models.ForeignKey('MlcConstituency', on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='voters')
+    assembly_area = models.ForeignKey('Assembly', on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='voters')
+    mandal_area = models.ForeignKey('Mandal', on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='voters')
+    location_area = models.ForeignKey('Location', on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='voters')
+
+    # Booth of the voter, holding the PS ADDRESS shared by all its voters
+    polling_station = models.ForeignKey('PollingStation', on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='voters')
+
+    # normalize_card_no() of card_no, for identifier lookups
+    card_key = models.CharField(max_length=50, blank=True, default='', editable=False)
+    # phonetic_key() of voter_name, for transliteration tolerant lookups
+    name_key = models.CharField(max_length=255, blank=True, default='', editable=False)
 
     # Keep the data field temporarily for migration
     data = models.JSONField(default=dict, blank=True, null=True)
+
+    # Import bookkeeping: hash of the imported row and when a re-import
+    # of its assembly last failed to include it
+    row_hash = models.CharField(max_length=40, null=True, blank=True, editable=False)
+    missing_since = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    AREA_FIELDS = ('mlc_area', 'assembly_area', 'mandal_area', 'location_area')
+
+    # Keys the model resolves itself, left out of full_clean()
+    RESOLVED_FIELDS = (*AREA_FIELDS, 'polling_station', *ENCODED_FIELDS)
+
+    # Columns excel_records() reads
+    RECORD_FIELDS = ('data', 'polling_station', *ENCODED_FIELDS)
+
+    # Columns save() derives from others, written along with their source
+    # by partial saves
+    DERIVED_FIELDS = {
+        'voter_name': ('name_key',),
+        'card_no': ('card_key',),
+        **dict.fromkeys(('mlc_constituency', 'assembly', 'mandal', 'location'), (*AREA_FIELDS, 'polling_station')),
+        'psno': ('polling_station',),
+    }
+
     def clean(self):
         super().clean()
-        # Validate mobile number
+        # Validate and normalize mobile number
         if self.mobile_no:
-            # Remove any non-digit characters
-            clean_number = re.sub(r'\D', '', self.mobile_no)
-            # Check if it's a valid Indian mobile number
-            if len(clean_number) < 10 or len(clean_number) > 12:
-                raise ValidationError({
-                    'mobile_no': 'Invalid mobile number length. Must be 10 digits.'
-                })
-            # Format the number if needed
-            if len(clean_number) == 12 and clean_number.startswith('91'):
-                self.mobile_no = clean_number[2:]
-            elif len(clean_number) == 11 and clean_number.startswith('0'):
-                self.mobile_no = clean_number[1:]
+            try:
+                self.mobile_no = normalize_mobile_number(self.mobile_no)
+            except ValueError as e:
+                raise ValidationError({'mobile_no': str(e)})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored hierarchy and rollup keys so save() and delete()
+        # can update the summaries
+        if all(field in field_names for field in VoterFacet.PATH_FIELDS):
+            instance._facet_key = VoterFacet.key_for(instance)
+        if all(field in field_names for field in VoterRollup.SOURCE_FIELDS):
+            instance._rollup_keys = VoterRollup.keys_for(instance)
+        if all(field in field_names for field in VoterGram.SOURCE_FIELDS):
+            instance._search_values = VoterGram.search_values(instance)
+        return instance
+
+    def _stored_facet_key(self):
+        if getattr(self, '_facet_key', None) is None:
+            stored = Voter.objects.filter(pk=self.pk).values(*VoterFacet.PATH_FIELDS).first()
+            self._facet_key = VoterFacet.key_for(stored) if stored else None
+        return self._facet_key
+
+    def _stored_rollup_keys(self):
+        if getattr(self, '_rollup_keys', None) is None:
+            stored = Voter.objects.filter(pk=self.pk).values(*VoterRollup.SOURCE_FIELDS).first()
+            self._rollup_keys = VoterRollup.keys_for(stored) if stored else []
+        return self._rollup_keys
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.full_clean(exclude=self.RESOLVED_FIELDS)
+        else:
+            # Partial saves validate only the fields written; expressions
+            # are left to the database
+            update_fields = set(update_fields)
+            self.full_clean(exclude=[
+                field.name for field in self._meta.concrete_fields
+                if field.name not in update_fields or field.name in self.RESOLVED_FIELDS
+                or hasattr(getattr(self, field.attname), 'resolve_expression')
+            ])
+            for field in list(update_fields):
+                update_fields.update(self.DERIVED_FIELDS.get(field, ()))
+            update_fields.add('updated_at')
+            kwargs['update_fields'] = update_fields
+
+        self.name_key = phonetic_key(self.voter_name)[:255]
+        self.card_key = normalize_card_no(self.card_no)[:50]
+        old_key = None if self._state.adding else self._stored_facet_key()
+        new_key = VoterFacet.key_for(self)
+        if new_key != old_key or self.mlc_area_id is None:
+            Voter.assign_areas([self])
+            if update_fields is not None:
+                # The areas, and the station found by them, may have changed
+                update_fields.update((*self.AREA_FIELDS, 'polling_station'))
+        if update_fields is None or 'polling_station' in update_fields:
+            Voter.assign_polling_stations([self])
+        old_rollups = [] if self._state.adding else self._stored_rollup_keys()
+        new_rollups = VoterRollup.keys_for(self)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if new_key != old_key:
+                deltas = Counter({new_key: 1})
+                if old_key:
+                    deltas[old_key] -= 1
+                VoterFacet.adjust(deltas)
+            if new_rollups != old_rollups:
+                deltas = Counter(new_rollups)
+                deltas.subtract(old_rollups)
+                VoterRollup.adjust(deltas)
+            search_values = VoterGram.search_values(self)
+            if search_values != getattr(self, '_search_values', None):
+                VoterGram.index([self])
+        self._facet_key = new_key
+        self._rollup_keys = new_rollups
+        self._search_values = search_values
+
+    def delete(self, *args, **kwargs):
+        key = self._stored_facet_key() or VoterFacet.key_for(self)
+        rollups = self._stored_rollup_keys() or VoterRollup.keys_for(self)
+        with transaction.atomic():
+            VoterGram.objects.filter(voter_id=self.pk).delete()
+            result = super().delete(*args, **kwargs)
+            VoterFacet.adjust({key: -1})
+            VoterRollup.adjust(Counter({rollup: -1 for rollup in rollups}))
+        return result
+
+    def _held_elsewhere(self, key, value):
+        name = str(key).strip().upper()
+        if name in STATION_FIELD_MAPPING:
+            return self.polling_station_id is not None
+        if name in ENCODED_FIELD_MAPPING:
+            return getattr(self, f'{ENCODED_FIELD_MAPPING[name]}_id') is not None or value in (None, '')
+        return False
+
+    def strip_data(self):
+        """
+        Drop the Excel fields kept on other rows from ``data``: the polling
+        station's fields once the voter has a station, and the attribute
+        text held by an AttributeValue code (or blank).
+        """
+        if self.data:
+            self.data = {key: value for key, value in self.data.items() if not self._held_elsewhere(key, value)}
+
+    @classmethod
+    def excel_records(cls, voters):
+        """
+        The ``data`` of each voter with the Excel fields kept on other rows
+        put back: the fields of its polling station and the text of its
+        attribute codes. Needs the RECORD_FIELDS of the voters and reads the
+        stations and attribute values in one query each.
+        """
+        station_ids = {voter.polling_station_id for voter in voters if voter.polling_station_id}
+        stations = {}
+        if station_ids:
+            stations = {
+                station['id']: station
+                for station in PollingStation.objects.filter(pk__in=station_ids).values('id', *STATION_FIELDS)
+            }
+        codes = {
+            getattr(voter, f'{field}_id') for voter in voters for field in ENCODED_FIELDS
+        } - {None}
+        labels = dict(AttributeValue.objects.filter(pk__in=codes).values_list('id', 'value')) if codes else {}
+
+        records = []
+        for voter in voters:
+            record = dict(voter.data or {})
+            station = stations.get(voter.polling_station_id)
+            if station:
+                for name, field in STATION_FIELD_MAPPING.items():
+                    record[name] = station[field]
+            for name, field in ENCODED_FIELD_MAPPING.items():
+                code = getattr(voter, f'{field}_id')
+                if code is not None:
+                    record[name] = labels[code]
+                else:
+                    record.setdefault(name, '')
+            records.append(record)
+        return records
+
+    @classmethod
+    def assign_areas(cls, voters, known=None):
+        """
+        Point ``voters`` at the area rows matching their hierarchy columns,
+        creating the areas that do not exist yet. ``known`` caches resolved
+        paths across calls.
+        """
+        ids = resolve_areas({VoterFacet.key_for(voter) for voter in voters}, known)
+        for voter in voters:
+            for field, area_id in zip(cls.AREA_FIELDS, ids[VoterFacet.key_for(voter)]):
+                setattr(voter, f'{field}_id', area_id)
+
+    @classmethod
+    def encode_attributes(cls, voters, labels, known=None):
+        """
+        Set the attribute codes of ``voters`` from ``labels``, one dict of
+        attribute name -> text per voter. Attributes missing from a dict are
+        left alone and empty text clears the code. ``known`` caches codes
+        across calls.
+        """
+        for attribute in ENCODED_FIELDS:
+            values = {label.get(attribute) for label in labels if label.get(attribute)}
+            codes = AttributeValue.codes_for(attribute, values, known)
+            for voter, label in zip(voters, labels):
+                if attribute in label:
+                    setattr(voter, f'{attribute}_id', codes.get(label[attribute]) if label[attribute] else None)
+
+    @classmethod
+    def assign_polling_stations(cls, voters, addresses=None, known=None):
+        """
+        Point ``voters`` at the polling station of their assembly and PSNO,
+        creating missing stations. Needs the area keys from assign_areas().
+
+        ``addresses`` gives the PS ADDRESS of each voter. When given, the
+        addresses and voter locations also fill in or update the stations.
+        ``known`` caches resolved stations across calls.
+        """
+        details = {}
+        for position, voter in enumerate(voters):
+            if voter.assembly_area_id and voter.psno:
+                station = details.setdefault((voter.assembly_area_id, voter.psno), {})
+                if addresses is not None:
+                    station['location'] = station.get('location') or voter.location
+                    station['ps_address'] = station.get('ps_address') or addresses[position]
+
+        ids = PollingStation.resolve(details, known)
+        for voter in voters:
+            voter.polling_station_id = ids.get((voter.assembly_area_id, voter.psno))
 
     class Meta:
         db_table = 'voters_voter'
         verbose_name = 'Voter'
         verbose_name_plural = 'Voters'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['card_no'], name='voter_card_no_idx'),
+            models.Index(fields=['assembly', 'card_no'], name='voter_assembly_card_no_idx'),
+            models.Index(fields=['assembly', 'psno', 'sno'], name='voter_booth_serial_idx'),
+            models.Index(fields=['name_key', 'assembly_area'], name='voter_name_key_idx'),
+            models.Index(fields=['card_key'], name='voter_card_key_idx'),
+            models.Index(fields=['mobile_no'], name='voter_mobile_no_idx'),
+            models.Index(fields=['polling_station', 'sno'], name='voter_station_serial_idx'),
+            models.Index(
+                fields=['mlc_constituency', 'assembly', 'mandal', 'location', 'psno'],
+                name='voter_hierarchy_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.voter_name} - {self.card_no}"
+
+
+class VoterJob(models.Model):
+    """
+    A long running voter operation started from the admin and run by a
+    management command in its own process, which reports progress here.
+    """
+    KIND_CHOICES = [
+        ('import', 'Import'),
+        ('delete', 'Delete'),
+        ('notify', 'Notify'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='import')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    file_path = models.CharField(max_length=500, blank=True)
+    options = models.JSONField(default=dict, blank=True)
+
+    # Row counts, updated while the job runs
+    parsed = models.PositiveIntegerField(default=0)
+    inserted = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    invalid = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+
+    pid = models.IntegerField(null=True, blank=True)
+    # Host the process runs on; a pid means nothing on other hosts
+    host = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='voter_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'voters_voterjob'
+        verbose_name = 'Voter Job'
+        verbose_name_plural = 'Voter Jobs'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+
+class VoterSelection(models.Model):
+    """
+    A set of voters saved under a short token for bulk operations: the
+    voters matching ``filters`` (filter-voters parameters), plus
+    ``include_ids``, minus ``exclude_ids``. With no filters only the
+    included voters are selected.
+    """
+    token = models.CharField(max_length=22, unique=True, editable=False)
+    filters = models.JSONField(null=True, blank=True)
+    include_ids = models.JSONField(default=list, blank=True)
+    exclude_ids = models.JSONField(default=list, blank=True)
+
+    # Voters selected when the selection was made
+    voter_count = models.PositiveIntegerField(default=0)
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='voter_selections'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'voters_voterselection'
+        verbose_name = 'Voter Selection'
+        verbose_name_plural = 'Voter Selections'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.token} ({self.voter_count} voters)"
+
+
+class VoterCount(models.Model):
+    """
+    Base of the summary tables that hold a voter count per key.
+
+    Kept up to date by Voter.save() and Voter.delete(), and by the bulk
+    import and delete paths through adjust().
+    """
+    KEY_FIELDS = ()
+
+    voter_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def adjust(cls, deltas):
+        """
+        Add ``deltas`` (key tuple -> change in voter count) to the counts,
+        creating missing keys and dropping emptied ones. Keys are updated in
+        sorted order so concurrent writers lock rows in the same order.
+        """
+        changed = sorted(key for key, delta in deltas.items() if delta)
+        if not changed:
+            return
+
+        for key in changed:
+            delta = deltas[key]
+            lookup = dict(zip(cls.KEY_FIELDS, key))
+            if cls.objects.filter(**lookup).update(voter_count=F('voter_count') + delta):
+                if delta < 0:
+                    cls.objects.filter(voter_count__lte=0, **lookup).delete()
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(voter_count=delta, **lookup)
+            except IntegrityError:
+                # Created by another writer in the meantime
+                cls.objects.filter(**lookup).update(voter_count=F('voter_count') + delta)
+
+
+class VoterFacet(VoterCount):
+    """
+    Number of voters at each (MLC constituency, assembly, mandal, location)
+    path, used for the filter dropdowns instead of scanning the voters.
+    """
+    PATH_FIELDS = ('mlc_constituency', 'assembly', 'mandal', 'location')
+    KEY_FIELDS = PATH_FIELDS
+
+    mlc_constituency = models.CharField(max_length=100)
+    assembly = models.CharField(max_length=100)
+    mandal = models.CharField(max_length=100)
+    location = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        db_table = 'voters_voterfacet'
+        verbose_name = 'Voter Facet'
+        verbose_name_plural = 'Voter Facets'
+        ordering = ['mlc_constituency', 'assembly', 'mandal', 'location']
+        constraints = [
+            models.UniqueConstraint(fields=['mlc_constituency', 'assembly', 'mandal', 'location'], name='voter_facet_path_unique'),
+        ]
+
+    def __str__(self):
+        return f"{' / '.join(self.key_for(self))}: {self.voter_count}"
+
+    @classmethod
+    def key_for(cls, voter):
+        """
+        Facet path of a voter, given as a model instance or a values() dict.
+        """
+        if isinstance(voter, dict):
+            return tuple(voter.get(field) or '' for field in cls.PATH_FIELDS)
+        return tuple(getattr(voter, field) or '' for field in cls.PATH_FIELDS)
+
+
+class VoterRollup(VoterCount):
+    """
+    Number of voters per (area node, dimension, value), for demographic
+    breakdowns of an assembly, mandal or polling station without grouping
+    the voters table.
+
+    ``node_id`` is the id of the Assembly, Mandal or PollingStation named by
+    ``level``. ``value`` is the AttributeValue code of the dimension, or the
+    1-based index into AGE_BANDS for ``age_band``; 0 means unknown.
+    """
+    # Rollup levels and the Voter key naming the node of each
+    LEVELS = (
+        ('assembly', 'assembly_area_id'),
+        ('mandal', 'mandal_area_id'),
+        ('polling_station', 'polling_station_id'),
+    )
+    DIMENSIONS = ('gender', 'age_band', 'party', 'caste', 'verify_status')
+    KEY_FIELDS = ('level', 'node_id', 'dimension', 'value')
+
+    # Voter columns the rollup keys are computed from
+    SOURCE_FIELDS = (
+        'assembly_area_id', 'mandal_area_id', 'polling_station_id',
+        'gender_id', 'age', 'party_id', 'caste_id', 'verify_status_id',
+    )
+
+    level = models.CharField(max_length=20, choices=[(level, level.replace('_', ' ').title()) for level, _ in LEVELS])
+    node_id = models.BigIntegerField()
+    dimension = models.CharField(max_length=20, choices=[(name, name.replace('_', ' ').title()) for name in DIMENSIONS])
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'voters_voterrollup'
+        verbose_name = 'Voter Rollup'
+        verbose_name_plural = 'Voter Rollups'
+        ordering = ['level', 'node_id', 'dimension', 'value']
+        constraints = [
+            models.UniqueConstraint(fields=['level', 'node_id', 'dimension', 'value'], name='voter_rollup_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.level} {self.node_id} {self.dimension}={self.value}: {self.voter_count}"
+
+    @staticmethod
+    def age_band(age):
+        """
+        1-based index of the AGE_BANDS band of ``age``, or 0 if unknown.
+        """
+        try:
+            age = int(age)
+        except (TypeError, ValueError):
+            return 0
+        for index, (_, lowest, highest) in enumerate(AGE_BANDS, 1):
+            if (lowest is None or age >= lowest) and (highest is None or age <= highest):
+                return index
+        return 0
+
+    @classmethod
+    def keys_for(cls, voter):
+        """
+        Rollup keys of a voter, given as a model instance or a values() dict
+        of SOURCE_FIELDS. Levels the voter has no node for are left out.
+        """
+        if isinstance(voter, dict):
+            get = voter.get
+        else:
+            def get(field):
+                return getattr(voter, field)
+
+        values = {
+            'gender': get('gender_id') or 0,
+            'age_band': cls.age_band(get('age')),
+            'party': get('party_id') or 0,
+            'caste': get('caste_id') or 0,
+            'verify_status': get('verify_status_id') or 0,
+        }
+        return [
+            (level, get(field), dimension, value)
+            for level, field in cls.LEVELS if get(field) is not None
+            for dimension, value in values.items()
+        ]
+
+
+class VoterGram(models.Model):
+    """
+    Trigram index of the searchable voter columns. Each row holds the CRC32
+    of one trigram of one column of a voter, with the voter's assembly so
+    scoped searches read a narrow range of (gram, assembly_area_id).
+    """
+    # Columns indexed, in the order of their ``field`` codes; identifiers
+    # are matched without their spaces and separators
+    SEARCH_FIELDS = ('voter_name', 'rel_name', 'card_no', 'hno')
+    COMPACT_FIELDS = ('card_no', 'hno')
+    SOURCE_FIELDS = (*SEARCH_FIELDS, 'assembly_area_id')
+
+    # Columns of the gram rows built by rows_for()
+    ROW_COLUMNS = ('voter_id', 'assembly_area_id', 'field', 'gram')
+
+    # Rows are maintained by the code writing voters, which also deletes them
+    voter = models.ForeignKey(
+        'Voter', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+'
+    )
+    assembly_area_id = models.BigIntegerField(null=True)
+    field = models.PositiveSmallIntegerField(choices=[(code, name) for code, name in enumerate(SEARCH_FIELDS, 1)])
+    gram = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = 'voters_votergram'
+        verbose_name = 'Voter Gram'
+        verbose_name_plural = 'Voter Grams'
+        indexes = [
+            models.Index(fields=['gram', 'assembly_area_id', 'voter'], name='voter_gram_lookup_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['voter', 'field', 'gram'], name='voter_gram_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.voter_id} {self.get_field_display()} {self.gram}"
+
+    @classmethod
+    def normalize(cls, field, value):
+        return normalize_search_text(value, compact=field in cls.COMPACT_FIELDS)
+
+    @staticmethod
+    def grams(text):
+        """
+        CRC32 codes of the trigrams of normalized ``text``. Each word is
+        padded with two leading and one trailing space, so short words and
+        word starts get trigrams of their own.
+        """
+        codes = set()
+        for word in text.split():
+            padded = f'  {word} '
+            codes.update(
+                zlib.crc32(padded[index:index + 3].encode('utf-8'))
+                for index in range(len(padded) - 2)
+            )
+        return codes
+
+    @classmethod
+    def search_values(cls, voter):
+        """
+        SOURCE_FIELDS of a voter, given as a model instance or a values() dict.
+        """
+        if isinstance(voter, dict):
+            return tuple(voter.get(field) for field in cls.SOURCE_FIELDS)
+        return tuple(getattr(voter, field) for field in cls.SOURCE_FIELDS)
+
+    @classmethod
+    def rows_for(cls, voter):
+        """
+        Gram rows of a voter with a primary key, given as a model instance or
+        a values() dict with ``pk``, as tuples of ROW_COLUMNS. Tuples rather
+        than model instances, which cost more to build than to write.
+        """
+        pk = voter['pk'] if isinstance(voter, dict) else voter.pk
+        values = dict(zip(cls.SOURCE_FIELDS, cls.search_values(voter)))
+        return [
+            (pk, values['assembly_area_id'], code, gram)
+            for code, field in enumerate(cls.SEARCH_FIELDS, 1)
+            for gram in cls.grams(cls.normalize(field, values[field]))
+        ]
+
+    @classmethod
+    def insert_rows(cls, rows):
+        """
+        Insert ``rows`` (tuples of ROW_COLUMNS) in one executemany(),
+        skipping the rows already present. Concurrent imports may index the
+        same new voter twice.
+        """
+        ops = connection.ops
+        columns = ', '.join(ops.quote_name(column) for column in cls.ROW_COLUMNS)
+        sql = (
+            f'{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {ops.quote_name(cls._meta.db_table)} '
+            f'({columns}) VALUES ({", ".join(["%s"] * len(cls.ROW_COLUMNS))}) '
+            f'{ops.on_conflict_suffix_sql([], OnConflict.IGNORE, None, None)}'
+        )
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, rows)
+
+    @classmethod
+    def index(cls, voters, replace=True):
+        """
+        Write the grams of saved ``voters`` (instances or values() dicts
+        with ``pk``), replacing their old grams unless ``replace`` is off
+        for voters that have none yet. Returns the number of grams written.
+        """
+        voters = list(voters)
+        if not voters:
+            return 0
+        rows = [row for voter in voters for row in cls.rows_for(voter)]
+        with transaction.atomic():
+            if replace:
+                pks = [voter['pk'] if isinstance(voter, dict) else voter.pk for voter in voters]
+                cls.objects.filter(voter_id__in=pks).delete()
+            cls.insert_rows(rows)
+        return len(rows)
+
+
+def fold_name(name):
+    """
+    Compare area and attribute names like MySQL's default collation,
+    ignoring case and trailing spaces.
+    """
+    return name.rstrip().casefold()
+
+
+class Area(models.Model):
+    """
+    A node of the geography hierarchy. Each level has its own table and
+    names are unique within the parent node.
+    """
+    PARENT_FIELD = None
+
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        abstract = True
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def ids_for(cls, keys):
+        """
+        Map (parent id, name) pairs to area ids, creating the missing areas.
+        """
+        if not keys:
+            return {}
+
+        parent = f'{cls.PARENT_FIELD}_id' if cls.PARENT_FIELD else None
+
+        def lookup():
+            rows = cls.objects.filter(name__in={name for _, name in keys})
+            if parent:
+                rows = rows.filter(**{f'{parent}__in': {parent_id for parent_id, _ in keys}})
+            return {
+                (row[parent] if parent else None, fold_name(row['name'])): row['id']
+                for row in rows.values('id', 'name', *([parent] if parent else []))
+            }
+
+        found = lookup()
+        missing = {key for key in keys if (key[0], fold_name(key[1])) not in found}
+        if missing:
+            # Another writer may create the same areas meanwhile
+            cls.objects.bulk_create([
+                cls(name=name, **({parent: parent_id} if parent else {}))
+                for parent_id, name in missing
+            ], ignore_conflicts=True)
+            found = lookup()
+        return {key: found.get((key[0], fold_name(key[1]))) for key in keys}
+
+
+class MlcConstituency(Area):
+    name = models.CharField(max_length=100, unique=True)
+
+    class Meta(Area.Meta):
+        db_table = 'voters_mlcconstituency'
+        verbose_name = 'MLC Constituency'
+        verbose_name_plural = 'MLC Constituencies'
+
+
+class Assembly(Area):
+    PARENT_FIELD = 'mlc_constituency'
+
+    mlc_constituency = models.ForeignKey(MlcConstituency, on_delete=models.PROTECT, related_name='assemblies')
+
+    class Meta(Area.Meta):
+        db_table = 'voters_assembly'
+        verbose_name = 'Assembly'
+        verbose_name_plural = 'Assemblies'
+        constraints = [
+            models.UniqueConstraint(fields=['mlc_constituency', 'name'], name='assembly_name_unique'),
+        ]
+
+
+class Mandal(Area):
+    PARENT_FIELD = 'assembly'
+
+    assembly = models.ForeignKey(Assembly, on_delete=models.PROTECT, related_name='mandals')
+
+    class Meta(Area.Meta):
+        db_table = 'voters_mandal'
+        verbose_name = 'Mandal'
+        verbose_name_plural = 'Mandals'
+        constraints = [
+            models.UniqueConstraint(fields=['assembly', 'name'], name='mandal_name_unique'),
+        ]
+
+
+class Location(Area):
+    PARENT_FIELD = 'mandal'
+
+    mandal = models.ForeignKey(Mandal, on_delete=models.PROTECT, related_name='locations')
+    name = models.CharField(max_length=255)
+
+    class Meta(Area.Meta):
+        db_table = 'voters_location'
+        verbose_name = 'Location'
+        verbose_name_plural = 'Locations'
+        constraints = [
+            models.UniqueConstraint(fields=['mandal', 'name'], name='location_name_unique'),
+        ]
+
+
+class PollingStation(models.Model):
+    """
+    A polling booth, identified by its PSNO within an assembly. The location
+    and address are stored once here instead of on every voter.
+    """
+    assembly = models.ForeignKey(Assembly, on_delete=models.PROTECT, related_name='polling_stations')
+    psno = models.CharField('PSNO', max_length=50)
+    location = models.CharField('LOCATION', max_length=255, blank=True, default='')
+    ps_address = models.TextField('PS ADDRESS', blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'voters_pollingstation'
+        verbose_name = 'Polling Station'
+        verbose_name_plural = 'Polling Stations'
+        ordering = ['assembly', 'psno']
+        constraints = [
+            models.UniqueConstraint(fields=['assembly', 'psno'], name='polling_station_psno_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.psno} - {self.location}"
+
+    @classmethod
+    def resolve(cls, details, known=None):
+        """
+        Map (assembly id, psno) keys to station ids, creating the missing
+        stations. ``details`` maps each key to the location and ps_address
+        seen for it; non-empty values that differ from the stored ones are
+        written to the station, and only those fields.
+
+        ``known`` caches the stored station of each key across calls, so
+        importers only query for stations they have not seen. The values
+        compared are re-read first, as another chunk, run or process may
+        have changed them since they were cached.
+        """
+        known = {} if known is None else known
+
+        missing = [key for key in details if key not in known]
+        if missing:
+            def lookup():
+                rows = cls.objects.filter(
+                    assembly_id__in={assembly_id for assembly_id, _ in missing},
+                    psno__in={psno for _, psno in missing},
+                ).values('id', 'assembly_id', 'psno', 'location', 'ps_address')
+                for row in rows:
+                    known[(row['assembly_id'], row['psno'])] = row
+
+            lookup()
+            new = [key for key in missing if key not in known]
+            if new:
+                # Another writer may create the same stations meanwhile
+                cls.objects.bulk_create([
+                    cls(
+                        assembly_id=assembly_id,
+                        psno=psno,
+                        location=details[(assembly_id, psno)].get('location') or '',
+                        ps_address=details[(assembly_id, psno)].get('ps_address') or '',
+                    )
+                    for assembly_id, psno in new
+                ], ignore_conflicts=True)
+                lookup()
+
+        incoming = {key: values for key, values in details.items() if any(values.values())}
+        if incoming:
+            rows = cls.objects.filter(pk__in={known[key]['id'] for key in incoming}).values(
+                'id', 'location', 'ps_address'
+            )
+            stored = {row['id']: row for row in rows}
+            for key in incoming:
+                known[key].update(stored.get(known[key]['id'], {}))
+
+        # Stations grouped by the fields that changed, one UPDATE per group
+        changed = {}
+        for key, values in incoming.items():
+            values = {field: value for field, value in values.items() if value and value != known[key][field]}
+            if values:
+                changed.setdefault(tuple(sorted(values)), []).append((key, values))
+        now = timezone.now()
+        for fields, stations in changed.items():
+            cls.objects.bulk_update(
+                [cls(pk=known[key]['id'], updated_at=now, **values) for key, values in stations],
+                [*fields, 'updated_at']
+            )
+            for key, values in stations:
+                known[key].update(values)
+
+        return {key: known[key]['id'] for key in details}
+
+
+class AttributeValue(models.Model):
+    """
+    One distinct value of a low-cardinality voter attribute (ENCODED_FIELDS).
+    Voters reference the two byte id instead of repeating the text on
+    every row, so filters and GROUP BYs on these attributes compare
+    integers.
+    """
+    id = models.SmallAutoField(primary_key=True)
+    attribute = models.CharField(max_length=20, choices=[(name, name.replace('_', ' ').title()) for name in ENCODED_FIELDS])
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        db_table = 'voters_attributevalue'
+        verbose_name = 'Attribute Value'
+        verbose_name_plural = 'Attribute Values'
+        ordering = ['attribute', 'value']
+        constraints = [
+            models.UniqueConstraint(fields=['attribute', 'value'], name='attribute_value_unique'),
+        ]
 
     def __str__(self):
-        return f"{self.voter_name} - {self.card_no}"
\ No newline at end of file
+        return self.value
+
+    @classmethod
+    def codes_for(cls, attribute, values, known=None):
+        """
+        Map text values of ``attribute`` to their codes, creating the missing
+        ones. Values are stripped and cut to the length ENCODED_FIELDS allows.
+
+        ``known`` caches codes by (attribute, folded value) across calls.
+        """
+        known = {} if known is None else known
+        max_length = ENCODED_FIELDS[attribute]
+        stored = {value: str(value).strip()[:max_length] for value in values}
+        stored = {value: text for value, text in stored.items() if text}
+
+        missing = {text for text in stored.values() if (attribute, fold_name(text)) not in known}
+        if missing:
+            def lookup():
+                for code, value in cls.objects.filter(attribute=attribute, value__in=missing).values_list('id', 'value'):
+                    known[(attribute, fold_name(value))] = code
+
+            lookup()
+            new = {text for text in missing if (attribute, fold_name(text)) not in known}
+            if new:
+                # Another writer may create the same values meanwhile
+                cls.objects.bulk_create([cls(attribute=attribute, value=text) for text in new], ignore_conflicts=True)
+                lookup()
+
+        return {value: known.get((attribute, fold_name(text))) for value, text in stored.items()}
+
+
+# Area tables in hierarchy order, matching VoterFacet.PATH_FIELDS
+AREA_MODELS = (MlcConstituency, Assembly, Mandal, Location)
+
+
+def resolve_areas(paths, known=None):
+    """
+    Map hierarchy paths (the VoterFacet.key_for() tuples of voters) to
+    tuples of area ids, one per level, creating missing areas level by
+    level. Levels below an empty name get None.
+
+    Resolved paths are added to ``known`` so callers importing many chunks
+    only query for paths they have not seen.
+    """
+    known = {} if known is None else known
+    missing = [path for path in set(paths) if path not in known]
+    if missing:
+        ids = {path: () for path in missing}
+        for depth, model in enumerate(AREA_MODELS):
+            keys = {}
+            for path in missing:
+                parent_id = ids[path][-1] if depth else None
+                if path[depth] and (parent_id is not None or not depth):
+                    keys[path] = (parent_id, path[depth])
+            resolved = model.ids_for(set(keys.values()))
+            for path in missing:
+                ids[path] += (resolved.get(keys[path]) if path in keys else None,)
+        known.update(ids)
+    return {path: known[path] for path in paths}
\ No newline at end of file
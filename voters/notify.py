@@ -0,0 +1,62 @@
+import logging
+
+from notifications.models import NotificationLog
+from notifications.utils import NotificationSender
+
+logger = logging.getLogger(__name__)
+
+# Failed notifications listed in a send-notification response
+MAX_REPORTED_ERRORS = 100
+
+# Selections larger than this are notified by a background job; every
+# message is its own request to the SMS gateway
+BACKGROUND_SEND_THRESHOLD = 500
+
+
+def send_to_voters(voters, template, channel, progress=None):
+    """
+    Send ``template`` over ``channel`` to each of ``voters`` (loaded with at
+    least id and mobile_no), logging every message as a NotificationLog.
+    ``progress`` is called with the sent and failed counts after each voter.
+
+    Returns a dict with total_sent, total_failed and the first
+    MAX_REPORTED_ERRORS errors (None when there are none).
+    """
+    sender = NotificationSender()
+    sent, failed, errors = 0, 0, []
+
+    for voter in voters:
+        try:
+            # Validate mobile number
+            if not voter.mobile_no:
+                raise ValueError(f"Voter {voter.id} has no mobile number")
+
+            notification_log = NotificationLog.objects.create(
+                recipient=voter.mobile_no,
+                template=template,
+                channel=channel,
+                status=NotificationLog.Status.PENDING
+            )
+            success, error = sender.send_notification(notification_log)
+        except Exception as e:
+            logger.error(f"Error processing voter {voter.id}: {str(e)}")
+            success, error = False, str(e)
+
+        if success:
+            sent += 1
+        else:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({
+                    'voter_id': voter.id,
+                    'mobile': getattr(voter, 'mobile_no', 'N/A'),
+                    'error': error
+                })
+        if progress:
+            progress(sent, failed)
+
+    return {
+        'total_sent': sent,
+        'total_failed': failed,
+        'errors': errors or None
+    }
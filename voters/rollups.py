@@ -0,0 +1,116 @@
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .constants import AGE_BANDS
+from .models import AttributeValue, Voter, VoterRollup
+
+logger = logging.getLogger(__name__)
+
+
+def _age_band_expression():
+    """
+    SQL equivalent of VoterRollup.age_band() over the age column.
+    """
+    whens = [When(age__isnull=True, then=Value(0))]
+    last = 0
+    for index, (_, _, highest) in enumerate(AGE_BANDS, 1):
+        if highest is None:
+            last = index
+            break
+        whens.append(When(age__lte=highest, then=Value(index)))
+    return Case(*whens, default=Value(last), output_field=IntegerField())
+
+
+def _dimension_expression(dimension):
+    if dimension == 'age_band':
+        return _age_band_expression()
+    return Coalesce(F(f'{dimension}_id'), Value(0), output_field=IntegerField())
+
+
+def count_rollups(queryset, dimensions=None):
+    """
+    Count the voters of ``queryset`` per rollup key of ``dimensions``
+    (default: all), with one GROUP BY per level and dimension so only the
+    grouped counts are fetched.
+    """
+    counts = Counter()
+    for level, node_field in VoterRollup.LEVELS:
+        nodes = queryset.order_by().filter(**{f'{node_field}__isnull': False})
+        for dimension in dimensions or VoterRollup.DIMENSIONS:
+            rows = nodes.values(
+                node=F(node_field), band=_dimension_expression(dimension)
+            ).annotate(voter_count=Count('id'))
+            for row in rows:
+                counts[(level, row['node'], dimension, row['band'])] += row['voter_count']
+    return counts
+
+
+def rollup_deltas(voters):
+    """
+    Rollup count changes for adding ``voters`` (instances or values() dicts).
+    """
+    return Counter(key for voter in voters for key in VoterRollup.keys_for(voter))
+
+
+def rebuild_rollups():
+    """
+    Recompute every rollup from the voters table. Returns the number of
+    rollup keys.
+    """
+    counts = count_rollups(Voter.objects.all())
+    with transaction.atomic():
+        VoterRollup.objects.all().delete()
+        VoterRollup.objects.bulk_create([
+            VoterRollup(voter_count=count, **dict(zip(VoterRollup.KEY_FIELDS, key)))
+            for key, count in counts.items()
+        ], batch_size=1000)
+    logger.info(f'Rebuilt {len(counts)} voter rollups')
+    return len(counts)
+
+
+def _labels(dimension, values):
+    if dimension == 'age_band':
+        bands = {index: label for index, (label, _, _) in enumerate(AGE_BANDS, 1)}
+        return {value: bands.get(value, 'Unknown') for value in values}
+    labels = dict(AttributeValue.objects.filter(pk__in=[value for value in values if value]).values_list('id', 'value'))
+    return {value: labels.get(value, 'Unknown') for value in values}
+
+
+def get_rollups(level, node_ids=None, dimensions=None):
+    """
+    Voter counts of ``level`` nodes broken down by each of ``dimensions``
+    (default: all), summed over ``node_ids`` or over every node of the level.
+
+    Returns a dict of dimension -> list of dicts with value, label and
+    voter_count, largest first. Raises ValueError for an unknown level or
+    dimension.
+    """
+    levels = [name for name, _ in VoterRollup.LEVELS]
+    if level not in levels:
+        raise ValueError(f'Unknown rollup level: {level}')
+    dimensions = dimensions or list(VoterRollup.DIMENSIONS)
+    unknown = [dimension for dimension in dimensions if dimension not in VoterRollup.DIMENSIONS]
+    if unknown:
+        raise ValueError(f'Unknown rollup dimension: {", ".join(unknown)}')
+
+    rollups = VoterRollup.objects.filter(level=level, dimension__in=dimensions)
+    if node_ids is not None:
+        rollups = rollups.filter(node_id__in=node_ids)
+
+    counts = {dimension: Counter() for dimension in dimensions}
+    rows = rollups.order_by().values('dimension', 'value').annotate(total=Sum('voter_count'))
+    for row in rows:
+        counts[row['dimension']][row['value']] += row['total']
+
+    result = {}
+    for dimension, values in counts.items():
+        labels = _labels(dimension, values)
+        result[dimension] = [
+            {'value': value, 'label': labels[value], 'voter_count': count}
+            for value, count in values.most_common()
+        ]
+    return result
@@ -0,0 +1,266 @@
+import logging
+import math
+import time
+
+from django.db.models import Count
+
+from .models import Assembly, Location, Mandal, PollingStation, Voter, VoterGram
+from .constants import AREA_FILTERS, STATION_FILTER
+from .utils import area_filters, phonetic_key
+
+logger = logging.getLogger(__name__)
+
+# Voters read per query while indexing
+INDEX_BATCH_SIZE = 5000
+
+# Smallest trigram similarity returned, as pg_trgm's default threshold
+MIN_SIMILARITY = 0.3
+
+# Candidates ranked in Python per result asked for, and at most
+CANDIDATE_FACTOR = 10
+MAX_CANDIDATES = 500
+
+# Relation names and house numbers matching are weaker evidence than the
+# voter's own name or card number
+FIELD_WEIGHTS = {'voter_name': 1.0, 'rel_name': 0.9, 'card_no': 1.0, 'hno': 0.8}
+
+# Voter columns returned with each match
+RESULT_FIELDS = ('assembly', 'mandal', 'location', 'psno', 'sno')
+
+
+def index_voters_after(last_pk, batch_size=INDEX_BATCH_SIZE, progress=None):
+    """
+    Index the voters with a primary key above ``last_pk``, in primary key
+    batches. ``progress`` is called with the number of voters indexed so far.
+
+    Returns the number of voters indexed.
+    """
+    indexed = 0
+    while True:
+        batch = list(
+            Voter.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values('pk', *VoterGram.SOURCE_FIELDS)[:batch_size]
+        )
+        if not batch:
+            return indexed
+        VoterGram.index(batch, replace=False)
+        last_pk = batch[-1]['pk']
+        indexed += len(batch)
+        if progress:
+            progress(indexed)
+
+
+def index_created(voters, last_pk):
+    """
+    Index voters just added with bulk_create(). Backends that do not return
+    the new primary keys, such as MySQL, index every voter above
+    ``last_pk``, the largest primary key before the insert.
+    """
+    if all(voter.pk for voter in voters):
+        return VoterGram.index(voters, replace=False)
+    return index_voters_after(last_pk)
+
+
+def index_voters(pks, batch_size=INDEX_BATCH_SIZE):
+    """
+    Replace the grams of the voters with primary keys ``pks``, in batches.
+    Returns the number of voters indexed.
+    """
+    pks = sorted(pks)
+    indexed = 0
+    for start in range(0, len(pks), batch_size):
+        batch = list(
+            Voter.objects.filter(pk__in=pks[start:start + batch_size]).values('pk', *VoterGram.SOURCE_FIELDS)
+        )
+        indexed += len(batch)
+        VoterGram.index(batch)
+    return indexed
+
+
+def rebuild_search_index(batch_size=INDEX_BATCH_SIZE, progress=None):
+    """
+    Recompute the grams of every voter. Returns the number of voters indexed.
+    """
+    VoterGram.objects.all().delete()
+    indexed = index_voters_after(0, batch_size, progress)
+    logger.info(f'Rebuilt the search index of {indexed} voters')
+    return indexed
+
+
+def backfill_name_keys(batch_size=INDEX_BATCH_SIZE, sleep=0, progress=None):
+    """
+    Compute the phonetic name_key of voters saved before it existed or
+    after phonetic_key() changed, in primary key batches. Only voters
+    whose key differs are written.
+
+    ``progress`` is called with (last primary key, voters updated).
+    Returns the number of voters updated.
+    """
+    last_pk, updated = 0, 0
+    while True:
+        batch = list(
+            Voter.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'voter_name', 'name_key')[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        changed = []
+        for voter in batch:
+            name_key = phonetic_key(voter.voter_name)[:255]
+            if voter.name_key != name_key:
+                voter.name_key = name_key
+                changed.append(voter)
+        if changed:
+            Voter.objects.bulk_update(changed, ['name_key'], batch_size=1000)
+            updated += len(changed)
+
+        if progress:
+            progress(last_pk, updated)
+        if sleep:
+            time.sleep(sleep)
+
+    logger.info(f'Backfilled the name keys of {updated} voters')
+    return updated
+
+
+def similarity(query_grams, grams):
+    """
+    Mean of the share of the query's trigrams found in ``grams`` and the
+    share of the trigrams of either side found in both, so a query naming
+    part of a longer name still ranks well.
+    """
+    if not query_grams or not grams:
+        return 0.0
+    common = len(query_grams & grams)
+    return (common / len(query_grams) + common / (len(query_grams) + len(grams) - common)) / 2
+
+
+def _scope(ids):
+    """
+    Assemblies to read grams from and voter filters for the area ids of
+    ``ids`` (as parsed by area_filters). Returns (None, {}) for no scope.
+    """
+    filters = {f'voter__{column}': ids[param] for param, column in (
+        ('mandal_id', 'mandal_area_id'),
+        ('location_id', 'location_area_id'),
+        ('polling_station_id', 'polling_station_id'),
+    ) if param in ids}
+
+    if 'polling_station_id' in ids:
+        assemblies = PollingStation.objects.filter(pk=ids['polling_station_id']).values_list('assembly_id', flat=True)
+    elif 'location_id' in ids:
+        assemblies = Location.objects.filter(pk=ids['location_id']).values_list('mandal__assembly_id', flat=True)
+    elif 'mandal_id' in ids:
+        assemblies = Mandal.objects.filter(pk=ids['mandal_id']).values_list('assembly_id', flat=True)
+    elif 'assembly_id' in ids:
+        assemblies = [ids['assembly_id']]
+    elif 'mlc_constituency_id' in ids:
+        assemblies = Assembly.objects.filter(mlc_constituency_id=ids['mlc_constituency_id']).values_list('id', flat=True)
+    else:
+        return None, filters
+    return list(assemblies), filters
+
+
+def search_voters(query, params=None, limit=20, fields=None):
+    """
+    Voters whose ``fields`` (default: all VoterGram.SEARCH_FIELDS) are most
+    similar to ``query``, narrowed by the area ids of ``params``.
+
+    Candidates sharing the most trigrams with the query are read from the
+    gram index and ranked by trigram similarity, weighted per field.
+    Returns up to ``limit`` dicts with the voter's id, searched columns,
+    RESULT_FIELDS, the best matching field and its score, best first.
+    Raises ValueError for unknown fields, an empty query or malformed ids.
+    """
+    fields = list(fields or VoterGram.SEARCH_FIELDS)
+    unknown = [field for field in fields if field not in VoterGram.SEARCH_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown search field: {", ".join(unknown)}')
+
+    query_grams = {field: VoterGram.grams(VoterGram.normalize(field, query)) for field in fields}
+    all_grams = set().union(*query_grams.values())
+    if not all_grams:
+        raise ValueError('Search text is empty')
+
+    assemblies, filters = _scope(area_filters(params or {}))
+    grams = VoterGram.objects.filter(
+        gram__in=all_grams,
+        field__in=[VoterGram.SEARCH_FIELDS.index(field) + 1 for field in fields],
+        **filters
+    )
+    if assemblies is not None:
+        grams = grams.filter(assembly_area_id__in=assemblies)
+
+    # A match above MIN_SIMILARITY shares at least this many query trigrams
+    min_hits = max(1, math.ceil(MIN_SIMILARITY * min(len(field_grams) for field_grams in query_grams.values())))
+    candidates = (
+        grams.order_by().values('voter_id').annotate(hits=Count('gram'))
+        .filter(hits__gte=min_hits).order_by('-hits')
+        .values_list('voter_id', flat=True)[:min(limit * CANDIDATE_FACTOR, MAX_CANDIDATES)]
+    )
+
+    matches = []
+    voters = Voter.objects.filter(pk__in=list(candidates)).values(
+        'pk', *VoterGram.SEARCH_FIELDS, *RESULT_FIELDS
+    )
+    for voter in voters:
+        best_field, best_score = None, 0.0
+        for field in fields:
+            value = VoterGram.normalize(field, voter[field])
+            if not value:
+                continue
+            if value == VoterGram.normalize(field, query):
+                score = 1.0
+            else:
+                score = similarity(query_grams[field], VoterGram.grams(value))
+            score *= FIELD_WEIGHTS[field]
+            if score > best_score:
+                best_field, best_score = field, score
+        if best_score >= MIN_SIMILARITY:
+            matches.append(_match(voter, best_field, best_score))
+
+    matches.sort(key=lambda match: (-match['score'], match['id']))
+    return matches[:limit]
+
+
+def phonetic_search(query, params=None, limit=20):
+    """
+    Voters whose name sounds like ``query``: the phonetic_key() of the
+    query is looked up as a prefix of voter_name_key_idx, so Sreenivas
+    finds Srinivas Rao. Matches with the same key as the query come first,
+    then the closest spellings.
+
+    Returns the same dicts as search_voters(). Raises ValueError for an
+    empty query or malformed ids.
+    """
+    name_key = phonetic_key(query)[:255]
+    if not name_key:
+        raise ValueError('Search text is empty')
+
+    ids = area_filters(params or {})
+    voters = Voter.objects.filter(
+        name_key__startswith=name_key,
+        **{column: ids[param] for param, column in [*AREA_FILTERS, STATION_FILTER] if param in ids}
+    ).values('pk', 'name_key', *VoterGram.SEARCH_FIELDS, *RESULT_FIELDS)
+
+    query_grams = VoterGram.grams(VoterGram.normalize('voter_name', query))
+    matches = []
+    for voter in voters[:min(limit * CANDIDATE_FACTOR, MAX_CANDIDATES)]:
+        grams = VoterGram.grams(VoterGram.normalize('voter_name', voter['voter_name']))
+        # Same key as the query ranks above a longer name starting with it
+        score = (1.0 if voter['name_key'] == name_key else 0.5) + similarity(query_grams, grams) / 2
+        matches.append(_match(voter, 'voter_name', score / 1.5))
+
+    matches.sort(key=lambda match: (-match['score'], match['id']))
+    return matches[:limit]
+
+
+def _match(voter, field, score):
+    return {
+        'id': voter['pk'],
+        **{name: voter[name] for name in (*VoterGram.SEARCH_FIELDS, *RESULT_FIELDS)},
+        'matched_field': field,
+        'score': round(score, 3),
+    }
@@ -0,0 +1,193 @@
+import csv
+import json
+import logging
+import secrets
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from .constants import AREA_FILTERS, EXCEL_FIELDS, HIERARCHY_FILTERS, STATION_FILTER
+from .models import Voter, VoterSelection
+from .utils import hierarchy_filters
+
+logger = logging.getLogger(__name__)
+
+# How long a selection token can be used
+SELECTION_TTL = timedelta(hours=24)
+
+# Voter ids resolved per query when acting on a selection
+SELECTION_CHUNK_SIZE = 2000
+
+# Ids that can be listed explicitly in include_ids or exclude_ids
+MAX_EXPLICIT_IDS = 10000
+
+# Request parameters a selection's filters may hold
+FILTER_PARAMS = {
+    name for pair in HIERARCHY_FILTERS for name in pair
+} | {param for param, _ in [*AREA_FILTERS, STATION_FILTER]}
+
+
+def _ids(values, name):
+    if not isinstance(values, list):
+        raise ValueError(f'{name} must be a list')
+    if len(values) > MAX_EXPLICIT_IDS:
+        raise ValueError(f'{name} can list at most {MAX_EXPLICIT_IDS} voters; use filters instead')
+    try:
+        return sorted({int(value) for value in values})
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {name}')
+
+
+def selection_queryset(selection):
+    """
+    Voters of ``selection``, resolved against the current table.
+    """
+    lookups = hierarchy_filters(selection.filters) if selection.filters is not None else None
+    if lookups == {}:
+        # Empty filters match every voter
+        queryset = Voter.objects.all()
+    elif lookups:
+        queryset = Voter.objects.filter(Q(**lookups) | Q(pk__in=selection.include_ids))
+    else:
+        queryset = Voter.objects.filter(pk__in=selection.include_ids)
+    if selection.exclude_ids:
+        queryset = queryset.exclude(pk__in=selection.exclude_ids)
+    return queryset
+
+
+def build_selection(filters=None, include_ids=None, exclude_ids=None, user=None):
+    """
+    Unsaved selection of ``filters``, filter-voters parameters (unknown ones
+    are dropped; None selects only ``include_ids``), and the explicit ids.
+    Raises ValueError for malformed filters or ids, or a selection without
+    any voter source.
+    """
+    if filters is not None:
+        if not isinstance(filters, dict):
+            raise ValueError('filters must be an object')
+        filters = {key: str(value) for key, value in filters.items() if key in FILTER_PARAMS and value not in (None, '')}
+        # Raises ValueError for malformed area ids
+        hierarchy_filters(filters)
+    include_ids = _ids(include_ids or [], 'include_ids')
+    exclude_ids = _ids(exclude_ids or [], 'exclude_ids')
+    if filters is None and not include_ids:
+        raise ValueError('Pass filters or include_ids')
+
+    return VoterSelection(
+        token=secrets.token_urlsafe(12),
+        filters=filters,
+        include_ids=include_ids,
+        exclude_ids=exclude_ids,
+        created_by=user if user is not None and user.is_authenticated else None,
+        expires_at=timezone.now() + SELECTION_TTL,
+    )
+
+
+def create_selection(filters=None, include_ids=None, exclude_ids=None, user=None):
+    """
+    Save a selection (see build_selection) and count its voters.
+    """
+    selection = build_selection(filters, include_ids, exclude_ids, user)
+    selection.voter_count = selection_queryset(selection).count()
+    selection.save()
+    VoterSelection.objects.filter(expires_at__lte=timezone.now()).delete()
+    return selection
+
+
+def get_selection(token, user=None):
+    """
+    The unexpired selection saved under ``token``. Given a ``user``, only
+    the selections that user created are found, any of them for a
+    superuser; jobs started for a checked request pass none. Raises
+    LookupError if there is none.
+    """
+    selections = VoterSelection.objects.filter(token=token, expires_at__gt=timezone.now())
+    if user is not None and not user.is_superuser:
+        selections = selections.filter(created_by_id=user.pk)
+    selection = selections.first()
+    if selection is None:
+        raise LookupError('Selection not found or expired')
+    return selection
+
+
+def requested_selection(body, user=None):
+    """
+    Selection of a bulk request body: the saved ``selection`` token of
+    ``user``, or else the ``filters`` and ``voter_ids`` given inline.
+    Raises LookupError for an unknown or expired token and ValueError as
+    build_selection().
+    """
+    if body.get('selection'):
+        return get_selection(body['selection'], user)
+    return build_selection(body.get('filters'), body.get('voter_ids'), user=user)
+
+
+def selection_chunks(selection, chunk_size=SELECTION_CHUNK_SIZE):
+    """
+    Yield the voter ids of ``selection`` as lists of up to ``chunk_size``,
+    in id order with keyset queries, so a large selection is never held
+    in memory. Voters deleted by the caller between chunks are fine.
+    """
+    queryset = selection_queryset(selection).order_by('pk')
+    last_pk = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def selection_voters(selection, fields=None, chunk_size=SELECTION_CHUNK_SIZE):
+    """
+    Yield the voters of ``selection`` chunk by chunk, loading only
+    ``fields`` when given.
+    """
+    for ids in selection_chunks(selection, chunk_size):
+        voters = Voter.objects.filter(pk__in=ids).order_by('pk')
+        if fields:
+            voters = voters.only(*fields)
+        yield from voters
+
+
+def selection_records(selection, chunk_size=SELECTION_CHUNK_SIZE):
+    """
+    Yield the id and Excel record (see Voter.excel_records()) of each voter
+    of ``selection``, chunk by chunk.
+    """
+    for ids in selection_chunks(selection, chunk_size):
+        voters = list(Voter.objects.filter(pk__in=ids).order_by('pk').only('id', *Voter.RECORD_FIELDS))
+        yield from zip([voter.id for voter in voters], Voter.excel_records(voters))
+
+
+class _Echo:
+    """
+    File-like object handing each written CSV line back to the caller.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_rows(selection, export_format='csv'):
+    """
+    Lines of an export of ``selection``: CSV with a header of the Excel
+    columns, or NDJSON of id and data like the filter-voters stream.
+    Raises ValueError for an unknown format.
+    """
+    if export_format not in ('csv', 'ndjson'):
+        raise ValueError(f'Unknown export format: {export_format}')
+    records = selection_records(selection)
+
+    if export_format == 'ndjson':
+        return (json.dumps({'id': pk, 'data': data}, cls=DjangoJSONEncoder) + '\n' for pk, data in records)
+
+    writer = csv.writer(_Echo())
+
+    def rows():
+        yield writer.writerow(['ID', *EXCEL_FIELDS])
+        for pk, data in records:
+            yield writer.writerow([pk, *(data.get(field, '') for field in EXCEL_FIELDS)])
+    return rows()
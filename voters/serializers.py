@@ -1,7 +1,50 @@
 from rest_framework import serializers
-from .models import Voter
+from .constants import STATION_EXCEL_FIELDS
+from .models import Voter, PollingStation
+
+class VoterListSerializer(serializers.ListSerializer):
+    """
+    Reads the Excel records of all the voters at once, see
+    Voter.excel_records().
+    """
+    def to_representation(self, data):
+        voters = list(data.all() if hasattr(data, 'all') else data)
+        self.child.records = dict(zip([voter.pk for voter in voters], Voter.excel_records(voters)))
+        return super().to_representation(voters)
+
 
 class VoterSerializer(serializers.ModelSerializer):
+    # The sheet row of the voter, including the fields kept on its station
+    data = serializers.SerializerMethodField()
+
+    records = None
+
     class Meta:
         model = Voter
-        fields = ['id', 'data']
\ No newline at end of file
+        fields = ['id', 'data']
+        list_serializer_class = VoterListSerializer
+
+    def get_data(self, voter):
+        if self.records is not None and voter.pk in self.records:
+            return self.records[voter.pk]
+        return Voter.excel_records([voter])[0]
+
+
+class BoothVoterSerializer(VoterSerializer):
+    """
+    Voter of a single polling station, without the station columns that the
+    response carries once for the whole booth.
+    """
+    def get_data(self, voter):
+        return {
+            key: value for key, value in super().get_data(voter).items()
+            if str(key).strip().upper() not in STATION_EXCEL_FIELDS
+        }
+
+
+class PollingStationSerializer(serializers.ModelSerializer):
+    assembly_name = serializers.CharField(source='assembly.name', read_only=True)
+
+    class Meta:
+        model = PollingStation
+        fields = ['id', 'assembly', 'assembly_name', 'psno', 'location', 'ps_address']
\ No newline at end of file
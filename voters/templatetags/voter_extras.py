@@ -1,5 +1,7 @@
 from django import template
 
+from voters.constants import STATION_FIELD_MAPPING
+
 register = template.Library()
 
 
@@ -22,5 +24,10 @@ def get_field_value(obj, field_name):
     if direct_value not in [None, '']:
         return direct_value
 
+    # Fields kept on the polling station
+    if field_name in STATION_FIELD_MAPPING:
+        station = obj.polling_station
+        return getattr(station, STATION_FIELD_MAPPING[field_name]) if station else obj.data.get(field_name, '')
+
     # Fall back to data field
     return obj.data.get(field_name, '')
\ No newline at end of file
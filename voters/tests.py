@@ -1,3 +1,1161 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+import pandas as pd
+from django.core.exceptions import ValidationError
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Count
+from django.http import QueryDict
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from notifications.models import NotificationTemplate, NotificationType
+from openpyxl import Workbook, load_workbook
+
+from import_data import import_excel_data
+
+from .analytics import build_snapshot, crosstab, get_snapshot, snapshot_mask
+from .constants import EXCEL_FIELDS
+from .areas import area_children
+from .deletes import delete_voters_in_batches
+from .facets import rebuild_facets
+from . import jobs
+from . import importers
+from .importers import (
+    IMPORT_DB_ALIAS, cache_dir, flag_missing_voters, insert_rows, iter_excel_chunks, iter_normalized_chunks,
+    load_staged_rows, normalize_frame, parallel_import, partition_rows, stage_rows, upsert_rows
+)
+from .jobs import JobReporter, job_progress, start_import_job
+from .lookups import lookup_voters
+from .models import Assembly, MlcConstituency, PollingStation, Voter, VoterFacet, VoterField, VoterGram, VoterJob, VoterRollup
+from .rollups import get_rollups, rebuild_rollups
+from .search import index_voters, index_voters_after, phonetic_search, rebuild_search_index
+from .selections import build_selection, create_selection, get_selection
+from .updates import bulk_update_attributes, patch_voter
+from .utils import filter_by_hierarchy, hierarchy_filters, phonetic_key
+from .validation import BatchValidator
+
+# Sheet rows in the layout of the voter workbooks, header first
+VOTER_ROWS = [
+    EXCEL_FIELDS,
+    ['Krishna', 'Tiruvuru', 'Gampalagudem', '', 'Kanumuru', 1, 'School', 'ZPHS Kanumuru', 'Main Road', '1-12',
+     1, 'ABC1234567', 'Ravi Kumar', 9876543210, 41, 'M', 'Rama Rao', 'Father', 'Active', 'AAA', 'BC', 'General',
+     'Verified'],
+    ['Krishna', 'Tiruvuru', 'Gampalagudem', '', 'Kanumuru', 1, 'School', 'ZPHS Kanumuru', 'Main Road', '1-13',
+     2, 'ABC1234568', 'Sita Devi', 9876543211, 36, 'F', 'Ravi Kumar', 'Husband', 'Active', 'BBB', 'OC', 'General',
+     'Pending'],
+    ['Krishna', 'Tiruvuru', 'Reddigudem', '', 'Rangapuram', 2, 'Hall', 'MPP Hall', 'Temple Street', '4',
+     1, 'XYZ7654321', 'Anil Babu', None, 67, 'M', 'Venkata Rao', 'Father', '', '', '', '', 'Verified'],
+    ['Krishna', 'Vijayawada East', 'Vijayawada', '', 'Patamata', 7, 'College', 'Govt College', 'MG Road', '22',
+     5, 'PQR1112223', 'Lata Sri', 9000000002, 23, 'F', 'Kiran', 'Mother', 'Active', 'AAA', 'SC', 'General',
+     'Verified'],
+]
+
+
+def write_workbook(directory, rows, name='voters.xlsx'):
+    """
+    Save ``rows`` (header first) as the only sheet of a workbook.
+    """
+    workbook = Workbook()
+    worksheet = workbook.active
+    for row in rows:
+        worksheet.append(row)
+    path = os.path.join(directory, name)
+    workbook.save(path)
+    return path
+
+
+def import_excel_value(value):
+    if pd.isna(value):
+        return ''
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value).strip()
+
+
+def import_voters_value(value):
+    if pd.isna(value):
+        return ''
+    if isinstance(value, (int, float)):
+        return str(int(value))
+    return str(value).strip()
+
+
+def import_data_value(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return str(value)
+
+
+# Cell conversion of the original whole-sheet importers, with the
+# normalize_frame options that replace it
+ORIGINAL_CONVERSIONS = {
+    'import_excel': (import_excel_value, {}),
+    'import_voters': (import_voters_value, {'upper_headers': True, 'integer_numbers': True, 'timestamp_sep': ' '}),
+    'import_data': (import_data_value, {'missing': None, 'timestamp_sep': 'T', 'strip': False}),
+}
+
+
+def read_excel_records(path, convert, upper_headers=False, **normalize_options):
+    """
+    The data dicts the original importers built from pd.read_excel.
+    """
+    df = pd.read_excel(path)
+    records = []
+    for _, row in df.iterrows():
+        records.append({
+            str(column).upper() if upper_headers else str(column): convert(row[column])
+            for column in df.columns
+        })
+    return records
+
+
+def chunked_records(path, chunk_size, **normalize_options):
+    records = []
+    for chunk in iter_excel_chunks(path, chunk_size=chunk_size):
+        columns, rows = normalize_frame(chunk, **normalize_options)
+        records += [dict(zip(columns, row)) for row in rows]
+    return records
+
+
+class WorkbookMixin:
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+
+class WorkbookTestCase(WorkbookMixin, TestCase):
+    pass
+
+
+class SummaryMixin(WorkbookMixin):
+    def setUp(self):
+        super().setUp()
+        # Ids resolved by an earlier test are gone with its transaction
+        for known in (importers._known_areas, importers._known_stations, importers._known_codes):
+            known.clear()
+
+    def import_voters(self, rows=VOTER_ROWS):
+        return import_excel_data(write_workbook(self.directory, rows))
+
+    def summaries(self):
+        facets = {
+            VoterFacet.key_for(row): row['voter_count']
+            for row in VoterFacet.objects.values(*VoterFacet.PATH_FIELDS, 'voter_count')
+        }
+        rollups = dict(
+            ((level, node_id, dimension, value), count)
+            for level, node_id, dimension, value, count in VoterRollup.objects.values_list(
+                *VoterRollup.KEY_FIELDS, 'voter_count'
+            )
+        )
+        grams = sorted(VoterGram.objects.values_list('voter_id', 'field', 'gram', 'assembly_area_id'))
+        return facets, rollups, grams
+
+    def assert_summaries_consistent(self):
+        """
+        The facet, rollup and search tables match a rebuild from the voters.
+        """
+        current = self.summaries()
+        rebuild_facets()
+        rebuild_rollups()
+        rebuild_search_index()
+        self.assertEqual(current, self.summaries())
+
+
+class SummaryTestCase(SummaryMixin, TestCase):
+    pass
+
+
+class StreamingImportParityTests(WorkbookTestCase):
+    rows = [
+        ['Voter Name', 'Mobile No', 'Village', 'Caste', 'Hno', 'Sno', 'Age', 'Score', 'Flag'],
+        ['Ravi', 9876543210, 'NULL', 'N/A', '12', 1, 41, 5.0, True],
+        [' Sita ', None, 'Gollapudi', 'BC', '7', 2, 39.0, 7.5, False],
+        ['Anil', 9123456780, '', '#N/A', '1-2', 3, 28, 6, None],
+        ['Kiran', 9000000001, 'n/a', 'OC', '9', 4, 55, None, True],
+        ['Lata', '9000000002', 'Ibrahimpatnam', 'null', None, 5, 60, 8, False],
+    ]
+
+    def assert_parity(self, importer):
+        path = write_workbook(self.directory, self.rows)
+        convert, normalize_options = ORIGINAL_CONVERSIONS[importer]
+        expected = read_excel_records(path, convert, **normalize_options)
+        for chunk_size in (1, 2, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(chunked_records(path, chunk_size, **normalize_options), expected)
+
+    def test_matches_import_excel_conversion(self):
+        self.assert_parity('import_excel')
+
+    def test_matches_import_voters_conversion(self):
+        self.assert_parity('import_voters')
+
+    def test_missing_value_markers_are_blank(self):
+        path = write_workbook(self.directory, self.rows)
+        records = chunked_records(path, 2)
+        self.assertEqual([record['Village'] for record in records], ['', 'Gollapudi', '', '', 'Ibrahimpatnam'])
+        self.assertEqual(records[0]['Caste'], '')
+
+    def test_column_types_follow_whole_sheet(self):
+        path = write_workbook(self.directory, self.rows)
+        # The blank in the second row makes the whole column float in pandas
+        records = chunked_records(path, 1)
+        self.assertEqual(records[0]['Mobile No'], '9876543210.0')
+        self.assertEqual(records[0]['Sno'], '1')
+        self.assertEqual(records[1]['Age'], '39')
+
+
+class ExcelChunkTests(WorkbookTestCase):
+    def test_chunks_keep_the_header_and_every_row(self):
+        path = write_workbook(self.directory, VOTER_ROWS)
+        chunks = list(iter_excel_chunks(path, chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 1])
+        for chunk in chunks:
+            self.assertEqual(list(chunk.columns), EXCEL_FIELDS)
+        names = [name for chunk in chunks for name in chunk['VOTER NAME']]
+        self.assertEqual(names, [row[12] for row in VOTER_ROWS[1:]])
+
+    def test_reads_the_named_sheet(self):
+        path = write_workbook(self.directory, VOTER_ROWS)
+        workbook = load_workbook(path)
+        worksheet = workbook.create_sheet('Reddigudem')
+        for row in [VOTER_ROWS[0], VOTER_ROWS[3]]:
+            worksheet.append(row)
+        workbook.save(path)
+
+        chunks = list(iter_excel_chunks(path, chunk_size=10, sheet_name='Reddigudem'))
+        self.assertEqual([list(chunk['CARD NO']) for chunk in chunks], [['XYZ7654321']])
+
+
+@skipIf(importers.pa is None, 'pyarrow is not installed')
+class NormalizedChunkCacheTests(WorkbookTestCase):
+    def setUp(self):
+        super().setUp()
+        override = override_settings(VOTER_EXCEL_UPLOAD_PATH=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.path = write_workbook(self.directory, VOTER_ROWS)
+
+    def chunks(self, **options):
+        return [(list(columns), rows) for columns, rows in iter_normalized_chunks(self.path, chunk_size=3, **options)]
+
+    def cached(self):
+        return sorted(os.listdir(cache_dir()))
+
+    def test_second_read_comes_from_the_cache(self):
+        uncached = self.chunks(use_cache=False)
+        self.assertEqual(self.chunks(), uncached)
+        self.assertEqual(len(self.cached()), 1)
+        self.assertTrue(self.cached()[0].endswith('.arrow'))
+
+        with mock.patch('voters.importers.iter_excel_chunks', side_effect=AssertionError('Workbook read')):
+            self.assertEqual(self.chunks(), uncached)
+            self.assertEqual(self.chunks(digest=importers.file_digest(self.path)), uncached)
+
+    def test_key_covers_content_options_and_version(self):
+        self.chunks()
+        self.chunks(normalize_options={'missing': None})
+        self.assertEqual(len(self.cached()), 2)
+        with mock.patch('voters.importers.CACHE_VERSION', importers.CACHE_VERSION + 1):
+            self.chunks()
+        self.assertEqual(len(self.cached()), 3)
+
+        rows = [list(row) for row in VOTER_ROWS]
+        rows[1][12] = 'Ravi Shankar'
+        write_workbook(self.directory, rows)
+        names = [row[12] for _, chunk in self.chunks() for row in chunk]
+        self.assertEqual(names[0], 'Ravi Shankar')
+        self.assertEqual(len(self.cached()), 4)
+
+    def test_unfinished_read_leaves_no_cache(self):
+        chunks = iter_normalized_chunks(self.path, chunk_size=3)
+        next(chunks)
+        chunks.close()
+        self.assertEqual(self.cached(), [])
+
+        with mock.patch('voters.importers.pa.ipc.new_file', side_effect=OSError('Disk full')):
+            self.assertEqual(self.chunks(), self.chunks(use_cache=False))
+        self.assertEqual(self.cached(), [])
+
+
+class NormalizeFrameTests(WorkbookTestCase):
+    rows = [
+        ['Name', 'Born', 'Street', 'Flag', 'Mixed', 'Mobile', 'Level'],
+        ['Ravi', datetime.datetime(1980, 1, 2, 3, 4, 5, 123000), 'Main Road', True, True, 9876543210, 1],
+        [' Sita ', datetime.datetime(1985, 6, 7), datetime.datetime(1961, 2, 1), False, 'x', None, 2.5],
+        ['Anil', None, '12', True, 5, 9123456780, 'NULL'],
+        ['Kiran', datetime.datetime(1990, 1, 1), None, False, 6.5, '9000000001', 4],
+    ]
+
+    def test_whole_sheet_matches_original_loops(self):
+        path = write_workbook(self.directory, self.rows)
+        df = pd.read_excel(path)
+        for importer, (convert, normalize_options) in ORIGINAL_CONVERSIONS.items():
+            with self.subTest(importer=importer):
+                columns, rows = normalize_frame(df, **normalize_options)
+                records = [dict(zip(columns, row)) for row in rows]
+                self.assertEqual(records, read_excel_records(path, convert, **normalize_options))
+
+    def test_chunks_match_whole_sheet(self):
+        path = write_workbook(self.directory, self.rows)
+        df = pd.read_excel(path)
+        for importer, (_, normalize_options) in ORIGINAL_CONVERSIONS.items():
+            columns, rows = normalize_frame(df, **normalize_options)
+            whole = [dict(zip(columns, row)) for row in rows]
+            for chunk_size in (1, 3):
+                with self.subTest(importer=importer, chunk_size=chunk_size):
+                    self.assertEqual(chunked_records(path, chunk_size, **normalize_options), whole)
+
+
+class BatchValidatorTests(TestCase):
+    validator = BatchValidator([('MOBILE NO', 'phone', False), ('AGE', 'number', True)])
+
+    def errors(self, records):
+        return self.validator.validate_records(records)
+
+    def test_phone_numbers(self):
+        mobiles = ['9876543210', '+91 98765 43210', '09876543210', '9876543210.0', '', 'abc', 'N/A', '12345']
+        errors = self.errors([{'MOBILE NO': mobile, 'AGE': '30'} for mobile in mobiles])
+        self.assertEqual(sorted(errors), [5, 6, 7])
+        self.assertEqual(errors[5], {'MOBILE NO': 'MOBILE NO must be a valid 10 digit mobile number'})
+
+    def test_required_and_number(self):
+        errors = self.errors([{'AGE': ''}, {'AGE': 'forty'}, {'AGE': '40'}])
+        self.assertEqual(errors, {0: {'AGE': 'AGE is required'}, 1: {'AGE': 'AGE must be a number'}})
+
+
+class ImportDataTests(SummaryTestCase):
+    def test_keeps_summaries_up_to_date(self):
+        self.assertEqual(self.import_voters(), 4)
+        self.assertEqual(Voter.objects.count(), 4)
+        self.assertEqual(VoterFacet.objects.filter(assembly='Tiruvuru').count(), 2)
+        self.assertTrue(VoterGram.objects.exists())
+        self.assert_summaries_consistent()
+
+    def test_station_fields_are_kept_on_the_station(self):
+        self.import_voters()
+        voter = Voter.objects.get(card_no='ABC1234567')
+        self.assertNotIn('PS ADDRESS', voter.data)
+        self.assertEqual(voter.polling_station.ps_address, 'ZPHS Kanumuru')
+        self.assertEqual(Voter.excel_records([voter])[0]['PS ADDRESS'], 'ZPHS Kanumuru')
+
+    def test_attribute_text_is_kept_as_codes(self):
+        self.import_voters()
+        voters = list(Voter.objects.filter(card_no__in=['ABC1234567', 'XYZ7654321']).order_by('card_no'))
+        for voter in voters:
+            self.assertFalse({'PARTY', 'CASTE', 'GENDER', 'VOTER STATUS'} & set(voter.data))
+        records = Voter.excel_records(voters)
+        self.assertEqual([record['PARTY'] for record in records], ['AAA', ''])
+        self.assertEqual([record['GENDER'] for record in records], ['M', 'M'])
+
+
+class AreaChildrenTests(SummaryTestCase):
+    def test_sees_facet_changes_of_other_processes(self):
+        self.import_voters()
+        names = lambda: {area['name']: area['voter_count'] for area in area_children('assembly')}
+        self.assertEqual(names(), {'Tiruvuru': 3, 'Vijayawada East': 1})
+
+        # Written straight to the table, as an import job in another process does
+        facet = VoterFacet.objects.get(assembly='Vijayawada East')
+        VoterFacet.objects.filter(pk=facet.pk).delete()
+        self.assertEqual(names(), {'Tiruvuru': 3})
+        facet.pk = None
+        facet.voter_count = 5
+        facet.save()
+        self.assertEqual(names(), {'Tiruvuru': 3, 'Vijayawada East': 5})
+
+    def test_area_api_needs_staff(self):
+        self.import_voters()
+        assembly = Assembly.objects.get(name='Tiruvuru')
+        self.client.force_login(User.objects.create_user('user'))
+        response = self.client.get(reverse('voters:areas'), {'level': 'assembly'})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('voters:polling-stations'), {'assembly_id': assembly.pk})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(User.objects.create_user('clerk', is_staff=True))
+        response = self.client.get(reverse('voters:polling-stations'), {'assembly_id': assembly.pk})
+        self.assertEqual(
+            {station['psno']: station['voter_count'] for station in response.json()['data']}, {'1': 2, '2': 1}
+        )
+
+
+class RollupTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_voters()
+        self.tiruvuru = Assembly.objects.get(name='Tiruvuru')
+
+    def counts(self, rollups):
+        return {dimension: {row['label']: row['voter_count'] for row in rows} for dimension, rows in rollups.items()}
+
+    def test_rollups_match_the_voters(self):
+        voters = Voter.objects.filter(assembly_area=self.tiruvuru)
+        rollups = self.counts(get_rollups('assembly', [self.tiruvuru.pk], ['party', 'age_band']))
+        self.assertEqual(rollups['party'], Counter(
+            party or 'Unknown' for party in voters.values_list('party__value', flat=True)
+        ))
+        self.assertEqual(rollups['age_band'], {'36-45': 2, 'Above 60': 1})
+
+        # Without node ids every node of the level is summed
+        rollups = self.counts(get_rollups('polling_station', dimensions=['gender']))
+        self.assertEqual(rollups['gender'], Counter(Voter.objects.values_list('gender__value', flat=True)))
+
+        with self.assertRaises(ValueError):
+            get_rollups('village')
+        with self.assertRaises(ValueError):
+            get_rollups('assembly', dimensions=['mobile_no'])
+
+    def test_rollup_api_needs_staff(self):
+        params = {'level': 'assembly', 'node_id': self.tiruvuru.pk, 'dimension': 'caste'}
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.get(reverse('voters:rollups'), params).status_code, 403)
+
+        self.client.force_login(User.objects.create_user('clerk', is_staff=True))
+        response = self.client.get(reverse('voters:rollups'), params)
+        self.assertEqual(response.json()['data'], get_rollups('assembly', [self.tiruvuru.pk], ['caste']))
+
+
+class CrosstabTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_voters()
+        self.path = os.path.join(self.directory, 'snapshot')
+        self.assertEqual(build_snapshot(self.path, batch_size=3), 4)
+        self.snapshot = get_snapshot(self.path)
+
+    def cells(self, result):
+        return {
+            tuple(cell[dimension]['label'] for dimension in result['dimensions']): cell['voter_count']
+            for cell in result['data']
+        }
+
+    def test_counts_match_the_voters(self):
+        result = crosstab(['party', 'caste'], snapshot=self.snapshot)
+        self.assertEqual(result['total'], Voter.objects.count())
+        expected = {
+            (row['party__value'] or 'Unknown', row['caste__value'] or 'Unknown'): row['voter_count']
+            for row in Voter.objects.values('party__value', 'caste__value').annotate(voter_count=Count('id'))
+        }
+        self.assertEqual(self.cells(result), expected)
+
+    def test_filters_match_the_voters(self):
+        tiruvuru = Assembly.objects.get(name='Tiruvuru')
+        params = QueryDict(mutable=True)
+        params.update({'assembly_id': tiruvuru.pk, 'age_min': 40})
+        voters = Voter.objects.filter(assembly_area=tiruvuru, age__gte=40)
+        self.assertEqual(int(snapshot_mask(self.snapshot, params).sum()), voters.count())
+
+        result = crosstab(['gender', 'age_band'], params, snapshot=self.snapshot)
+        self.assertEqual(self.cells(result), {('M', '36-45'): 1, ('M', 'Above 60'): 1})
+
+        params['party'] = voters.get(card_no='ABC1234567').party_id
+        self.assertEqual(crosstab(['gender'], params, snapshot=self.snapshot)['total'], 1)
+
+        with self.assertRaises(ValueError):
+            crosstab(['mobile_no'], snapshot=self.snapshot)
+        with self.assertRaises(ValueError):
+            crosstab(['party'], QueryDict('age_min=old'), snapshot=self.snapshot)
+
+    def test_crosstab_api_needs_staff(self):
+        params = {'by': ['party', 'age_band'], 'limit': 2}
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.get(reverse('voters:crosstab'), params).status_code, 403)
+
+        self.client.force_login(User.objects.create_user('clerk', is_staff=True))
+        with override_settings(VOTER_ANALYTICS_PATH=self.path):
+            response = self.client.get(reverse('voters:crosstab'), params)
+        data = response.json()
+        self.assertEqual((data['total'], len(data['data'])), (4, 2))
+
+
+class FilterVotersCursorTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_voters()
+        self.client.force_login(User.objects.create_user('clerk', is_staff=True))
+        self.url = reverse('voters:filter-voters')
+
+    def pages(self, **params):
+        ids, cursor = [], None
+        while True:
+            response = self.client.get(self.url, {**params, **({'cursor': cursor} if cursor else {})}).json()
+            ids.append([voter['id'] for voter in response['data']])
+            cursor = response['next']
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_voter_once(self):
+        all_ids = list(Voter.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(self.pages(page_size=3), [all_ids[:3], all_ids[3:]])
+        self.assertEqual(sum(self.pages(page_size=1), []), all_ids)
+
+        tiruvuru = Assembly.objects.get(name='Tiruvuru')
+        self.assertEqual(
+            sum(self.pages(page_size=2, assembly_id=tiruvuru.pk), []),
+            list(Voter.objects.filter(assembly_area=tiruvuru).order_by('id').values_list('id', flat=True))
+        )
+
+    def test_deletes_between_pages_do_not_shift_the_cursor(self):
+        all_ids = list(Voter.objects.order_by('id').values_list('id', flat=True))
+        first = self.client.get(self.url, {'page_size': 2}).json()
+        Voter.objects.filter(pk=all_ids[0]).delete()
+        second = self.client.get(self.url, {'page_size': 2, 'cursor': first['next']}).json()
+        self.assertEqual([voter['id'] for voter in second['data']], all_ids[2:])
+        self.assertIsNone(second['next'])
+
+    def test_stream_continues_after_the_cursor(self):
+        all_ids = list(Voter.objects.order_by('id').values_list('id', flat=True))
+        cursor = self.client.get(self.url, {'page_size': 1}).json()['next']
+        with mock.patch('voters.views.STREAM_BATCH_SIZE', 2):
+            response = self.client.get(self.url, {'stream': 'ndjson', 'cursor': cursor})
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], all_ids[1:])
+        self.assertEqual(json.loads(lines[0])['data']['CARD NO'], 'ABC1234568')
+
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PhoneticSearchTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        rows = [list(row) for row in VOTER_ROWS]
+        rows[1][12] = 'Srinivas Rao'
+        rows[2][12] = 'Laxmi Devi'
+        rows[4][12] = 'Shrinivasa Murthy'
+        self.import_voters(rows)
+
+    def test_transliterations_share_a_key(self):
+        self.assertEqual(phonetic_key('Sreenivas'), phonetic_key('Srinivas'))
+        self.assertEqual(phonetic_key('SHRINIVASA'), phonetic_key('srinivas'))
+        self.assertEqual(phonetic_key('Lakshmi'), phonetic_key('Laxmi'))
+        self.assertNotEqual(phonetic_key('Ravi'), phonetic_key('Rama'))
+
+    def test_sreenivas_finds_srinivas(self):
+        names = lambda matches: [match['voter_name'] for match in matches]
+        self.assertEqual(names(phonetic_search('Sreenivas')), ['Srinivas Rao', 'Shrinivasa Murthy'])
+        self.assertEqual(names(phonetic_search('Sreenivas Murthy')), ['Shrinivasa Murthy'])
+        self.assertEqual(names(phonetic_search('Lakshmi')), ['Laxmi Devi'])
+        self.assertEqual(phonetic_search('Ramesh'), [])
+
+        tiruvuru = Assembly.objects.get(name='Tiruvuru')
+        self.assertEqual(names(phonetic_search('Sreenivas', {'assembly_id': tiruvuru.pk})), ['Srinivas Rao'])
+        with self.assertRaises(ValueError):
+            phonetic_search(' ')
+
+    def test_phonetic_search_api(self):
+        self.client.force_login(User.objects.create_user('clerk', is_staff=True))
+        response = self.client.get(reverse('voters:search'), {'q': 'Sreenivas', 'mode': 'phonetic', 'limit': 1})
+        data = response.json()
+        self.assertEqual((data['mode'], data['count']), ('phonetic', 1))
+        self.assertEqual(data['data'][0]['voter_name'], 'Srinivas Rao')
+
+
+class LookupTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_voters()
+        self.tiruvuru = Assembly.objects.get(name='Tiruvuru')
+
+    def names(self, result):
+        return {key: [voter['voter_name'] for voter in voters] for key, voters in result['data'].items()}
+
+    def test_card_numbers(self):
+        result = lookup_voters('card_no', ['abc-123 4567', 'ABC1234567', 'ABC0000000', ' '])
+        self.assertEqual(self.names(result), {'ABC1234567': ['Ravi Kumar']})
+        self.assertEqual((result['not_found'], result['invalid']), (['ABC0000000'], [' ']))
+
+        # Area ids narrow the match
+        result = lookup_voters('card_no', ['PQR1112223'], {'assembly_id': self.tiruvuru.pk})
+        self.assertEqual((result['data'], result['not_found']), ({}, ['PQR1112223']))
+
+    def test_mobile_numbers(self):
+        result = lookup_voters('mobile_no', ['+91 98765 43211', '9000000009', '12345'])
+        self.assertEqual(self.names(result), {'9876543211': ['Sita Devi']})
+        self.assertEqual((result['not_found'], result['invalid']), (['9000000009'], ['12345']))
+
+    def test_booth_serials(self):
+        identifiers = ['1/2', {'psno': 2, 'sno': 1}, '7/5', '1/']
+        result = lookup_voters('booth_serial', identifiers, {'assembly_id': self.tiruvuru.pk})
+        self.assertEqual(self.names(result), {'1/2': ['Sita Devi'], '2/1': ['Anil Babu']})
+        # Booth 7 belongs to another assembly
+        self.assertEqual((result['not_found'], result['invalid']), (['7/5'], ['1/']))
+
+        with self.assertRaises(ValueError):
+            lookup_voters('booth_serial', ['1/2'])
+        with self.assertRaises(ValueError):
+            lookup_voters('voter_name', ['Ravi Kumar'])
+
+    def test_lookup_api(self):
+        self.client.force_login(User.objects.create_user('clerk', is_staff=True))
+        response = self.client.get(reverse('voters:lookup'), {'card_no': 'xyz7654321'})
+        self.assertEqual([voter['voter_name'] for voter in response.json()['data']], ['Anil Babu'])
+        response = self.client.get(reverse('voters:lookup'), {'card_no': 'XYZ0000000'})
+        self.assertEqual(response.json(), {'success': True, 'data': []})
+
+        body = {'type': 'booth_serial', 'identifiers': ['1/1', '9/9'], 'assembly_id': self.tiruvuru.pk}
+        response = self.client.post(reverse('voters:lookup-batch'), body, content_type='application/json')
+        data = response.json()
+        self.assertEqual((self.names(data), data['not_found']), ({'1/1': ['Ravi Kumar']}, ['9/9']))
+
+
+class HierarchyFilterTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_voters()
+
+    def cards(self, params):
+        return sorted(filter_by_hierarchy(Voter.objects.all(), params).values_list('card_no', flat=True))
+
+    def test_parameters_map_to_typed_columns_and_keys(self):
+        params = {'mlc_constituncy': 'Krishna', 'location': 'School', 'psno': '1', 'assembly_id': '3', 'mandal_id': ''}
+        self.assertEqual(hierarchy_filters(params), {
+            'mlc_constituency': 'Krishna', 'location': 'School', 'psno': '1', 'assembly_area_id': 3
+        })
+        with self.assertRaises(ValueError):
+            hierarchy_filters({'polling_station_id': 'first'})
+
+    def test_names_and_ids_match_the_voters(self):
+        self.assertEqual(self.cards({'mandal': 'Gampalagudem'}), ['ABC1234567', 'ABC1234568'])
+        self.assertEqual(self.cards({'assembly': 'Tiruvuru', 'psno': '2'}), ['XYZ7654321'])
+        self.assertEqual(self.cards({'mlc_constituency': 'Krishna', 'assembly': 'Vijayawada East'}), ['PQR1112223'])
+        self.assertEqual(self.cards({'assembly': 'Tiruvuru', 'mandal': 'Vijayawada'}), [])
+
+        anil = Voter.objects.get(card_no='XYZ7654321')
+        self.assertEqual(self.cards({'mandal_id': anil.mandal_area_id}), ['XYZ7654321'])
+        ravi = Voter.objects.get(card_no='ABC1234567')
+        self.assertEqual(
+            self.cards({'assembly_id': ravi.assembly_area_id, 'polling_station_id': ravi.polling_station_id}),
+            ['ABC1234567', 'ABC1234568']
+        )
+
+    def test_filter_voters_api(self):
+        self.client.force_login(User.objects.create_user('clerk', is_staff=True))
+        response = self.client.get(reverse('voters:filter-voters'), {'assembly': 'Tiruvuru', 'location': 'Hall'})
+        self.assertEqual([voter['data']['CARD NO'] for voter in response.json()['data']], ['XYZ7654321'])
+        response = self.client.get(reverse('voters:filter-voters'), {'mandal_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PatchVoterTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_voters()
+        self.voter = Voter.objects.get(card_no='ABC1234567')
+
+    def test_writes_only_changed_fields(self):
+        changed = patch_voter(self.voter, {'VOTER NAME': 'Ravi Kumar', 'HNO': '1-14', 'AGE': 42})
+        self.assertEqual(changed, {'HNO': '1-14', 'AGE': 42})
+        voter = Voter.objects.get(pk=self.voter.pk)
+        self.assertEqual((voter.hno, voter.age), ('1-14', 42))
+        self.assertEqual((voter.data['HNO'], voter.data['AGE']), ('1-14', 42))
+        self.assertEqual(voter.data['VOTER NAME'], 'Ravi Kumar')
+        self.assertEqual(patch_voter(voter, {'HNO': '1-14'}), {})
+        self.assert_summaries_consistent()
+
+    def test_data_holds_the_cleaned_values(self):
+        changed = patch_voter(self.voter, {'MOBILE NO': '09876500000', 'AGE': '43'})
+        self.assertEqual(list(changed), ['MOBILE NO', 'AGE'])
+        voter = Voter.objects.get(pk=self.voter.pk)
+        self.assertEqual((voter.mobile_no, voter.age), ('9876500000', 43))
+        self.assertEqual((voter.data['MOBILE NO'], voter.data['AGE']), ('9876500000', 43))
+        self.assertEqual((self.voter.data['MOBILE NO'], self.voter.data['AGE']), ('9876500000', 43))
+
+    def test_moves_summaries_with_the_voter(self):
+        patch_voter(self.voter, {'VILLAGE': 'Rangapuram'})
+        self.assertEqual(Voter.objects.get(pk=self.voter.pk).village, 'Rangapuram')
+        self.assert_summaries_consistent()
+
+    def test_station_fields_update_the_station(self):
+        patch_voter(self.voter, {'PS ADDRESS': 'ZPHS Kanumuru New Block'})
+        voter = Voter.objects.get(pk=self.voter.pk)
+        self.assertNotIn('PS ADDRESS', voter.data)
+        self.assertEqual(
+            PollingStation.objects.get(pk=voter.polling_station_id).ps_address, 'ZPHS Kanumuru New Block'
+        )
+
+    def test_invalid_values_are_not_written(self):
+        with self.assertRaises(ValidationError) as raised:
+            patch_voter(self.voter, {'MOBILE NO': 'abc', 'NOT A FIELD': 1})
+        self.assertEqual(list(raised.exception.message_dict), ['NOT A FIELD'])
+        with self.assertRaises(ValidationError) as raised:
+            patch_voter(self.voter, {'MOBILE NO': 'abc'})
+        self.assertIn('MOBILE NO', raised.exception.message_dict)
+        self.assertEqual(Voter.objects.get(pk=self.voter.pk).mobile_no, self.voter.mobile_no)
+
+    def test_attribute_text_goes_to_the_code(self):
+        patch_voter(self.voter, {'PARTY': 'BBB', 'CASTE': 'OC'})
+        voter = Voter.objects.select_related('party', 'caste').get(pk=self.voter.pk)
+        self.assertEqual((voter.party.value, voter.caste.value), ('BBB', 'OC'))
+        self.assertFalse({'PARTY', 'CASTE'} & set(voter.data))
+        record = Voter.excel_records([voter])[0]
+        self.assertEqual((record['PARTY'], record['CASTE']), ('BBB', 'OC'))
+        self.assert_summaries_consistent()
+
+    def test_partial_save_writes_the_areas_it_assigns(self):
+        stored = Voter.objects.filter(pk=self.voter.pk).values(*[f'{field}_id' for field in Voter.AREA_FIELDS])[0]
+        Voter.objects.filter(pk=self.voter.pk).update(**dict.fromkeys(stored))
+        patch_voter(Voter.objects.get(pk=self.voter.pk), {'AGE': 42})
+        voter = Voter.objects.filter(pk=self.voter.pk).values(*stored, 'polling_station_id')[0]
+        self.assertEqual({field: voter[field] for field in stored}, stored)
+        self.assertEqual(voter['polling_station_id'], self.voter.polling_station_id)
+
+    def test_patch_api_needs_change_permission(self):
+        url = reverse('voters:voter-update', args=[self.voter.pk])
+        user = User.objects.create_user('clerk', is_staff=True)
+        self.client.force_login(user)
+        response = self.client.patch(url, {'AGE': 42}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        user.user_permissions.add(Permission.objects.get(codename='change_voter'))
+        self.client.force_login(User.objects.get(pk=user.pk))
+        response = self.client.patch(url, {'AGE': 42}, content_type='application/json')
+        self.assertEqual(response.json()['data']['changed'], ['AGE'])
+        self.assertEqual(Voter.objects.get(pk=self.voter.pk).age, 42)
+
+
+class BulkUpdateAttributesTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_voters()
+        self.assembly = Assembly.objects.get(name='Tiruvuru')
+
+    def parties(self):
+        records = Voter.excel_records(Voter.objects.order_by('card_no'))
+        return [record['PARTY'] for record in records]
+
+    def test_updates_the_code_and_data_of_the_area(self):
+        selection = build_selection({'assembly_id': self.assembly.pk})
+        self.assertEqual(bulk_update_attributes(selection, {'party': 'CCC'}), 3)
+        self.assertEqual(self.parties(), ['CCC', 'CCC', 'AAA', 'CCC'])
+        self.assertEqual(Voter.objects.filter(party__value='CCC', assembly_area=self.assembly).count(), 3)
+        # The text lives on the code, so data holds no stale PARTY
+        self.assertFalse(Voter.objects.filter(data__has_key='PARTY').exists())
+        # Voters already holding the value are not written again
+        self.assertEqual(bulk_update_attributes(selection, {'party': 'CCC'}), 0)
+        self.assert_summaries_consistent()
+
+    def test_clearing_blanks_the_data_key(self):
+        VoterField.objects.filter(name='PARTY').update(is_required=False)
+        selection = build_selection(None, list(Voter.objects.filter(card_no='ABC1234567').values_list('pk', flat=True)))
+        self.assertEqual(bulk_update_attributes(selection, {'party': ''}), 1)
+        voter = Voter.objects.get(card_no='ABC1234567')
+        self.assertIsNone(voter.party_id)
+        self.assertEqual(voter.data['PARTY'], '')
+        self.assertEqual(voter.data['VOTER NAME'], 'Ravi Kumar')
+        self.assertEqual(self.parties(), ['', 'BBB', 'AAA', ''])
+        self.assert_summaries_consistent()
+
+    def test_rejects_unknown_attributes(self):
+        selection = build_selection({'assembly_id': self.assembly.pk})
+        for changes in ({'voter_name': 'X'}, {}, {'party': 'X' * 300}):
+            with self.subTest(changes=changes), self.assertRaises(ValueError):
+                bulk_update_attributes(selection, changes)
+        self.assertEqual(self.parties(), ['AAA', 'BBB', 'AAA', ''])
+
+    def test_endpoint_needs_change_permission(self):
+        url = reverse('admin:bulk-update-voters')
+        body = {'filters': {'assembly_id': self.assembly.pk}, 'changes': {'party': 'CCC'}}
+        user = User.objects.create_user('clerk', is_staff=True)
+        self.client.force_login(user)
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        user.user_permissions.add(Permission.objects.get(codename='change_voter'))
+        self.client.force_login(User.objects.get(pk=user.pk))
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.json(), {'success': True, 'updated': 3})
+
+
+class BackfillVoterColumnsTests(SummaryTestCase):
+    def test_moves_summaries_with_the_filled_columns(self):
+        self.import_voters()
+        Voter.objects.filter(assembly='Tiruvuru').update(mandal='', voter_name='', age=None)
+        rebuild_facets()
+        rebuild_rollups()
+        rebuild_search_index()
+
+        call_command(
+            'backfill_voter_columns', sleep=0, restart=True,
+            checkpoint_file=os.path.join(self.directory, 'checkpoint.json'), stdout=StringIO()
+        )
+        voter = Voter.objects.get(card_no='XYZ7654321')
+        self.assertEqual((voter.mandal, voter.voter_name, voter.age), ('Reddigudem', 'Anil Babu', 67))
+        self.assertFalse(VoterFacet.objects.filter(mandal='').exists())
+        self.assert_summaries_consistent()
+
+
+class DeleteVotersTests(SummaryTestCase):
+    def test_batched_delete_keeps_summaries_consistent(self):
+        self.import_voters()
+        deleted = []
+        queryset = Voter.objects.filter(assembly='Tiruvuru')
+        self.assertEqual(delete_voters_in_batches(queryset, batch_size=2, progress=deleted.append), 3)
+        self.assertEqual(deleted, [2, 3])
+        self.assertEqual(list(Voter.objects.values_list('card_no', flat=True)), ['PQR1112223'])
+        self.assert_summaries_consistent()
+
+    def test_endpoint_needs_delete_permission(self):
+        self.import_voters()
+        url = reverse('admin:bulk-delete-voters')
+        voter_ids = list(Voter.objects.filter(assembly='Tiruvuru').values_list('pk', flat=True))
+        user = User.objects.create_user('clerk', is_staff=True)
+        self.client.force_login(user)
+        response = self.client.post(url, {'voter_ids': voter_ids}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Voter.objects.count(), 4)
+
+        user.user_permissions.add(Permission.objects.get(codename='delete_voter'))
+        self.client.force_login(User.objects.get(pk=user.pk))
+        response = self.client.post(url, {'voter_ids': voter_ids}, content_type='application/json')
+        self.assertEqual(response.json(), {'success': True, 'deleted': 3})
+
+    def test_empty_assembly_starts_no_job(self):
+        admin = User.objects.create_superuser('admin')
+        self.client.force_login(admin)
+        assembly = Assembly.objects.create(
+            name='Empty', mlc_constituency=MlcConstituency.objects.create(name='Krishna')
+        )
+        with mock.patch('voters.jobs.start_job') as start_job:
+            response = self.client.post(
+                reverse('admin:bulk-delete-voters'), {'assembly_id': assembly.pk}, content_type='application/json'
+            )
+        self.assertEqual(response.json()['deleted'], 0)
+        start_job.assert_not_called()
+        self.assertFalse(VoterJob.objects.exists())
+
+
+class UpsertRowsTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.header, *self.rows = [list(row) for row in VOTER_ROWS]
+
+    def counts(self, rows, **options):
+        counts = upsert_rows(self.header, rows, **options)
+        return counts['inserted'], counts['updated'], counts['unchanged']
+
+    def test_inserts_updates_and_skips_unchanged_rows(self):
+        self.assertEqual(self.counts(self.rows), (4, 0, 0))
+        self.assertEqual(self.counts(self.rows), (0, 0, 4))
+
+        self.rows[0][12] = 'Ravi Shankar'
+        updated_at = Voter.objects.get(card_no='XYZ7654321').updated_at
+        self.assertEqual(self.counts(self.rows), (0, 1, 3))
+        self.assertEqual(Voter.objects.count(), 4)
+        self.assertEqual(Voter.objects.get(card_no='ABC1234567').voter_name, 'Ravi Shankar')
+        # Unchanged rows are not written
+        self.assertEqual(Voter.objects.get(card_no='XYZ7654321').updated_at, updated_at)
+        self.assert_summaries_consistent()
+
+    def test_rows_without_a_card_match_on_the_booth_serial(self):
+        self.rows[0][11] = ''
+        self.assertEqual(self.counts(self.rows), (4, 0, 0))
+        self.rows[0][12] = 'Ravi Shankar'
+        self.assertEqual(self.counts(self.rows), (0, 1, 3))
+        self.assertEqual(Voter.objects.filter(voter_name='Ravi Shankar', card_no__isnull=True).count(), 1)
+
+    def test_match_assembly(self):
+        self.counts(self.rows)
+        moved = list(self.rows[0])
+        moved[1], moved[12] = 'Vijayawada East', 'Ravi Shankar'
+
+        self.assertEqual(self.counts([moved], match_assembly=True), (1, 0, 0))
+        self.assertEqual(Voter.objects.filter(card_no='ABC1234567').count(), 2)
+        # Across assemblies the card number alone matches
+        self.assertEqual(self.counts([self.rows[1]]), (0, 0, 1))
+        self.assert_summaries_consistent()
+
+    def test_flags_voters_missing_from_a_reimport(self):
+        self.counts(self.rows)
+        seen = set()
+        self.counts(self.rows[:2], seen=seen)
+        self.assertEqual(flag_missing_voters(seen), 1)
+        missing = Voter.objects.filter(missing_since__isnull=False)
+        # Only the assemblies of the re-import are checked
+        self.assertEqual(list(missing.values_list('card_no', flat=True)), ['XYZ7654321'])
+
+        # Seen again, the voter is no longer missing
+        self.counts(self.rows[2:3])
+        self.assertFalse(missing.exists())
+
+    def test_station_changes_made_elsewhere_are_kept(self):
+        self.counts(self.rows)
+        station = PollingStation.objects.get(psno='1', assembly__name='Tiruvuru')
+        # Changed by another process, behind the cached station
+        PollingStation.objects.filter(pk=station.pk).update(ps_address='ZPHS Kanumuru New Block')
+
+        self.rows[0][6], self.rows[0][7] = 'High School', ''
+        self.counts(self.rows[:1])
+        station.refresh_from_db()
+        self.assertEqual((station.location, station.ps_address), ('High School', 'ZPHS Kanumuru New Block'))
+
+        # An address from the sheet is still written
+        self.rows[1][6], self.rows[1][7] = 'High School', 'ZPHS Kanumuru Annex'
+        self.counts(self.rows[1:2])
+        station.refresh_from_db()
+        self.assertEqual((station.location, station.ps_address), ('High School', 'ZPHS Kanumuru Annex'))
+
+    def test_partition_keeps_each_key_in_one_part(self):
+        rows = self.rows + [list(self.rows[0]), list(self.rows[3])]
+        rows[4][11] = f' {rows[4][11]} '
+        rows[5][1] = 'Tiruvuru'
+        parts = partition_rows(self.header, rows, 3)
+        self.assertEqual(sorted(position for part in parts for position in part), list(range(6)))
+        part_of = {position: index for index, part in enumerate(parts) for position in part}
+        self.assertEqual(part_of[0], part_of[4])
+        # Card numbers match across assemblies unless asked otherwise
+        self.assertEqual(part_of[3], part_of[5])
+        parts = partition_rows(self.header, rows, 3, match_assembly=True)
+        part_of = {position: index for index, part in enumerate(parts) for position in part}
+        self.assertEqual(part_of[0], part_of[4])
+
+
+class DeferredIndexTests(SummaryTestCase):
+    def test_index_after_writing_matches_inline_index(self):
+        header, *rows = VOTER_ROWS
+        insert_rows(header, rows[:2], index=False)
+        self.assertFalse(VoterGram.objects.exists())
+        index_voters_after(0)
+        self.assert_summaries_consistent()
+
+        # An updated voter keeps its stale grams until it is re-indexed
+        changed = [list(row) for row in rows]
+        changed[0][12] = 'Ravi Shankar'
+        last_pk = Voter.objects.order_by('-pk').values_list('pk', flat=True)[0]
+        unindexed = set()
+        counts = upsert_rows(header, changed, unindexed=unindexed)
+        self.assertEqual((counts['inserted'], counts['updated']), (2, 1))
+        self.assertEqual(unindexed, {Voter.objects.get(card_no='ABC1234567').pk})
+        index_voters_after(last_pk)
+        index_voters(unindexed)
+        self.assert_summaries_consistent()
+
+
+class SelectionTests(SummaryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_voters()
+        self.owner = User.objects.create_user('owner', is_staff=True)
+        self.other = User.objects.create_user('other', is_staff=True)
+        self.selection = create_selection(filters={}, user=self.owner)
+
+    def test_selection_is_scoped_to_its_creator(self):
+        self.assertEqual(get_selection(self.selection.token, self.owner), self.selection)
+        with self.assertRaises(LookupError):
+            get_selection(self.selection.token, self.other)
+        admin = User.objects.create_superuser('admin')
+        self.assertEqual(get_selection(self.selection.token, admin), self.selection)
+
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('voters:selection', args=[self.selection.token]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_selection_api_needs_staff(self):
+        user = User.objects.create_user('user')
+        self.client.force_login(user)
+        response = self.client.post(reverse('voters:selections'), {'filters': {}}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('voters:selection', args=[self.selection.token]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_large_selection_is_sent_by_a_job(self):
+        notification_type = NotificationType.objects.create(name='Campaign')
+        template = NotificationTemplate.objects.create(
+            name='Reminder', notification_type=notification_type, subject='Vote', content='Vote', template_id='1'
+        )
+        self.client.force_login(self.owner)
+        body = {'selection': self.selection.token, 'template_id': template.id, 'channel': 'SMS'}
+        with mock.patch('voters.views.BACKGROUND_SEND_THRESHOLD', 1), \
+                mock.patch('voters.jobs.start_job') as start_job:
+            response = self.client.post(reverse('voters:send-notification'), body, content_type='application/json')
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['count'], 4)
+        job = VoterJob.objects.get(pk=data['job_id'])
+        self.assertEqual((job.kind, job.created_by), ('notify', self.owner))
+        self.assertEqual(start_job.call_args.args[1], 'notify_voters')
+
+
+class JobTests(WorkbookTestCase):
+    def test_start_records_the_process(self):
+        user = User.objects.create_user('clerk', is_staff=True)
+        with override_settings(TEMP_DIR=self.directory), \
+                mock.patch.object(jobs, '_processes', []), \
+                mock.patch('voters.jobs.subprocess.Popen') as popen:
+            popen.return_value.pid = 4321
+            job = start_import_job('/uploads/voters.xlsx', {'upsert': True, 'chunk_size': 2000, 'dry_run': False}, user)
+        self.assertEqual(popen.call_args.args[0][2:], [
+            'import_voters', '/uploads/voters.xlsx', '--upsert', '--chunk-size', '2000', '--job', str(job.pk)
+        ])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.pid, job.host, job.created_by), ('pending', 4321, socket.gethostname(), user))
+
+    def test_reporter_updates_the_job(self):
+        job = VoterJob.objects.create(kind='delete')
+        reporter = JobReporter(job.pk)
+        reporter.start()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.pid), ('running', os.getpid()))
+
+        reporter.progress(deleted=5)
+        reporter.progress(deleted=6)
+        self.assertEqual(job_progress(job.pk)['deleted'], 5)
+        reporter.progress(force=True, deleted=7)
+        self.assertEqual(job_progress(job.pk)['deleted'], 7)
+
+        reporter.finish(errors=['Error deleting voters: boom'], deleted=8)
+        progress = job_progress(job.pk)
+        self.assertEqual(
+            (progress['status'], progress['deleted'], progress['errors']),
+            ('failed', 8, ['Error deleting voters: boom'])
+        )
+        self.assertIsNotNone(progress['finished_at'])
+        self.assertNotIn('pid', progress)
+
+    def test_dead_process_fails_the_job(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        host = socket.gethostname()
+        dead = VoterJob.objects.create(status='running', pid=process.pid, host=host)
+        alive = VoterJob.objects.create(status='running', pid=os.getpid(), host=host)
+        elsewhere = VoterJob.objects.create(status='running', pid=process.pid, host=f'{host}-other')
+
+        progress = job_progress(dead.pk)
+        self.assertEqual(progress['status'], 'failed')
+        self.assertEqual(progress['errors'], [f'Job process {process.pid} exited without reporting a result'])
+        self.assertIsNotNone(progress['finished_at'])
+        self.assertEqual(job_progress(alive.pk)['status'], 'running')
+        self.assertEqual(job_progress(elsewhere.pk)['status'], 'running')
+        self.assertIsNone(job_progress(0))
+
+
+def load_data_infile(path, columns=None, model=Voter):
+    """
+    Stand-in for load_staged_rows() on the test database: reads the staging
+    file with MySQL's default LOAD DATA escaping and inserts its rows.
+    """
+    columns = columns or [field.column for field in importers._infile_fields()]
+    escapes = {'t': '\t', 'n': '\n', 'r': '\r', '0': '\0'}
+    unescape = lambda value: re.sub(r'\\(.)', lambda match: escapes.get(match.group(1), match.group(1)), value)
+    with open(path, encoding='utf-8', newline='\n') as staging_file:
+        rows = [
+            [None if value == '\\N' else unescape(value) for value in line.rstrip('\n').split('\t')]
+            for line in staging_file
+        ]
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote_name(model._meta.db_table)} ({", ".join(map(quote_name, columns))}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})',
+            rows
+        )
+
+
+class FastLoadTests(SummaryMixin, TransactionTestCase):
+    # The writer threads use their own connections, which only see
+    # committed rows
+
+    def voters(self):
+        fields = [field.name for field in importers._infile_fields() if field.name not in ('created_at', 'updated_at')]
+        return sorted(Voter.objects.values_list(*fields), key=repr)
+
+    def test_staged_rows_match_inserted_rows(self):
+        header, *rows = [list(row) for row in VOTER_ROWS]
+        rows[0][12] = 'Ravi\tKumar\\'
+        rows[1][7] = 'ZPHS\nKanumuru'
+        insert_rows(header, rows)
+        inserted = self.voters()
+        Voter.objects.all().delete()
+
+        path = os.path.join(self.directory, 'voters.tsv')
+        with open(path, 'w', encoding='utf-8') as staging_file:
+            self.assertEqual(stage_rows(staging_file, header, rows[:3]), 3)
+            self.assertEqual(stage_rows(staging_file, header, rows[3:]), 1)
+        with open(path, encoding='utf-8', newline='\n') as staging_file:
+            lines = staging_file.read().split('\n')
+        self.assertEqual((len(lines), lines[-1]), (5, ''))
+        self.assertEqual({len(line.split('\t')) for line in lines[:-1]}, {len(importers._infile_fields())})
+        self.assertIn('Ravi\\tKumar\\\\', lines[0])
+
+        load_data_infile(path)
+        self.assertEqual(self.voters(), inserted)
+        self.assertEqual(Voter.objects.get(card_no='ABC1234567').voter_name, 'Ravi\tKumar\\')
+
+    def test_parallel_import_fast_load(self):
+        path = write_workbook(self.directory, VOTER_ROWS)
+        with mock.patch('voters.importers.load_staged_rows', side_effect=load_data_infile) as load:
+            summary = parallel_import([path], workers=1, writers=1, chunk_size=2, use_cache=False, fast_load=True)
+        self.assertEqual((summary[path]['inserted'], summary[path]['errors']), (4, []))
+        # One load for the voters, one for their search grams
+        self.assertEqual([call.kwargs.get('model', Voter) for call in load.call_args_list], [Voter, VoterGram])
+        self.assertEqual(Voter.objects.count(), 4)
+        self.assert_summaries_consistent()
+
+        # A failed load counts the staged rows as failed
+        Voter.objects.all().delete()
+        error = DatabaseError('Loading local data is disabled')
+        with mock.patch('voters.importers.load_staged_rows', side_effect=error):
+            summary = parallel_import([path], workers=1, writers=1, chunk_size=2, use_cache=False, fast_load=True)
+        self.assertEqual((summary[path]['inserted'], summary[path]['failed']), (0, 4))
+        self.assertEqual(summary[path]['errors'], ['Loading local data is disabled'])
+
+    def test_load_staged_rows_switches_checks_off_for_voters_only(self):
+        import_connection = mock.MagicMock()
+        import_connection.ops.quote_name = lambda name: f'`{name}`'
+        cursor = import_connection.cursor.return_value.__enter__.return_value
+        with mock.patch('voters.importers.connections', {IMPORT_DB_ALIAS: import_connection}), \
+                mock.patch('voters.importers.transaction.atomic') as atomic:
+            load_staged_rows('/tmp/voters.tsv', columns=['card_no', 'voter_name'])
+            statements = [call.args for call in cursor.execute.call_args_list]
+            self.assertEqual(atomic.call_args.kwargs, {'using': IMPORT_DB_ALIAS})
+            self.assertEqual(statements[0], ('SET SESSION unique_checks = 0, foreign_key_checks = 0',))
+            self.assertEqual(statements[1][1], ['/tmp/voters.tsv'])
+            self.assertTrue(statements[1][0].startswith('LOAD DATA LOCAL INFILE %s INTO TABLE `voters_voter`'))
+            self.assertTrue(statements[1][0].endswith('(`card_no`, `voter_name`)'))
+            self.assertEqual(statements[2], ('SET SESSION unique_checks = 1, foreign_key_checks = 1',))
+
+            cursor.execute.reset_mock()
+            load_staged_rows('/tmp/grams.tsv', columns=VoterGram.ROW_COLUMNS, model=VoterGram)
+            self.assertEqual(len(cursor.execute.call_args_list), 1)
+            self.assertIn('INTO TABLE `voters_votergram`', cursor.execute.call_args.args[0])
+
+
+class ParallelImportTests(SummaryMixin, TransactionTestCase):
+    # The writer threads use their own connections, which only see
+    # committed rows
+
+    def test_imports_every_sheet(self):
+        path = write_workbook(self.directory, VOTER_ROWS)
+        workbook = load_workbook(path)
+        worksheet = workbook.create_sheet('More')
+        extra = list(VOTER_ROWS[1])
+        extra[11], extra[12] = 'ABC7777777', 'Mohan Rao'
+        worksheet.append(VOTER_ROWS[0])
+        worksheet.append(extra)
+        workbook.save(path)
+
+        summary = parallel_import([path], workers=1, writers=1, chunk_size=2, use_cache=False)
+        counts = {key: summary[path][key] for key in ('sheets', 'parsed', 'inserted', 'failed')}
+        self.assertEqual(counts, {'sheets': 2, 'parsed': 5, 'inserted': 5, 'failed': 0})
+        self.assertEqual(summary[path]['errors'], [])
+        self.assertEqual(Voter.objects.count(), 5)
+        self.assert_summaries_consistent()
+
+        # Run again as an upsert, the rows are all unchanged
+        summary = parallel_import([path], workers=1, writers=1, chunk_size=2, use_cache=False, upsert=True)
+        self.assertEqual((summary[path]['inserted'], summary[path]['unchanged']), (0, 5))
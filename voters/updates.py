@@ -0,0 +1,221 @@
+import logging
+import time
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Func, JSONField, Q, TextField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .constants import ENCODED_FIELDS, EXCEL_FIELD_MAPPING, STATION_FIELD_MAPPING
+from .models import AttributeValue, PollingStation, Voter, VoterRollup
+from .rollups import count_rollups
+from .selections import SELECTION_CHUNK_SIZE, selection_chunks
+from .validation import compile_validator
+
+logger = logging.getLogger(__name__)
+
+# Attributes that can be changed for many voters at once
+BULK_UPDATE_FIELDS = ('party', 'verify_status', 'category', 'voter_status')
+
+# Excel field name of each mapped model field, the voter's and its station's
+EXCEL_NAMES = {
+    model_field: excel_name
+    for excel_name, model_field in {**EXCEL_FIELD_MAPPING, **STATION_FIELD_MAPPING}.items()
+}
+
+
+class JSONSet(Func):
+    """
+    JSON_SET() of ``values`` (key -> text) on a JSON column, leaving its
+    other keys alone. A NULL document is treated as {}.
+    """
+    function = 'JSON_SET'
+    output_field = JSONField()
+
+    def __init__(self, expression, values):
+        arguments = [Coalesce(expression, Value('{}'), output_field=TextField())]
+        for key, value in values.items():
+            arguments += [Value(f'$."{key}"'), Value(value)]
+        super().__init__(*arguments)
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def clean_changes(changes):
+    """
+    Validate ``changes``, attribute name -> text (empty text clears the
+    attribute), against the VoterField definitions of their Excel fields.
+    Returns the changes with their text stripped. Raises ValueError.
+    """
+    if not isinstance(changes, dict) or not changes:
+        raise ValueError('No attribute changes given')
+    unknown = [attribute for attribute in changes if attribute not in BULK_UPDATE_FIELDS]
+    if unknown:
+        raise ValueError(f'Cannot bulk update: {", ".join(unknown)}')
+
+    cleaned = {}
+    for attribute, value in changes.items():
+        text = _text(value)
+        if len(text) > ENCODED_FIELDS[attribute]:
+            raise ValueError(f'{EXCEL_NAMES[attribute]} can be at most {ENCODED_FIELDS[attribute]} characters')
+        cleaned[attribute] = text
+
+    record = {EXCEL_NAMES[attribute]: text for attribute, text in cleaned.items()}
+    errors = compile_validator().validate_records([record]).get(0, {})
+    errors = [message for field, message in errors.items() if field in record]
+    if errors:
+        raise ValueError('; '.join(errors))
+    return cleaned
+
+
+def _moved(counts, codes):
+    """
+    Rollup count changes for moving the voters of ``counts`` to ``codes``.
+    """
+    deltas = Counter()
+    for (level, node_id, dimension, value), count in counts.items():
+        deltas[(level, node_id, dimension, value)] -= count
+        deltas[(level, node_id, dimension, codes[dimension] or 0)] += count
+    return deltas
+
+
+def bulk_update_attributes(selection, changes, chunk_size=SELECTION_CHUNK_SIZE, sleep=0, progress=None):
+    """
+    Set the attributes of ``changes`` (see clean_changes) on the voters of
+    ``selection``, a saved or unsaved VoterSelection.
+
+    Each id chunk is one short transaction: the voters whose codes differ
+    are locked, their rollup counts moved to the new values, and a single
+    UPDATE writes the attribute codes. The text lives on the
+    AttributeValue, so ``data`` is only touched to blank the keys of
+    cleared attributes. Voters already holding the values are not written.
+
+    ``progress`` is called with (voters checked, voters updated).
+    Returns the number of voters updated. Raises ValueError for invalid
+    changes.
+    """
+    changes = clean_changes(changes)
+    codes = {}
+    for attribute, text in changes.items():
+        codes[attribute] = AttributeValue.codes_for(attribute, [text]).get(text) if text else None
+
+    differs = Q()
+    for attribute, code in codes.items():
+        if code is None:
+            differs |= Q(**{f'{attribute}_id__isnull': False})
+        else:
+            differs |= ~Q(**{f'{attribute}_id': code})
+    dimensions = [attribute for attribute in codes if attribute in VoterRollup.DIMENSIONS]
+    assignments = {f'{attribute}_id': code for attribute, code in codes.items()}
+    cleared = {EXCEL_NAMES[attribute]: '' for attribute, code in codes.items() if code is None}
+    if cleared:
+        assignments['data'] = JSONSet(F('data'), cleared)
+
+    checked, updated = 0, 0
+    for ids in selection_chunks(selection, chunk_size):
+        with transaction.atomic():
+            changed = list(
+                Voter.objects.select_for_update().filter(differs, pk__in=ids)
+                .values_list('pk', flat=True)
+            )
+            if changed:
+                voters = Voter.objects.filter(pk__in=changed)
+                if dimensions:
+                    VoterRollup.adjust(_moved(count_rollups(voters, dimensions), codes))
+                updated += voters.update(updated_at=timezone.now(), **assignments)
+        checked += len(ids)
+
+        if progress:
+            progress(checked, updated)
+        if sleep:
+            time.sleep(sleep)
+
+    logger.info(f'Bulk updated {", ".join(changes)} of {updated} of {checked} voters')
+    return updated
+
+
+def patch_voter(voter, values):
+    """
+    Apply ``values`` (Excel field name -> value) to ``voter``, writing only
+    the fields whose value differs from the stored one. Only those fields
+    are validated; the row is saved with update_fields and the changed
+    ``data`` keys are set with JSON_SET instead of rewriting the document.
+    The polling station's fields are written to the voter's station and
+    attribute text only to its AttributeValue code.
+
+    Returns the dict of changed fields, empty when nothing changed.
+    Raises ValidationError with a message per Excel field name.
+    """
+    unknown = [name for name in values if name not in EXCEL_FIELD_MAPPING and name not in STATION_FIELD_MAPPING]
+    if unknown:
+        raise ValidationError({name: f'Unknown field {name}' for name in unknown})
+
+    stored = Voter.excel_records([voter])[0]
+    changed = {name: value for name, value in values.items() if _text(value) != _text(stored.get(name))}
+    if not changed:
+        return {}
+
+    # Validate the changed values, merged over the stored ones
+    errors = compile_validator().validate_records([{**stored, **changed}]).get(0, {})
+    errors = {name: message for name, message in errors.items() if name in changed}
+    if errors:
+        raise ValidationError(errors)
+
+    labels, update_fields, voter_changes, station_changes, typed = {}, [], {}, {}, {}
+    for name, value in changed.items():
+        if name in STATION_FIELD_MAPPING:
+            station_changes[STATION_FIELD_MAPPING[name]] = _text(value)
+            continue
+        model_field = EXCEL_FIELD_MAPPING[name]
+        if model_field in ENCODED_FIELDS:
+            labels[model_field] = _text(value)
+            # Blank any text left in data from before the attribute had a code
+            if not labels[model_field]:
+                voter_changes[name] = ''
+        else:
+            setattr(voter, model_field, value)
+            typed[name] = model_field
+        update_fields.append(model_field)
+    Voter.encode_attributes([voter], [labels])
+
+    data = voter.data
+    try:
+        with transaction.atomic():
+            if typed:
+                # data gets the values as cleaned for the typed columns,
+                # e.g. the normalized MOBILE NO, not the raw request values
+                voter.full_clean(
+                    exclude=[field.name for field in voter._meta.concrete_fields if field.name not in typed.values()],
+                    validate_unique=False, validate_constraints=False
+                )
+                voter_changes.update({name: getattr(voter, field) for name, field in typed.items()})
+            if update_fields:
+                if voter_changes:
+                    voter.data = JSONSet(F('data'), voter_changes)
+                    update_fields.append('data')
+                voter.save(update_fields=update_fields)
+            if station_changes:
+                # After the save, which may have moved the voter to another booth
+                if voter.polling_station_id is None:
+                    raise ValidationError({
+                        EXCEL_NAMES[field]: f'{EXCEL_NAMES[field]} needs the voter to have a polling station'
+                        for field in station_changes
+                    })
+                PollingStation.objects.filter(pk=voter.polling_station_id).update(
+                    updated_at=timezone.now(), **station_changes
+                )
+    except ValidationError as e:
+        voter.data = data
+        # Report model errors by the Excel field names the caller used
+        raise ValidationError({
+            EXCEL_NAMES.get(field, field): messages for field, messages in e.message_dict.items()
+        })
+    except Exception:
+        voter.data = data
+        raise
+    voter.data = {**(data or {}), **voter_changes}
+    return changed
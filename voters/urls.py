@@ -7,6 +7,17 @@ app_name = 'voters'
 urlpatterns = [
     path('list/', views.voter_list, name='voter-list'),
     path('api/filter-voters/', views.filter_voters, name='filter-voters'),
+    path('api/areas/', views.list_areas, name='areas'),
+    path('api/polling-stations/', views.list_polling_stations, name='polling-stations'),
+    path('api/rollups/', views.list_rollups, name='rollups'),
+    path('api/crosstab/', views.voter_crosstab, name='crosstab'),
+    path('api/search/', views.voter_search, name='search'),
+    path('api/lookup/', views.lookup_voter, name='lookup'),
+    path('api/lookup/batch/', views.lookup_voters_batch, name='lookup-batch'),
+    path('api/voters/<int:pk>/', views.update_voter, name='voter-update'),
+    path('api/selections/', views.create_voter_selection, name='selections'),
+    path('api/selections/<str:token>/', views.voter_selection, name='selection'),
+    path('api/selections/<str:token>/export/', views.export_voter_selection, name='selection-export'),
     path('admin/voters/voter/api/bulk-delete/', VoterAdmin.bulk_delete_voters, name='admin:bulk-delete-voters'),
     path('admin/voters/send-notification/', views.send_notification, name='send-notification'),
 ]
\ No newline at end of file
@@ -1,4 +1,9 @@
+import base64
+import json
 import re
+import unicodedata
+
+from .constants import AREA_FILTERS, HIERARCHY_FILTERS, STATION_FILTER
 
 
 def format_phone_number(phone_number):
@@ -13,4 +18,171 @@ def format_phone_number(phone_number):
     if len(cleaned_number) != 10:
         raise ValueError('Phone number must be exactly 10 digits')
 
-    return cleaned_number
\ No newline at end of file
+    return cleaned_number
+
+
+def normalize_mobile_number(mobile_number):
+    """
+    Reduces a mobile number to its digits, dropping a leading 91 or 0
+    prefix. Raises ValueError when the number cannot be a valid Indian
+    mobile number.
+    """
+    # Numbers read from Excel cells may carry a trailing .0
+    clean_number = re.sub(r'\D', '', re.sub(r'\.0+$', '', str(mobile_number).strip()))
+
+    if len(clean_number) < 10 or len(clean_number) > 12:
+        raise ValueError('Invalid mobile number length. Must be 10 digits.')
+
+    if len(clean_number) == 12 and clean_number.startswith('91'):
+        return clean_number[2:]
+    if len(clean_number) == 11 and clean_number.startswith('0'):
+        return clean_number[1:]
+    return clean_number
+
+
+def normalize_card_no(card_no):
+    """
+    Reduces an EPIC card number to its upper-case letters and digits, so
+    spacing, separators and case do not matter when looking it up.
+    """
+    if card_no is None:
+        return ''
+    return re.sub(r'[^0-9A-Z]', '', str(card_no).upper())
+
+
+def normalize_search_text(value, compact=False):
+    """
+    Casefolds ``value`` and replaces punctuation, symbols and other
+    separators with single spaces, keeping letters, digits and the vowel
+    signs of Indic scripts. With ``compact`` the spaces are dropped too,
+    for identifiers such as card and house numbers.
+    """
+    if value is None:
+        return ''
+    characters = [
+        ' ' if unicodedata.category(character)[0] in 'PSZC' else character
+        for character in str(value).casefold()
+    ]
+    words = ''.join(characters).split()
+    return ''.join(words) if compact else ' '.join(words)
+
+
+# Spelling variants of Indian names in Latin script folded by
+# phonetic_key(), applied in order: aspirated and sibilant consonants,
+# letters with a common substitute, then long vowels and diphthongs
+PHONETIC_RULES = (
+    ('x', 'ks'), ('q', 'k'), ('z', 'j'), ('w', 'v'), ('ck', 'k'),
+    ('th', 't'), ('dh', 'd'), ('bh', 'b'), ('kh', 'k'), ('gh', 'g'),
+    ('ph', 'f'), ('jh', 'j'), ('sh', 's'), ('ch', 'c'),
+    ('aa', 'a'), ('ee', 'i'), ('ii', 'i'), ('oo', 'u'), ('uu', 'u'), ('ou', 'u'),
+    ('ai', 'e'), ('ay', 'e'), ('ei', 'e'), ('ey', 'e'),
+)
+
+
+def _phonetic_word(word):
+    if not word.isascii() or not word.isalpha():
+        return word
+    for spelling, sound in PHONETIC_RULES:
+        word = word.replace(spelling, sound)
+    # A y after the first letter is a vowel and a remaining h is silent
+    word = word[:1] + word[1:].replace('y', 'i').replace('h', '')
+    word = re.sub(r'(.)\1+', r'\1', word)
+    # Srinivasa/Srinivas, Krishna/Krishn
+    if len(word) > 3 and word.endswith('a'):
+        word = word[:-1]
+    return word
+
+
+def phonetic_key(name):
+    """
+    Phonetic key of a name that is the same for its common transliterations,
+    e.g. Srinivas, Sreenivas and Shrinivasa, or Lakshmi and Laxmi. Words in
+    other scripts are kept as normalized.
+    """
+    return ' '.join(_phonetic_word(word) for word in normalize_search_text(name).split())
+
+
+def normalize_mobile_numbers(series):
+    """
+    Applies the normalize_mobile_number rules to a whole pandas Series.
+
+    Returns the normalized numbers, with invalid or missing numbers set to
+    an empty string, and a boolean Series marking the invalid ones.
+    """
+    text = series.fillna('').astype(str).str.strip().str.replace(r'\.0+$', '', regex=True)
+    digits = text.str.replace(r'\D', '', regex=True)
+    lengths = digits.str.len()
+
+    digits = digits.mask((lengths == 12) & digits.str.startswith('91'), digits.str[2:])
+    digits = digits.mask((lengths == 11) & digits.str.startswith('0'), digits.str[1:])
+
+    valid = lengths.between(10, 12)
+    invalid = ~valid & (lengths > 0)
+    return digits.where(valid, ''), invalid
+
+
+def area_filters(params):
+    """
+    Area and polling station ids present in ``params``, keyed by parameter
+    name. Raises ValueError for an id that is not an integer.
+    """
+    ids = {}
+    for param, _ in [*AREA_FILTERS, STATION_FILTER]:
+        value = params.get(param)
+        if value:
+            if not str(value).isdigit():
+                raise ValueError(f'Invalid {param}')
+            ids[param] = int(value)
+    return ids
+
+
+def hierarchy_filters(params):
+    """
+    Map the hierarchy filter parameters present in ``params`` (e.g.
+    request.GET) to lookups on the typed Voter columns, and the area and
+    polling station ids to lookups on the Voter keys.
+    """
+    filters = {}
+    for param, column in HIERARCHY_FILTERS:
+        value = params.get(param) or params.get(column)
+        if value:
+            filters[column] = value
+
+    ids = area_filters(params)
+    for param, column in [*AREA_FILTERS, STATION_FILTER]:
+        if param in ids:
+            filters[column] = ids[param]
+    return filters
+
+
+def filter_by_hierarchy(queryset, params):
+    """
+    Filter voters on the geographic hierarchy. Area ids are integer matches
+    on the indexed area keys. Names are equality matches on a prefix of
+    voter_hierarchy_idx, so MySQL can answer them with an index range scan
+    instead of parsing the data JSON of every row.
+    """
+    return queryset.filter(**hierarchy_filters(params))
+
+
+def encode_cursor(last_id):
+    """
+    Encode the id of the last row of a page as an opaque cursor.
+    """
+    payload = json.dumps({'after': last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return the id a cursor from encode_cursor() points after. Raises
+    ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded.encode()))['after']
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(after, int):
+        raise ValueError('Invalid cursor')
+    return after
\ No newline at end of file
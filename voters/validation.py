@@ -0,0 +1,117 @@
+import logging
+import re
+
+import pandas as pd
+
+from .constants import EXCEL_FIELDS, FIELD_TYPES, REQUIRED_FIELDS
+from .models import VoterField
+from .utils import normalize_mobile_numbers
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+BOOLEAN_VALUES = {'true', 'false', 'yes', 'no', 'y', 'n', '1', '0'}
+
+
+def _is_number(text):
+    return pd.to_numeric(text, errors='coerce').notna()
+
+
+def _is_phone(text):
+    # Text without digits normalizes to '' without being flagged invalid
+    numbers, _ = normalize_mobile_numbers(text)
+    return numbers.str.len() == 10
+
+
+def _is_date(text):
+    return pd.to_datetime(text, errors='coerce', format='mixed').notna()
+
+
+def _is_boolean(text):
+    return text.str.lower().isin(BOOLEAN_VALUES)
+
+
+def _is_email(text):
+    return text.str.match(EMAIL_PATTERN)
+
+
+# Vectorized check and error message for each VoterField.field_type
+TYPE_CHECKS = {
+    'number': (_is_number, 'must be a number'),
+    'decimal': (_is_number, 'must be a number'),
+    'phone': (_is_phone, 'must be a valid 10 digit mobile number'),
+    'date': (_is_date, 'must be a valid date'),
+    'datetime': (_is_date, 'must be a valid date and time'),
+    'boolean': (_is_boolean, 'must be yes or no'),
+    'email': (_is_email, 'must be a valid email address'),
+}
+
+
+class BatchValidator:
+    """
+    Validates batches of voter rows against the VoterField definitions.
+
+    Built by compile_validator(). It only holds plain data, so it can be
+    sent to the import worker processes.
+    """
+
+    def __init__(self, fields):
+        # List of (name, field_type, is_required)
+        self.fields = fields
+
+    def validate_rows(self, columns, rows):
+        """
+        Validate rows given as column names and value tuples, one field at a
+        time over the whole batch.
+
+        Returns a dict mapping the index of every invalid row to a dict of
+        field name -> error message.
+        """
+        positions = {str(column).strip().upper(): index for index, column in enumerate(columns)}
+        cells = list(zip(*rows))
+        errors = {}
+
+        for name, field_type, is_required in self.fields:
+            position = positions.get(name.strip().upper())
+            values = cells[position] if position is not None and cells else [''] * len(rows)
+            text = pd.Series(values, dtype=object).fillna('').astype(str).str.strip()
+            blank = text == ''
+
+            if is_required:
+                self._add_errors(errors, blank, name, f'{name} is required')
+
+            check = TYPE_CHECKS.get(field_type)
+            if check:
+                is_valid, message = check
+                filled = text[~blank]
+                if len(filled):
+                    self._add_errors(errors, ~is_valid(filled), name, f'{name} {message}')
+
+        return errors
+
+    def validate_records(self, records):
+        """
+        Validate a list of ``data`` style dicts keyed by Excel field name.
+        """
+        columns = list(dict.fromkeys(key for record in records for key in record))
+        rows = [tuple(record.get(column) for column in columns) for record in records]
+        return self.validate_rows(columns, rows)
+
+    def _add_errors(self, errors, mask, name, message):
+        for index in mask[mask].index:
+            errors.setdefault(int(index), {})[name] = message
+
+
+def compile_validator():
+    """
+    Build a BatchValidator from the current VoterField definitions, falling
+    back to the default Excel fields when none have been created yet.
+    """
+    fields = list(VoterField.objects.values_list('name', 'field_type', 'is_required'))
+    if not fields:
+        fields = [
+            (name, FIELD_TYPES.get(name, 'text'), name in REQUIRED_FIELDS)
+            for name in EXCEL_FIELDS
+        ]
+    return BatchValidator(fields)
@@ -1,15 +1,29 @@
 from django.shortcuts import render
+from django.http import JsonResponse, StreamingHttpResponse
+from .models import Voter, VoterField, PollingStation
 from django.http import JsonResponse
-from .models import Voter, VoterField
-from django.http import JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.views.decorators.http import require_POST
 from django.contrib.admin.views.decorators import staff_member_required
+from django.urls import reverse
 import json
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import BasePermission, IsAdminUser
 from rest_framework.response import Response
-from django.db.models import Q
+from django.db.models import Q, Count
 from .models import Voter
-from .serializers import VoterSerializer
+from .serializers import VoterSerializer, BoothVoterSerializer, PollingStationSerializer
+from .utils import filter_by_hierarchy, area_filters, encode_cursor, decode_cursor
+from .areas import AREA_LEVELS, area_children
+from .rollups import get_rollups
+from .analytics import crosstab
+from .search import phonetic_search, search_voters
+from .lookups import IDENTIFIER_KINDS, booth_serial, lookup_voters
+from .selections import create_selection, export_rows, get_selection, selection_voters
+from .jobs import start_notify_job
+from .notify import BACKGROUND_SEND_THRESHOLD, send_to_voters
+from .updates import patch_voter
+from django.core.exceptions import ValidationError
 from notifications.models import NotificationTemplate, NotificationLog
 from django.utils import timezone
 import requests
@@ -19,35 +33,83 @@ import logging
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Page sizes of the filter-voters API
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Results of the voter search API
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Rows fetched per query while streaming
+STREAM_BATCH_SIZE = 2000
+
+
+class CanChangeVoters(BasePermission):
+    """
+    Staff users with the change permission of voters.
+    """
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_staff and user.has_perm('voters.change_voter'))
+
+
+def stream_voters(queryset, after=0):
+    """
+    Yield voters as NDJSON lines, fetching them in keyset batches ordered by
+    id so only one batch is held in memory at a time.
+    """
+    while True:
+        batch = list(queryset.filter(id__gt=after).order_by('id')[:STREAM_BATCH_SIZE])
+        if not batch:
+            return
+        for row in VoterSerializer(batch, many=True).data:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+        after = batch[-1].id
+
 
 @api_view(['GET'])
 def filter_voters(request):
     try:
-        # Get filter parameters
-        mlc_constituncy = request.GET.get('mlc_constituncy', '')
-        assembly = request.GET.get('assembly', '')
-        mandal = request.GET.get('mandal', '')
-        location = request.GET.get('location', '')
+        cursor = request.GET.get('cursor')
+        try:
+            # Filter on the indexed hierarchy columns and area keys
+            queryset = filter_by_hierarchy(Voter.objects.all(), request.GET)
+            station_id = area_filters(request.GET).get('polling_station_id')
+            after = decode_cursor(cursor) if cursor else 0
+            page_size = min(max(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=400)
 
-        # Start with all voters
-        queryset = Voter.objects.all()
+        # Stream every matching voter as newline delimited JSON
+        if request.GET.get('stream') == 'ndjson':
+            return StreamingHttpResponse(
+                stream_voters(queryset, after),
+                content_type='application/x-ndjson'
+            )
 
-        # Apply filters if they exist
-        if mlc_constituncy:
-            queryset = queryset.filter(data__contains={'MLC CONSTITUNCY': mlc_constituncy})
-        if assembly:
-            queryset = queryset.filter(data__contains={'ASSEMBLY': assembly})
-        if mandal:
-            queryset = queryset.filter(data__contains={'MANDAL': mandal})
-        if location:
-            queryset = queryset.filter(data__contains={'LOCATION': location})
+        # Keyset pagination on id: fetch one extra row to know if there is a next page
+        voters = list(queryset.filter(id__gt=after).order_by('id')[:page_size + 1])
+        has_next = len(voters) > page_size
+        voters = voters[:page_size]
 
-        # Serialize the filtered data
-        serializer = VoterSerializer(queryset, many=True)
+        if station_id is None:
+            return Response({
+                'success': True,
+                'data': VoterSerializer(voters, many=True).data,
+                'next': encode_cursor(voters[-1].id) if has_next else None
+            })
 
+        # Booth-level page: the station details are sent once, not with every voter
+        station = PollingStation.objects.select_related('assembly').filter(pk=station_id).first()
         return Response({
             'success': True,
-            'data': serializer.data
+            'station': PollingStationSerializer(station).data if station else None,
+            'data': BoothVoterSerializer(voters, many=True).data,
+            'next': encode_cursor(voters[-1].id) if has_next else None
         })
     except Exception as e:
         return Response({
@@ -55,6 +117,365 @@ def filter_voters(request):
             'error': str(e)
         })
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_areas(request):
+    """
+    Areas of one hierarchy level for the cascading filter selects, e.g.
+    ?level=mandal&assembly_id=3 for the mandals of assembly 3.
+    """
+    level = request.GET.get('level', AREA_LEVELS[0])
+    try:
+        areas = area_children(level, request.GET)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+    return Response({
+        'success': True,
+        'level': level,
+        'data': areas
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_polling_stations(request):
+    """
+    Polling stations of an assembly with their voter counts, e.g.
+    ?assembly_id=3. Pass a station id as polling_station_id to
+    filter-voters for its voters.
+    """
+    try:
+        assembly_id = area_filters(request.GET).get('assembly_id')
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    if assembly_id is None:
+        return Response({
+            'success': False,
+            'error': 'assembly_id is required'
+        }, status=400)
+
+    stations = (
+        PollingStation.objects.filter(assembly_id=assembly_id)
+        .select_related('assembly')
+        .annotate(voter_count=Count('voters'))
+    )
+    data = PollingStationSerializer(stations, many=True).data
+    for row, station in zip(data, stations):
+        row['voter_count'] = station.voter_count
+
+    return Response({
+        'success': True,
+        'data': data
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_rollups(request):
+    """
+    Demographic breakdown of assemblies, mandals or polling stations from
+    the maintained rollups, e.g. ?level=mandal&node_id=12&dimension=party.
+    node_id and dimension may be repeated; without node_id the counts are
+    summed over every node of the level.
+    """
+    level = request.GET.get('level', 'assembly')
+    try:
+        node_ids = [int(node_id) for node_id in request.GET.getlist('node_id')] or None
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'Invalid node_id'
+        }, status=400)
+
+    try:
+        rollups = get_rollups(level, node_ids, request.GET.getlist('dimension'))
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+    return Response({
+        'success': True,
+        'level': level,
+        'data': rollups
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def voter_crosstab(request):
+    """
+    Cross-tab of voter counts over the analytics snapshot, e.g.
+    ?by=party&by=caste&by=age_band&mandal_id=12. Takes the area ids of
+    filter-voters, attribute codes such as party=4 (repeatable),
+    age_min/age_max and an optional limit on the cells returned.
+    """
+    try:
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'Invalid limit'
+        }, status=400)
+
+    try:
+        result = crosstab(request.GET.getlist('by'), request.GET, limit)
+    except LookupError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=503)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+    return Response({
+        'success': True,
+        **result
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def voter_search(request):
+    """
+    Fuzzy search of voter names, relation names, card and house numbers,
+    e.g. ?q=ramesh kumar&mandal_id=12&limit=20. Narrow the columns searched
+    with field (repeatable) and the area with the ids of filter-voters.
+    mode=phonetic looks voter names up by how they sound instead, so
+    Sreenivas finds Srinivas.
+    """
+    mode = request.GET.get('mode', 'fuzzy')
+    if mode not in ('fuzzy', 'phonetic'):
+        return Response({
+            'success': False,
+            'error': f'Unknown search mode: {mode}'
+        }, status=400)
+
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_SEARCH_LIMIT)), MAX_SEARCH_LIMIT)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'Invalid limit'
+        }, status=400)
+
+    try:
+        if mode == 'phonetic':
+            matches = phonetic_search(request.GET.get('q', ''), request.GET, limit)
+        else:
+            matches = search_voters(
+                request.GET.get('q', ''), request.GET, limit, request.GET.getlist('field')
+            )
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+    return Response({
+        'success': True,
+        'mode': mode,
+        'count': len(matches),
+        'data': matches
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def lookup_voter(request):
+    """
+    Voters with one identifier: ?card_no=, ?mobile_no= or
+    ?assembly_id=&psno=&sno=. Area ids of filter-voters narrow the match.
+    """
+    params = request.GET
+    if params.get('card_no'):
+        kind, identifier = 'card_no', params['card_no']
+    elif params.get('mobile_no'):
+        kind, identifier = 'mobile_no', params['mobile_no']
+    elif params.get('psno') and params.get('sno'):
+        kind, identifier = 'booth_serial', booth_serial(params['psno'], params['sno'])
+    else:
+        return Response({
+            'success': False,
+            'error': 'Pass card_no, mobile_no, or psno and sno'
+        }, status=400)
+
+    try:
+        result = lookup_voters(kind, [identifier], params)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    if result['invalid']:
+        return Response({
+            'success': False,
+            'error': f'Invalid {kind}'
+        }, status=400)
+
+    return Response({
+        'success': True,
+        'data': next(iter(result['data'].values()), [])
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def lookup_voters_batch(request):
+    """
+    Resolve many identifiers of one type in a single call. The JSON body
+    has ``type`` (card_no, mobile_no or booth_serial), ``identifiers`` and
+    optional area ids; booth serials are "psno/sno" strings or objects
+    with psno and sno and need assembly_id.
+    """
+    body = request.data if isinstance(request.data, dict) else {}
+    kind = body.get('type')
+    identifiers = body.get('identifiers')
+    if kind not in IDENTIFIER_KINDS or not isinstance(identifiers, list):
+        return Response({
+            'success': False,
+            'error': f'type must be one of {", ".join(IDENTIFIER_KINDS)} and identifiers a list'
+        }, status=400)
+
+    try:
+        result = lookup_voters(kind, identifiers, body)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+    return Response({
+        'success': True,
+        **result
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def create_voter_selection(request):
+    """
+    Save a selection for bulk operations and return its token. The JSON
+    body has ``filters`` (filter-voters parameters, {} for every voter, or
+    null for only the listed voters), ``include_ids`` and ``exclude_ids``.
+    Bulk delete, notifications and export take the token as ``selection``.
+    """
+    body = request.data if isinstance(request.data, dict) else {}
+    try:
+        selection = create_selection(
+            body.get('filters'), body.get('include_ids'), body.get('exclude_ids'), request.user
+        )
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+    return Response({
+        'success': True,
+        'token': selection.token,
+        'count': selection.voter_count,
+        'expires_at': selection.expires_at
+    }, status=201)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def voter_selection(request, token):
+    try:
+        selection = get_selection(token, request.user)
+    except LookupError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=404)
+
+    return Response({
+        'success': True,
+        'token': selection.token,
+        'filters': selection.filters,
+        'include_ids': selection.include_ids,
+        'exclude_ids': selection.exclude_ids,
+        'count': selection.voter_count,
+        'expires_at': selection.expires_at
+    })
+
+
+@staff_member_required
+def export_voter_selection(request, token):
+    """
+    Stream the voters of a selection as CSV (default) or ?format=ndjson,
+    reading them in keyset chunks.
+    """
+    export_format = request.GET.get('format', 'csv')
+    try:
+        selection = get_selection(token, request.user)
+        rows = export_rows(selection, export_format)
+    except LookupError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=404)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    if export_format == 'ndjson':
+        return StreamingHttpResponse(rows, content_type='application/x-ndjson')
+    response = StreamingHttpResponse(rows, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="voters_{selection.token}.csv"'
+    return response
+
+
+@api_view(['PATCH'])
+@permission_classes([CanChangeVoters])
+def update_voter(request, pk):
+    """
+    Partial edit of a voter: the JSON body maps Excel field names to new
+    values. Only the fields that differ from the stored ones are validated
+    and written. Returns the changed field names and the new updated_at.
+    """
+    if not isinstance(request.data, dict):
+        return Response({
+            'success': False,
+            'error': 'Expected an object of field values'
+        }, status=400)
+
+    try:
+        voter = Voter.objects.get(pk=pk)
+        changed = patch_voter(voter, request.data)
+    except Voter.DoesNotExist:
+        return Response({
+            'success': False,
+            'error': 'Voter not found'
+        }, status=404)
+    except ValidationError as e:
+        errors = {field: '; '.join(messages) for field, messages in e.message_dict.items()}
+        return Response({
+            'success': False,
+            'error': '; '.join(errors.values()),
+            'errors': errors
+        }, status=400)
+
+    return Response({
+        'success': True,
+        'data': {
+            'id': voter.id,
+            'changed': list(changed),
+            'updated_at': voter.updated_at
+        }
+    })
+
+
 def voter_list(request):
     voters = Voter.objects.all()
     return JsonResponse({
@@ -63,6 +484,31 @@ def voter_list(request):
     })
 
 
+def send_selection_notification(request, token, template_id, channel):
+    try:
+        selection = get_selection(token, request.user)
+        template = NotificationTemplate.objects.get(id=template_id)
+    except LookupError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=404)
+    except NotificationTemplate.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Template not found'}, status=404)
+
+    if selection.voter_count > BACKGROUND_SEND_THRESHOLD:
+        job = start_notify_job(
+            {'selection': selection.token, 'template_id': template.id, 'channel': channel},
+            user=request.user
+        )
+        return JsonResponse({
+            'success': True,
+            'job_id': job.id,
+            'count': selection.voter_count,
+            'progress_url': reverse('admin:voter-job-status', args=[job.id])
+        })
+
+    voters = selection_voters(selection, fields=['id', 'mobile_no'])
+    return JsonResponse({'success': True, 'data': send_to_voters(voters, template, channel)})
+
+
 @require_POST
 @staff_member_required
 def send_notification(request):
@@ -71,13 +517,19 @@ def send_notification(request):
         template_id = data.get('template_id')
         channel = data.get('channel')
         voter_ids = data.get('voter_ids', [])
+        selection_token = data.get('selection')
 
-        if not all([template_id, channel, voter_ids]):
+        if not all([template_id, channel]) or not (voter_ids or selection_token):
             return JsonResponse({
                 'success': False,
                 'error': 'Missing required parameters'
             })
 
+        # A saved selection is sent from here, in chunks, or by a
+        # background job when large
+        if selection_token:
+            return send_selection_notification(request, selection_token, template_id, channel)
+
         # Forward the request to notifications app
         response = requests.post(
             f"{request.scheme}://{request.get_host()}/notifications/send/",